@@ -0,0 +1,262 @@
+"""
+Resumen diario de alertas de vencimientos y cobros por responsable.
+
+Una vez al día se calculan, en un solo lote, las pólizas en alerta según
+determinar_alerta (índice de vencimientos, agrupadas por 'Responsable') y las
+cuotas pendientes del mes en curso (agrupadas por el 'analista_responsable' de la
+remisión de origen). Con plantillas/plantilla_alertas.txt se escribe un resumen por
+persona en DATOS_ALERTAS/<fecha>/ y, en modo "correo", un .eml por persona en
+DATOS_ALERTAS/cola_correo/ para entregarlo luego a un servidor SMTP local.
+
+El resumen se genera una sola vez por día aunque haya varios workers: se toma el
+bloqueo 'alertas' y se omite si la carpeta del día ya existe.
+
+Uso (p. ej. desde el Programador de tareas de Windows):
+    python alertas.py              # genera el resumen de hoy si aún no existe
+    python alertas.py --forzar     # lo vuelve a generar
+    python alertas.py --enviar     # entrega la cola de correo al SMTP de config.json -> "alertas"
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from bloqueos import bloqueo_interproceso
+from fechas_es import formato_largo
+from indice_vencimientos import VENTANA_DEFECTO, obtener_indice
+from metricas import leer_excel
+
+CONFIG_ALERTAS_DEFECTO = {
+    'habilitado': False,
+    'hora': '07:00',
+    'modo': 'archivos',  # "archivos" o "correo" (además de los archivos, un .eml por persona con correo)
+    'remitente': 'alertas@localhost',
+    'correos': {},  # persona -> dirección de correo
+    'smtp': {'host': 'localhost', 'puerto': 25},
+}
+
+SIN_ASIGNAR = 'Sin asignar'
+HORIZONTE_DIAS = 30  # alertas de vencimiento hasta 30 días (verde/amarillo/rojo de determinar_alerta)
+NIVELES_ALERTA = {'alerta-rojo': 'URGENTE', 'alerta-amarillo': 'PRÓXIMO', 'alerta-verde': 'SEGUIMIENTO'}
+DIRECTORIO_COLA = 'cola_correo'
+
+
+class _CamposPlantilla(dict):
+    """Los marcadores que la plantilla no conoce quedan tal cual en lugar de fallar."""
+
+    def __missing__(self, clave):
+        return '{' + clave + '}'
+
+
+def _persona(valor):
+    texto = str(valor).strip() if valor is not None else ''
+    return SIN_ASIGNAR if texto in ('', 'nan', 'None') else texto
+
+
+def _nombre_archivo(persona):
+    return re.sub(r'[^\w.-]+', '_', persona).strip('_') or 'sin_asignar'
+
+
+def alertas_vencimientos(ruta_vencimientos):
+    """{responsable: [líneas]} de las pólizas en alerta roja, amarilla o verde."""
+    if not os.path.exists(ruta_vencimientos):
+        return {}
+    indice = obtener_indice(ruta_vencimientos, leer_excel)
+    registros = indice.registros
+    por_persona = defaultdict(list)
+    # Orden de la tabla invertido: primero lo que vence (o venció) antes
+    for posicion in reversed(indice.posiciones((VENTANA_DEFECTO[0], HORIZONTE_DIAS))):
+        registro = registros[posicion]
+        nivel = NIVELES_ALERTA.get(registro['Indicador_Vencimiento_CSS_Class'])
+        if nivel:
+            por_persona[_persona(registro.get('Responsable'))].append(
+                f"- [{nivel}] {registro['FECHA FIN']} | {registro.get('Tomador', '')} | "
+                f"{registro.get('ASEGURADORA', '')} | {registro.get('RAMO PRINCIPAL', '')} | "
+                f"Póliza {registro.get('NÚMERO PÓLIZA', '')} | {registro['Indicador_Vencimiento_Text']}")
+    return dict(por_persona)
+
+
+# Columnas de cobros que usa el resumen (solo se cargan esas)
+COLUMNAS_COBROS = ['CONSECUTIVO_REMISION', 'Tomador', 'Aseguradora', 'N_Poliza', 'N_Cuota', 'Total_Cuotas',
+                   'Fecha_Vencimiento_Cuota', 'Estado', 'Tipo_Movimiento']
+
+
+def cobros_del_mes(ruta_cobros, ruta_remisiones, hoy):
+    """{analista_responsable: [líneas]} de las cuotas del mes que no están cobradas."""
+    if not os.path.exists(ruta_cobros):
+        return {}
+    import pandas as pd
+
+    df = leer_excel(ruta_cobros, columnas=COLUMNAS_COBROS)
+    df['Fecha_Vencimiento_Cuota'] = pd.to_datetime(df['Fecha_Vencimiento_Cuota'], errors='coerce')
+    if 'Estado' not in df.columns:
+        df['Estado'] = ''
+    df = df[(df['Fecha_Vencimiento_Cuota'].dt.month == hoy.month) &
+            (df['Fecha_Vencimiento_Cuota'].dt.year == hoy.year) &
+            (df['Estado'].astype(str) != 'Cobrado')].sort_values(by='Fecha_Vencimiento_Cuota')
+    if df.empty:
+        return {}
+
+    analistas = {}
+    if os.path.exists(ruta_remisiones):
+        df_remisiones = leer_excel(ruta_remisiones, columnas=['consecutivo', 'analista_responsable'])
+        if 'analista_responsable' in df_remisiones.columns:
+            analistas = dict(zip(df_remisiones['consecutivo'].astype(str), df_remisiones['analista_responsable']))
+
+    por_persona = defaultdict(list)
+    for cobro in df.fillna('').to_dict(orient='records'):
+        persona = _persona(analistas.get(str(cobro.get('CONSECUTIVO_REMISION'))))
+        por_persona[persona].append(
+            f"- {cobro['Fecha_Vencimiento_Cuota'].strftime('%Y-%m-%d')} | {cobro.get('Tipo_Movimiento') or 'Cobro'} | "
+            f"{cobro.get('Tomador', '')} | {cobro.get('Aseguradora', '')} | Póliza {cobro.get('N_Poliza', '')} | "
+            f"Cuota {cobro.get('N_Cuota', '')}/{cobro.get('Total_Cuotas', '')} | {cobro.get('Estado', '')}")
+    return dict(por_persona)
+
+
+def componer_resumenes(vencimientos, cobros, plantilla, hoy, nombre_empresa=''):
+    """{persona: texto} aplicando la plantilla a las alertas de cada persona."""
+    resumenes = {}
+    for persona in sorted(set(vencimientos) | set(cobros)):
+        lineas_vencimientos = vencimientos.get(persona, [])
+        lineas_cobros = cobros.get(persona, [])
+        resumenes[persona] = plantilla.format_map(_CamposPlantilla(
+            Responsable=persona,
+            Fecha=formato_largo(hoy),
+            Empresa=nombre_empresa or '',
+            Total_Vencimientos=len(lineas_vencimientos),
+            Vencimientos='\n'.join(lineas_vencimientos) or '- Sin alertas.',
+            Total_Cobros=len(lineas_cobros),
+            Cobros='\n'.join(lineas_cobros) or '- Sin cuotas pendientes.',
+        ))
+    return resumenes
+
+
+def generar_resumen_diario(rutas, config_alertas, nombre_empresa='', forzar=False):
+    """
+    rutas: {'vencimientos', 'cobros', 'remisiones', 'plantilla', 'salida'}.
+    Devuelve la cantidad de resúmenes escritos, o None si el de hoy ya existía.
+    """
+    config = {**CONFIG_ALERTAS_DEFECTO, **config_alertas}
+    hoy = date.today()
+    directorio_dia = os.path.join(rutas['salida'], hoy.strftime('%Y-%m-%d'))
+
+    with bloqueo_interproceso('alertas'):
+        if os.path.isdir(directorio_dia) and not forzar:
+            return None
+
+        with open(rutas['plantilla'], 'r', encoding='utf-8') as f:
+            plantilla = f.read()
+        resumenes = componer_resumenes(alertas_vencimientos(rutas['vencimientos']),
+                                       cobros_del_mes(rutas['cobros'], rutas['remisiones'], hoy),
+                                       plantilla, hoy, nombre_empresa)
+
+        # Se escribe en una carpeta temporal y se publica de una vez: la carpeta del día marca el resumen como hecho
+        temporal = f'{directorio_dia}.tmp'
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
+        for persona, texto in resumenes.items():
+            with open(os.path.join(temporal, f'{_nombre_archivo(persona)}.txt'), 'w', encoding='utf-8') as f:
+                f.write(texto)
+        shutil.rmtree(directorio_dia, ignore_errors=True)
+        os.replace(temporal, directorio_dia)
+
+        if config['modo'] == 'correo':
+            encolar_correos(resumenes, config, os.path.join(rutas['salida'], DIRECTORIO_COLA), hoy)
+    return len(resumenes)
+
+
+def encolar_correos(resumenes, config, directorio_cola, hoy):
+    """Un .eml por persona con correo configurado en config.json -> "alertas" -> "correos"."""
+    from email.message import EmailMessage
+
+    os.makedirs(directorio_cola, exist_ok=True)
+    for persona, texto in resumenes.items():
+        destinatario = config['correos'].get(persona)
+        if not destinatario:
+            print(f"ADVERTENCIA: '{persona}' no tiene correo configurado; su resumen solo se guardó en archivo.")
+            continue
+        mensaje = EmailMessage()
+        mensaje['From'] = config['remitente']
+        mensaje['To'] = destinatario
+        mensaje['Subject'] = f'Resumen de alertas - {formato_largo(hoy)}'
+        mensaje.set_content(texto)
+        ruta = os.path.join(directorio_cola, f"{hoy.strftime('%Y%m%d')}_{_nombre_archivo(persona)}.eml")
+        with open(ruta, 'wb') as f:
+            f.write(mensaje.as_bytes())
+
+
+def enviar_cola(directorio_cola, config_smtp):
+    """Entrega los .eml de la cola al servidor SMTP y los mueve a 'enviados'. Devuelve cuántos envió."""
+    import smtplib
+    from email import policy
+    from email.parser import BytesParser
+
+    if not os.path.isdir(directorio_cola):
+        return 0
+    enviados_dir = os.path.join(directorio_cola, 'enviados')
+    os.makedirs(enviados_dir, exist_ok=True)
+    enviados = 0
+    with smtplib.SMTP(config_smtp.get('host', 'localhost'), int(config_smtp.get('puerto', 25))) as smtp:
+        for nombre in sorted(os.listdir(directorio_cola)):
+            ruta = os.path.join(directorio_cola, nombre)
+            if not nombre.endswith('.eml'):
+                continue
+            with open(ruta, 'rb') as f:
+                smtp.send_message(BytesParser(policy=policy.default).parse(f))
+            os.replace(ruta, os.path.join(enviados_dir, nombre))
+            enviados += 1
+    return enviados
+
+
+def programar_resumen_diario(rutas, config_alertas, nombre_empresa=''):
+    """Genera el resumen a la hora configurada ("HH:MM") cada día (hilo demonio, por proceso)."""
+    config = {**CONFIG_ALERTAS_DEFECTO, **config_alertas}
+    hora, minuto = (int(parte) for parte in config['hora'].split(':'))
+    ahora = datetime.now()
+    siguiente = ahora.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    if siguiente <= ahora:
+        siguiente += timedelta(days=1)
+
+    def ejecutar():
+        try:
+            generar_resumen_diario(rutas, config_alertas, nombre_empresa)
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudo generar el resumen diario de alertas: {type(e).__name__} - {e}")
+        programar_resumen_diario(rutas, config_alertas, nombre_empresa)
+
+    temporizador = threading.Timer((siguiente - ahora).total_seconds(), ejecutar)
+    temporizador.daemon = True
+    temporizador.start()
+    return temporizador
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resumen diario de alertas de vencimientos y cobros.')
+    parser.add_argument('--forzar', action='store_true', help='Regenera el resumen de hoy aunque ya exista.')
+    parser.add_argument('--enviar', action='store_true', help='Entrega la cola de correo al servidor SMTP.')
+    args = parser.parse_args()
+
+    from app import RUTAS_ALERTAS, load_config, inicializar_aplicacion
+    inicializar_aplicacion()
+    config = load_config()
+    config_alertas = {**CONFIG_ALERTAS_DEFECTO, **config.get('alertas', {})}
+
+    if args.enviar:
+        enviados = enviar_cola(os.path.join(RUTAS_ALERTAS['salida'], DIRECTORIO_COLA), config_alertas['smtp'])
+        print(f'Correos enviados: {enviados}')
+        return 0
+
+    escritos = generar_resumen_diario(RUTAS_ALERTAS, config_alertas, config.get('nombre_empresa', ''), args.forzar)
+    if escritos is None:
+        print('El resumen de hoy ya existe (use --forzar para regenerarlo).')
+    else:
+        print(f'Resúmenes generados: {escritos} en {RUTAS_ALERTAS["salida"]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
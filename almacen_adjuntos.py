@@ -0,0 +1,182 @@
+"""
+Almacén de adjuntos direccionado por contenido (SHA-256) con deduplicación.
+
+Cada documento se guarda una sola vez en ALMACEN_ADJUNTOS/<sha[:2]>/<sha>. El árbol
+de CLIENTES_CARPETAS (mismos nombres que generan registrar y ejecutar_crear_carpeta)
+se materializa con enlaces duros hacia ese blob, de modo que el mismo clausulado, RUT
+o Cámara de Comercio subido en cada renovación no vuelve a ocupar espacio.
+Si el sistema de archivos no admite enlaces duros se hace una copia normal.
+
+Los metadatos (ruta -> sha, tamaño) se guardan en SQLite para poder reportar el
+espacio ahorrado.
+
+Nota: como los enlaces comparten el mismo contenido, los documentos no deben
+editarse en sitio; un documento nuevo en la misma ruta reemplaza el enlace.
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+TAMANO_BLOQUE = 1024 * 1024
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL,
+    fecha_creacion TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS adjuntos (
+    ruta TEXT PRIMARY KEY,          -- relativa a CLIENTES_CARPETAS
+    sha256 TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    fecha_registro TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_adjuntos_sha ON adjuntos (sha256);
+"""
+
+
+class AlmacenAdjuntos:
+    """Blobs por SHA-256 + índice de metadatos + materialización en el árbol de clientes."""
+
+    def __init__(self, directorio_blobs, ruta_db, directorio_clientes):
+        self.directorio_blobs = directorio_blobs
+        self.ruta_db = ruta_db
+        self.directorio_clientes = directorio_clientes
+        self._inicializada = False
+
+    @contextmanager
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta_db, timeout=30)
+        try:
+            if not self._inicializada:
+                conexion.execute('PRAGMA journal_mode=WAL')
+                conexion.executescript(_DDL)
+                self._inicializada = True
+            with conexion:
+                yield conexion
+        finally:
+            conexion.close()
+
+    def ruta_blob(self, sha256):
+        return os.path.join(self.directorio_blobs, sha256[:2], sha256)
+
+    def guardar_desde_temporal(self, ruta_temporal, sha256, tamano, ruta_destino):
+        """
+        Toma posesión de un archivo temporal ya escrito (y con fsync) cuyo hash se conoce.
+        Si el contenido ya existe el temporal se descarta; en ambos casos ruta_destino
+        queda apuntando al blob. Devuelve True si el blob es nuevo.
+        """
+        ruta_blob = self.ruta_blob(sha256)
+        nuevo = not os.path.exists(ruta_blob)
+        if nuevo:
+            os.makedirs(os.path.dirname(ruta_blob), exist_ok=True)
+            os.replace(ruta_temporal, ruta_blob)
+        else:
+            os.remove(ruta_temporal)
+
+        self._materializar(ruta_blob, ruta_destino)
+        self._registrar(sha256, tamano, ruta_destino)
+        return nuevo
+
+    def guardar_desde_stream(self, stream, ruta_destino):
+        """Copia un stream por bloques a un temporal del almacén calculando el hash y lo guarda."""
+        ruta_temporal, sha256, total = self._copiar_a_temporal(stream)
+        self.guardar_desde_temporal(ruta_temporal, sha256, total, ruta_destino)
+        return sha256, total
+
+    def _copiar_a_temporal(self, stream):
+        os.makedirs(self.directorio_blobs, exist_ok=True)
+        hash_sha = hashlib.sha256()
+        total = 0
+        with tempfile.NamedTemporaryFile(dir=self.directorio_blobs, prefix='blob_', suffix='.part', delete=False) as tmp:
+            while True:
+                bloque = stream.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                hash_sha.update(bloque)
+                tmp.write(bloque)
+                total += len(bloque)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        return tmp.name, hash_sha.hexdigest(), total
+
+    def _materializar(self, ruta_blob, ruta_destino):
+        os.makedirs(os.path.dirname(ruta_destino), exist_ok=True)
+        ruta_enlace_tmp = f'{ruta_destino}.enlace'
+        if os.path.exists(ruta_enlace_tmp):
+            os.remove(ruta_enlace_tmp)
+        try:
+            os.link(ruta_blob, ruta_enlace_tmp)
+        except OSError:
+            shutil.copyfile(ruta_blob, ruta_enlace_tmp)
+        # Reemplazo atómico: si ya había un documento en la ruta, su blob no se modifica
+        os.replace(ruta_enlace_tmp, ruta_destino)
+
+    def _ruta_relativa(self, ruta_destino):
+        return os.path.relpath(ruta_destino, self.directorio_clientes).replace(os.sep, '/')
+
+    def _registrar(self, sha256, tamano, ruta_destino):
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._conectar() as conexion:
+            conexion.execute('INSERT OR IGNORE INTO blobs (sha256, bytes, fecha_creacion) VALUES (?, ?, ?)',
+                             (sha256, tamano, ahora))
+            conexion.execute('INSERT OR REPLACE INTO adjuntos (ruta, sha256, bytes, fecha_registro) VALUES (?, ?, ?, ?)',
+                             (self._ruta_relativa(ruta_destino), sha256, tamano, ahora))
+
+    def estadisticas(self):
+        """Tamaño lógico (suma de todos los documentos) vs. físico (blobs únicos) y ahorro."""
+        with self._conectar() as conexion:
+            documentos, bytes_logicos = conexion.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM adjuntos').fetchone()
+            blobs, bytes_fisicos = conexion.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM blobs').fetchone()
+            duplicados = conexion.execute(
+                'SELECT sha256, COUNT(*) AS copias, MAX(bytes) FROM adjuntos GROUP BY sha256 '
+                'HAVING copias > 1 ORDER BY (copias - 1) * MAX(bytes) DESC LIMIT 10'
+            ).fetchall()
+        return {
+            'documentos': documentos,
+            'blobs_unicos': blobs,
+            'bytes_logicos': bytes_logicos,
+            'bytes_fisicos': bytes_fisicos,
+            'bytes_ahorrados': max(bytes_logicos - bytes_fisicos, 0),
+            'porcentaje_ahorro': round(100.0 * (bytes_logicos - bytes_fisicos) / bytes_logicos, 2) if bytes_logicos else 0.0,
+            'mas_repetidos': [{'sha256': sha, 'copias': copias, 'bytes': tamano} for sha, copias, tamano in duplicados],
+        }
+
+    def deduplicar_arbol_existente(self):
+        """
+        Migra los archivos que ya existen en CLIENTES_CARPETAS al almacén: cada archivo
+        se reemplaza por un enlace a su blob. Devuelve el número de archivos procesados.
+        """
+        procesados = 0
+        for raiz, _, archivos in os.walk(self.directorio_clientes):
+            for nombre in archivos:
+                ruta = os.path.join(raiz, nombre)
+                if nombre.endswith('.enlace'):
+                    continue
+                try:
+                    # El original se cierra antes de reemplazarlo por el enlace (requisito en Windows)
+                    with open(ruta, 'rb') as origen:
+                        ruta_temporal, sha256, total = self._copiar_a_temporal(origen)
+                    self.guardar_desde_temporal(ruta_temporal, sha256, total, ruta)
+                    procesados += 1
+                except OSError as e:
+                    print(f"ADVERTENCIA: No se pudo deduplicar {ruta}: {e}")
+        return procesados
+
+
+if __name__ == '__main__':
+    # Uso: python almacen_adjuntos.py deduplicar   (migra CLIENTES_CARPETAS existente)
+    #      python almacen_adjuntos.py estadisticas
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    almacen = AlmacenAdjuntos(os.path.join(base_dir, 'ALMACEN_ADJUNTOS'),
+                              os.path.join(base_dir, 'DATOS_INDICES', 'adjuntos.db'),
+                              os.path.join(base_dir, 'CLIENTES_CARPETAS'))
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'estadisticas'
+    if comando == 'deduplicar':
+        print(f'{almacen.deduplicar_arbol_existente()} archivo(s) procesados.')
+    print(almacen.estadisticas())
@@ -0,0 +1,168 @@
+"""
+Almacén de siniestros sobre SQLite (módulo estándar de Python, sin dependencias).
+
+Reemplaza la lectura-concatenación-reescritura de siniestros.xlsx: cada registro
+es un INSERT (tiempo constante respecto al historial) y los listados se resuelven
+con índices sobre NIT normalizado, ramo y año del siniestro.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+from indices import normalizar_nit
+from metricas import leer_excel
+
+# Orden definitivo de columnas del módulo de siniestros (igual que ORDEN_COLUMNAS_* en app.py)
+ORDEN_COLUMNAS_SINIESTROS = [
+    'ID_SINIESTRO', 'fecha_registro', 'nombre_cliente', 'nit_cc', 'numero_poliza',
+    'ramo', 'fecha_siniestro', 'archivos_adjuntos'
+]
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS siniestros (
+    ID_SINIESTRO TEXT PRIMARY KEY,
+    fecha_registro TEXT NOT NULL,
+    nombre_cliente TEXT NOT NULL,
+    nit_cc TEXT NOT NULL,
+    nit_normalizado TEXT NOT NULL,
+    numero_poliza TEXT,
+    ramo TEXT,
+    fecha_siniestro TEXT NOT NULL,   -- ISO YYYY-MM-DD
+    ano_siniestro INTEGER NOT NULL,
+    archivos_adjuntos TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_siniestros_nit ON siniestros (nit_normalizado);
+CREATE INDEX IF NOT EXISTS idx_siniestros_ramo ON siniestros (ramo);
+CREATE INDEX IF NOT EXISTS idx_siniestros_ano ON siniestros (ano_siniestro);
+CREATE INDEX IF NOT EXISTS idx_siniestros_fecha ON siniestros (fecha_siniestro);
+"""
+
+_inicializadas = set()
+
+
+@contextmanager
+def _conectar(ruta_db):
+    """Conexión de corta duración: confirma la transacción al salir y siempre se cierra."""
+    conexion = sqlite3.connect(ruta_db, timeout=30)
+    conexion.row_factory = sqlite3.Row
+    try:
+        if ruta_db not in _inicializadas:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.executescript(_DDL)
+            _inicializadas.add(ruta_db)
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def parsear_fecha_siniestro(valor):
+    """Convierte la fecha del formulario (YYYY-MM-DD o dd/mm/YYYY) a date. Lanza ValueError si no es válida."""
+    if hasattr(valor, 'date') and not isinstance(valor, str):
+        return valor.date()
+    valor = str(valor or '').strip()
+    for formato in ('%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha de siniestro inválida: '{valor}'")
+
+
+def construir_registro(datos):
+    """Normaliza un dict de entrada al esquema ORDEN_COLUMNAS_SINIESTROS (fecha_siniestro tipada)."""
+    registro = {col: str(datos.get(col, '') or '').strip() for col in ORDEN_COLUMNAS_SINIESTROS}
+    registro['fecha_siniestro'] = parsear_fecha_siniestro(datos.get('fecha_siniestro')).isoformat()
+    if not registro['fecha_registro']:
+        registro['fecha_registro'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return registro
+
+
+def insertar_siniestro(ruta_db, registro):
+    """Inserta un siniestro ya normalizado con construir_registro (append-only)."""
+    with _conectar(ruta_db) as conexion:
+        conexion.execute(
+            'INSERT INTO siniestros (ID_SINIESTRO, fecha_registro, nombre_cliente, nit_cc, nit_normalizado, '
+            'numero_poliza, ramo, fecha_siniestro, ano_siniestro, archivos_adjuntos) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (registro['ID_SINIESTRO'], registro['fecha_registro'], registro['nombre_cliente'],
+             registro['nit_cc'], normalizar_nit(registro['nit_cc']), registro['numero_poliza'],
+             registro['ramo'], registro['fecha_siniestro'], int(registro['fecha_siniestro'][:4]),
+             registro['archivos_adjuntos'])
+        )
+    return registro
+
+
+def buscar_siniestros(ruta_db, nit='', ramo='', ano=None, texto='', pagina=1, por_pagina=25):
+    """
+    Listado paginado con filtros opcionales. Devuelve (registros, total).
+    Los filtros por NIT, ramo y año usan los índices de la tabla; 'texto' busca
+    además en nombre del cliente y número de póliza.
+    """
+    condiciones, parametros = [], []
+    if nit:
+        condiciones.append('nit_normalizado = ?')
+        parametros.append(normalizar_nit(nit))
+    if ramo:
+        condiciones.append('ramo = ?')
+        parametros.append(ramo)
+    if ano:
+        condiciones.append('ano_siniestro = ?')
+        parametros.append(int(ano))
+    if texto:
+        condiciones.append('(nombre_cliente LIKE ? OR numero_poliza LIKE ?)')
+        parametros.extend([f'%{texto}%', f'%{texto}%'])
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+
+    pagina = max(int(pagina), 1)
+    por_pagina = max(min(int(por_pagina), 200), 1)
+    columnas = ', '.join(ORDEN_COLUMNAS_SINIESTROS)
+    with _conectar(ruta_db) as conexion:
+        total = conexion.execute(f'SELECT COUNT(*) FROM siniestros {where}', parametros).fetchone()[0]
+        filas = conexion.execute(
+            f'SELECT {columnas} FROM siniestros {where} '
+            'ORDER BY fecha_siniestro DESC, fecha_registro DESC LIMIT ? OFFSET ?',
+            parametros + [por_pagina, (pagina - 1) * por_pagina]
+        ).fetchall()
+    return [dict(fila) for fila in filas], total
+
+
+def valores_filtro(ruta_db):
+    """Ramos y años distintos (para los selectores del listado)."""
+    with _conectar(ruta_db) as conexion:
+        ramos = [f[0] for f in conexion.execute("SELECT DISTINCT ramo FROM siniestros WHERE ramo <> '' ORDER BY ramo")]
+        anos = [f[0] for f in conexion.execute('SELECT DISTINCT ano_siniestro FROM siniestros ORDER BY ano_siniestro DESC')]
+    return ramos, anos
+
+
+def iterar_siniestros(ruta_db):
+    """Todos los siniestros como dicts (para reconstruir índices)."""
+    columnas = ', '.join(ORDEN_COLUMNAS_SINIESTROS)
+    with _conectar(ruta_db) as conexion:
+        return [dict(fila) for fila in conexion.execute(f'SELECT {columnas} FROM siniestros')]
+
+
+def importar_excel_legacy(ruta_db, ruta_excel):
+    """
+    Importa una sola vez el antiguo siniestros.xlsx (si existe y el almacén está vacío).
+    Las filas sin fecha válida se omiten. Devuelve el número de registros importados.
+    """
+    if not os.path.exists(ruta_excel):
+        return 0
+    with _conectar(ruta_db) as conexion:
+        if conexion.execute('SELECT COUNT(*) FROM siniestros').fetchone()[0] > 0:
+            return 0
+
+    import uuid
+
+    importados = 0
+    for datos in leer_excel(ruta_excel, dtype=str).fillna('').to_dict(orient='records'):
+        if not datos.get('ID_SINIESTRO'):
+            datos['ID_SINIESTRO'] = uuid.uuid4().hex[:8].upper()
+        try:
+            insertar_siniestro(ruta_db, construir_registro(datos))
+            importados += 1
+        except (ValueError, sqlite3.IntegrityError) as e:
+            print(f"ADVERTENCIA: Siniestro omitido al importar {ruta_excel}: {e}")
+    return importados
@@ -1,11 +1,42 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, send_file
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, send_file, Response, stream_with_context
+from jinja2 import FileSystemBytecodeCache
 import os
-import pandas as pd
+import threading
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
 import uuid
 import json
+from indices import (normalizar_numero_poliza, poliza_de_enlace_remision, reconstruir_indice_polizas,
+                     buscar_poliza, indice_polizas_existe, registrar_enlace_remision, poliza_enlace_de_consecutivo,
+                     normalizar_nit, indice_clientes_existe,
+                     reconstruir_indice_clientes, agregar_a_indice_clientes, actualizar_resumen_cliente,
+                     registrar_carpeta_cliente, reconstruir_indice_carpetas, buscar_cliente)
+import almacen_siniestros
+from cargas import SolicitudConCargaStreaming, ArchivoDemasiadoGrande, guardar_archivos_en_paralelo
+from almacen_adjuntos import AlmacenAdjuntos
+import bloqueos
+from bloqueos import escritura_coordinada, seccion_de_escritura, bloqueo_interproceso
+from metricas import registrar_metricas, configurar_presupuesto, leer_excel, escribir_excel, listar_directorio
+from perfilador import registrar_perfilador
+from cache_respuestas import configurar_cache, respuesta_en_cache, incrementar_version
+from fragmentos import renderizar_filas
+from instantaneas import configurar_instantaneas, publicar_tras_escritura, leer_dataset
+from diario import configurar_diario, registro_de_cambios, crear_punto_control, asegurar_punto_control
+from versiones_fila import (COLUMNA_VERSION, asignar_ids_estables, normalizar_versiones, incrementar_versiones,
+                            filas_cambiadas, leer_version, version_obsoleta, clave_poliza_fecha)
+from esquemas import banderas_a_texto, igual_a, contiene, rellenar
+from escritura_diferida import (CONFIG_ESCRITURA_DIFERIDA_DEFECTO, configurar_escritura_diferida, leer_para_escritura,
+                                guardar_dataset, generacion_en_memoria, activa as escritura_diferida_activa,
+                                leer_vigente, vaciar as vaciar_escritura_diferida)
+from indice_vencimientos import obtener_indice, leer_ventana, programar_recalculo_diario
+from alertas import programar_resumen_diario
+from correspondencia_lote import generar_zip, generar_html_multipagina
+from exportaciones import exportar, preparar_filtros, FORMATOS as FORMATOS_EXPORTACION
+from fechas_es import formatear_fecha_larga, formatear_columna, fecha_actual_larga, MESES_CAPITALIZADOS
+from diferido import ModuloDiferido
+
+# pandas tarda en importarse; solo se carga cuando una ruta lo usa por primera vez
+pd = ModuloDiferido('pandas')
 
 def limpiar_valor_moneda(valor_str):
     """
@@ -52,6 +83,7 @@ def get_year_from_date(date_str):
             return None
 
 app = Flask(__name__) # Ensure app instance is created
+app.request_class = SolicitudConCargaStreaming # Adjuntos escritos en streaming con SHA-256 (ver cargas.py)
 app.config['SECRET_KEY'] = 'dev_super_secret_key_12345_replace_in_production'
 
 # Rutas BASE_DIR debe estar al nivel de donde corre app.py
@@ -61,6 +93,9 @@ CONFIG_FILE = os.path.join(BASE_DIR, 'config.json')
 CONSECUTIVO_FILE = os.path.join(BASE_DIR, 'consecutivo.txt')
 EXCEL_FILE = os.path.join(BASE_DIR, 'remisiones.xlsx')
 CLIENT_FOLDERS_BASE_DIR = os.path.join(BASE_DIR, 'CLIENTES_CARPETAS')
+CARGAS_TEMPORALES_DIR = os.path.join(BASE_DIR, 'CARGAS_TEMPORALES') # Debe estar en el mismo disco que CLIENTES_CARPETAS
+ALMACEN_ADJUNTOS_DIR = os.path.join(BASE_DIR, 'ALMACEN_ADJUNTOS') # Blobs por SHA-256 (mismo disco, para enlaces duros)
+PLANTILLAS_CACHE_DIR = os.path.join(BASE_DIR, 'CACHE_PLANTILLAS') # Bytecode compilado de las plantillas Jinja
 
 # --- Funciones de Configuración ---
 def load_config():
@@ -110,7 +145,8 @@ ORDEN_COLUMNAS_EXCEL_CARTERA = [
     'Intermediario_Original', # This is created from VENDEDOR
     'Porc_Com_Intermediario_Original', # This is created from PORCENTAJE DE COMISIÓN
     'Valor_Comision_Intermediario_Calc',
-    'Clasificacion_Manual', 'Line_of_Business_Manual'
+    'Clasificacion_Manual', 'Line_of_Business_Manual',
+    'VERSION_FILA' # Concurrencia optimista (versiones_fila.py)
 ]
 
 # --- Vencimientos Module Constants & Config ---
@@ -158,18 +194,74 @@ ORDEN_COLUMNAS_VENCIMIENTOS = [
     'ID_VENCIMIENTO', 'FECHA FIN', 'Fecha_inicio_seguimiento',
     'NÚMERO PÓLIZA', 'NOMBRES CLIENTE', 'ASEGURADORA', 'RAMO PRINCIPAL',
     'Responsable', 'Estado', 'Observaciones_adicionales',
-    'Remision_Asociada' # Nueva columna
+    'Remision_Asociada', # Nueva columna
+    'VERSION_FILA' # Concurrencia optimista (versiones_fila.py)
 ]
 
+# --- Índices cruzados (póliza -> registros de cada módulo) ---
+INDICES_DATA_DIR_NAME = 'DATOS_INDICES'
+INDICES_DATA_DIR = os.path.join(BASE_DIR, INDICES_DATA_DIR_NAME)
+
+# Columnas que el índice de clientes (vista Cliente 360) guarda por dataset.
+# Cartera y vencimientos solo traen el nombre del cliente en el reporte maestro.
+INDICE_CLIENTES_DATASETS = {
+    'remisiones': {
+        'nit': 'nit', 'nombre': 'tomador', 'clave': 'consecutivo',
+        'resumen': ['consecutivo', 'fecha_registro', 'aseguradora', 'ramo', 'poliza',
+                    'fecha_inicio', 'fecha_fin', 'estado', 'numero_remision_manual']
+    },
+    'cobros': {
+        'nit': 'NIT_CC', 'nombre': 'Tomador', 'clave': 'ID_COBRO',
+        'resumen': ['ID_COBRO', 'CONSECUTIVO_REMISION', 'N_Poliza', 'N_Cuota', 'Total_Cuotas',
+                    'Fecha_Vencimiento_Cuota', 'Estado', 'Tipo_Movimiento']
+    },
+    'cartera': {
+        'nit': None, 'nombre': 'NOMBRES CLIENTE', 'clave': 'ID_CARTERA',
+        'resumen': ['ID_CARTERA', 'FECHA CREACIÓN', 'NÚMERO PÓLIZA', 'ASEGURADORA', 'PRIMA NETA',
+                    'COMISIÓN', 'N_FACTURA_Manual']
+    },
+    'vencimientos': {
+        'nit': None, 'nombre': 'NOMBRES CLIENTE', 'clave': 'ID_VENCIMIENTO',
+        'resumen': ['ID_VENCIMIENTO', 'FECHA FIN', 'NÚMERO PÓLIZA', 'ASEGURADORA', 'RAMO PRINCIPAL',
+                    'Responsable', 'Estado', 'Remision_Asociada']
+    },
+    'siniestros': {
+        'nit': 'nit_cc', 'nombre': 'nombre_cliente', 'clave': 'ID_SINIESTRO',
+        'resumen': ['ID_SINIESTRO', 'numero_poliza', 'ramo', 'fecha_siniestro', 'archivos_adjuntos']
+    }
+}
+
 # --- Cobros Module Constants & Config ---
 COBROS_FILENAME = 'cobros.xlsx'
 COBROS_FILE = os.path.join(BASE_DIR, COBROS_FILENAME)
+
+# --- Siniestros Module Constants & Config ---
+SINIESTROS_DATA_DIR_NAME = 'DATOS_SINIESTROS'
+SINIESTROS_DATA_DIR = os.path.join(BASE_DIR, SINIESTROS_DATA_DIR_NAME)
+SINIESTROS_DB_FILENAME = 'siniestros.db'
+SINIESTROS_EXCEL_LEGACY = os.path.join(BASE_DIR, 'siniestros.xlsx') # Formato anterior, se importa una vez
+ORDEN_COLUMNAS_SINIESTROS = almacen_siniestros.ORDEN_COLUMNAS_SINIESTROS
 ORDEN_COLUMNAS_COBROS = [
     'ID_COBRO', 'CONSECUTIVO_REMISION', 'Tomador', 'NIT_CC', 'Aseguradora', 'Ramo',
     'N_Poliza', 'N_Cuota', 'Total_Cuotas', 'Fecha_Vencimiento_Cuota',
     'Fecha_Inicio_Vigencia', 'Fecha_Fin_Vigencia', 'Estado', 'Tipo_Movimiento'
 ]
 
+# Columnas que carga cada ruta de lectura (proyección: leer_excel/leer_dataset con columnas=...).
+# Cada lista es la unión de lo que usa la ruta y lo que usa su plantilla (incluido su JS):
+# al agregar un campo a la plantilla, agréguelo aquí.
+# recaudo.html (item.*) + filtros de recaudo
+COLUMNAS_RECAUDO = ['consecutivo', 'tomador', 'estado', 'fecha_registro', 'ramo', 'uib', 'ComisionTPP',
+                    'renovacion', 'negocio_nuevo', 'modificacion', 'co_corretaje_opcion']
+# cobros.html (cobro.* / pago.*) + Tipo_Movimiento para separar cobros y pagos
+COLUMNAS_PANEL_COBROS = ['ID_COBRO', 'Tomador', 'NIT_CC', 'Aseguradora', 'Ramo', 'N_Poliza', 'N_Cuota',
+                         'Total_Cuotas', 'Fecha_Vencimiento_Cuota', 'Estado', 'Tipo_Movimiento']
+# editar_cobro.html: el formulario (cobro.*) y la carta de cobro que arma su JS (cobroData.*)
+COLUMNAS_EDITAR_COBRO = ['ID_COBRO', 'CONSECUTIVO_REMISION', 'Tomador', 'Aseguradora', 'Ramo', 'N_Poliza',
+                         'N_Cuota', 'Total_Cuotas', 'Fecha_Vencimiento_Cuota']
+# prospectos_editar.html usa todos los campos del prospecto menos la fecha de creación
+COLUMNAS_EDITAR_PROSPECTO = [c for c in ORDEN_COLUMNAS_PROSPECTOS if c != 'Fecha Creacion']
+
 # --- Remisiones Formulario Constants ---
 
 # This is the definitive column order for remisiones.xlsx
@@ -204,13 +296,33 @@ ORDEN_COLUMNAS_EXCEL_REMISIONES = [
     'numero_remision_manual'
 ]
 
-# Configurar carpeta de carga
-os.makedirs(UPLOAD_FOLDER, exist_ok=True) # For remision attachments
-os.makedirs(CLIENT_FOLDERS_BASE_DIR, exist_ok=True) # For client folders
-os.makedirs(CARTERA_DATA_DIR, exist_ok=True) # For cartera data
-os.makedirs(VENCIMIENTOS_DATA_DIR, exist_ok=True) # For vencimientos data
-os.makedirs(PROSPECTOS_DATA_DIR, exist_ok=True) # For prospectos data
-os.makedirs(os.path.join(BASE_DIR, 'static', 'logos'), exist_ok=True) # For custom logos
+# --- Instantáneas de lectura ---
+INSTANTANEAS_DATA_DIR = os.path.join(BASE_DIR, 'DATOS_INSTANTANEAS')
+
+# --- Diario de cambios ---
+DIARIO_DATA_DIR = os.path.join(BASE_DIR, 'DATOS_DIARIO')
+
+# --- Alertas Module Constants & Config ---
+ALERTAS_DATA_DIR = os.path.join(BASE_DIR, 'DATOS_ALERTAS')
+
+# Directorios de datos: se crean en inicializar_aplicacion(), no al importar el módulo
+DIRECTORIOS_DATOS = [
+    UPLOAD_FOLDER, # For remision attachments
+    CLIENT_FOLDERS_BASE_DIR, # For client folders
+    CARTERA_DATA_DIR, # For cartera data
+    VENCIMIENTOS_DATA_DIR, # For vencimientos data
+    PROSPECTOS_DATA_DIR, # For prospectos data
+    INDICES_DATA_DIR, # For cross-module indexes
+    SINIESTROS_DATA_DIR, # For siniestros store
+    CARGAS_TEMPORALES_DIR, # For streamed uploads before they are moved into place
+    ALMACEN_ADJUNTOS_DIR, # For deduplicated attachment blobs
+    os.path.join(BASE_DIR, 'static', 'logos'), # For custom logos
+    PLANTILLAS_CACHE_DIR, # For compiled Jinja bytecode
+    ALERTAS_DATA_DIR, # For daily alert digests and the mail spool
+    INSTANTANEAS_DATA_DIR, # For read snapshots of the datasets
+    DIARIO_DATA_DIR, # For the mutation journal and its checkpoints
+]
+bloqueos.configurar_directorio(os.path.join(BASE_DIR, 'DATOS_BLOQUEOS')) # Lock files for coordinated writes
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['CLIENT_FOLDERS_BASE_DIR'] = CLIENT_FOLDERS_BASE_DIR
 app.config['CARTERA_DATA_DIR'] = CARTERA_DATA_DIR
@@ -219,9 +331,160 @@ app.config['VENCIMIENTOS_DATA_DIR'] = VENCIMIENTOS_DATA_DIR
 app.config['VENCIMIENTOS_PROCESADA_FILE_PATH'] = os.path.join(VENCIMIENTOS_DATA_DIR, VENCIMIENTOS_PROCESADOS_FILENAME)
 app.config['PROSPECTOS_DATA_DIR'] = PROSPECTOS_DATA_DIR
 app.config['PROSPECTOS_FILE_PATH'] = os.path.join(PROSPECTOS_DATA_DIR, PROSPECTOS_FILENAME)
+app.config['INDICES_DATA_DIR'] = INDICES_DATA_DIR
+app.config['CARGAS_TEMPORALES_DIR'] = CARGAS_TEMPORALES_DIR
+
+# Límites de carga de adjuntos, configurables en config.json -> "cargas"
+_config_cargas = load_config().get('cargas', {})
+app.config['MAX_CONTENT_LENGTH'] = int(_config_cargas.get('tamano_maximo_solicitud_mb', 200)) * 1024 * 1024
+app.config['CARGAS_TAMANO_MAXIMO_ARCHIVO'] = int(_config_cargas.get('tamano_maximo_archivo_mb', 50)) * 1024 * 1024
+app.config['CARGAS_HILOS'] = int(_config_cargas.get('hilos', 4))
+
+# Plantillas: bytecode compilado en disco y sin revisar cambios en cada render
+# (solo 'python app.py --dev' activa la recarga automática), config.json -> "plantillas"
+_config_plantillas = load_config().get('plantillas', {})
+app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(PLANTILLAS_CACHE_DIR)}
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+app.config['PLANTILLAS_PRECOMPILAR'] = bool(_config_plantillas.get('precompilar', True))
+
+# Métricas por ruta e I/O (/metrics), configurables en config.json -> "metricas"
+_config_metricas = load_config().get('metricas', {})
+registrar_metricas(app,
+                   umbral_lento_ms=_config_metricas.get('umbral_lento_ms', 1000),
+                   archivo_lentas=os.path.join(BASE_DIR, _config_metricas.get('archivo_lentas', 'solicitudes_lentas.log')))
+# Presupuesto de memoria por proceso para las cargas de datos (config.json -> "memoria")
+_config_memoria = load_config().get('memoria', {})
+configurar_presupuesto(_config_memoria.get('presupuesto_mb', 0), _config_memoria.get('espera_segundos', 30))
+
+# Perfilado opcional por solicitud (config.json -> "perfilador"); deshabilitado no instala hooks
+registrar_perfilador(app, load_config().get('perfilador', {}), os.path.join(BASE_DIR, 'DATOS_PERFILES'))
+
+# Caché de páginas de consulta: cada dataset tiene un contador de versión que
+# escritura_coordinada incrementa y se combina con el mtime de sus archivos
+_config_cache = load_config().get('cache_respuestas', {})
+configurar_cache(os.path.join(INDICES_DATA_DIR, 'versiones'), {
+    'remisiones': [EXCEL_FILE],
+    'cobros': [COBROS_FILE],
+    'prospectos': [app.config['PROSPECTOS_FILE_PATH']],
+    'cartera': [app.config['CARTERA_PROCESADA_FILE_PATH']],
+    'vencimientos': [app.config['VENCIMIENTOS_PROCESADA_FILE_PATH']],
+    'config': [CONFIG_FILE],
+}, maximo_entradas=_config_cache.get('maximo_entradas', 64), habilitado=_config_cache.get('habilitado', True))
+
+# Instantáneas de lectura: cada escritura publica una generación nueva del dataset y las
+# páginas de consulta la leen sin bloqueos (config.json -> "instantaneas").
+# Se registra antes que incrementar_version para que la versión nueva ya encuentre su instantánea.
+ARCHIVOS_DATASETS = {
+    'remisiones': EXCEL_FILE,
+    'cobros': COBROS_FILE,
+    'prospectos': app.config['PROSPECTOS_FILE_PATH'],
+    'cartera': app.config['CARTERA_PROCESADA_FILE_PATH'],
+    'vencimientos': app.config['VENCIMIENTOS_PROCESADA_FILE_PATH'],
+}
+_config_instantaneas = load_config().get('instantaneas', {})
+configurar_instantaneas(INSTANTANEAS_DATA_DIR, ARCHIVOS_DATASETS,
+                        conservar=_config_instantaneas.get('generaciones', 3), habilitado=_config_instantaneas.get('habilitado', True))
+bloqueos.al_completar_escritura(publicar_tras_escritura)
+bloqueos.al_completar_escritura(incrementar_version)
+
+# Diario de cambios: cada mutación se anota (y se lleva a disco) antes de escribir el Excel;
+# 'python diario.py reproducir <dataset>' reconstruye un dataset (config.json -> "diario")
+configurar_diario(DIARIO_DATA_DIR, ARCHIVOS_DATASETS, habilitado=load_config().get('diario', {}).get('habilitado', True))
+
+# Escritura diferida: los cambios puntuales (Estado de un vencimiento, cobro Cobrado, prospecto
+# Ganado/Perdido) se guardan en memoria tras anotarlos en el diario y el Excel se escribe cada
+# pocos segundos (config.json -> "escritura_diferida"). Las demás escrituras vacían antes lo pendiente.
+_config_diferida = {**CONFIG_ESCRITURA_DIFERIDA_DEFECTO, **load_config().get('escritura_diferida', {})}
+configurar_escritura_diferida(ARCHIVOS_DATASETS, _config_diferida['datasets'],
+                              intervalo_segundos=_config_diferida['intervalo_segundos'],
+                              maximo_mutaciones=_config_diferida['maximo_mutaciones'],
+                              opciones_lectura={'prospectos': {'dtype': {'ID_PROSPECTO': str}}},
+                              habilitado=_config_diferida['habilitado'])
+app.config['ESCRITURA_DIFERIDA'] = escritura_diferida_activa()
+bloqueos.al_iniciar_escritura(vaciar_escritura_diferida)
+
+# Resumen diario de alertas por responsable (alertas.py), config.json -> "alertas"
+RUTAS_ALERTAS = {
+    'vencimientos': app.config['VENCIMIENTOS_PROCESADA_FILE_PATH'],
+    'cobros': COBROS_FILE,
+    'remisiones': EXCEL_FILE,
+    'plantilla': os.path.join(BASE_DIR, 'plantillas', 'plantilla_alertas.txt'),
+    'salida': ALERTAS_DATA_DIR,
+}
+
+# Dashboard de vencimientos: filas por página y ventana por defecto en días respecto a hoy
+# (la URL puede pedir otra con desde/hasta o fecha_desde/fecha_hasta), config.json -> "vencimientos"
+_config_vencimientos = load_config().get('vencimientos', {})
+app.config['VENCIMIENTOS_FILAS_POR_PAGINA'] = int(_config_vencimientos.get('filas_por_pagina', 100))
+app.config['VENCIMIENTOS_VENTANA'] = (int(_config_vencimientos.get('ventana_dias_atras', 100)) * -1,
+                                      int(_config_vencimientos.get('ventana_dias_adelante', 100)))
+
+# Adjuntos deduplicados: CLIENTES_CARPETAS se materializa con enlaces duros al almacén
+almacen_adjuntos = AlmacenAdjuntos(ALMACEN_ADJUNTOS_DIR,
+                                   os.path.join(INDICES_DATA_DIR, 'adjuntos.db'),
+                                   CLIENT_FOLDERS_BASE_DIR)
+app.config['SINIESTROS_DB_PATH'] = os.path.join(SINIESTROS_DATA_DIR, SINIESTROS_DB_FILENAME)
+
+# --- Inicialización ---
+_inicializacion = {'hecha': False, 'lock': threading.Lock()}
+
+def inicializar_aplicacion():
+    """
+    Crea los directorios de datos e importa el siniestros.xlsx legado. Es idempotente.
+    servidor.py la llama antes de atender solicitudes; si se omite (p. ej. con
+    'flask run'), se ejecuta en la primera solicitud.
+    """
+    with _inicializacion['lock']:
+        if _inicializacion['hecha']:
+            return
+        for directorio in DIRECTORIOS_DATOS:
+            os.makedirs(directorio, exist_ok=True)
+        if app.config['PLANTILLAS_PRECOMPILAR']:
+            precompilar_plantillas()
+        with bloqueo_interproceso('siniestros'):  # varios workers arrancan a la vez
+            almacen_siniestros.importar_excel_legacy(app.config['SINIESTROS_DB_PATH'], SINIESTROS_EXCEL_LEGACY)
+        # Cada diario necesita un punto de control desde el que reproducirlo
+        for dataset in ARCHIVOS_DATASETS:
+            try:
+                asegurar_punto_control(dataset)
+            except Exception as e:
+                print(f"ADVERTENCIA: No se pudo crear el punto de control de '{dataset}': {type(e).__name__} - {e}")
+        # Dias_Para_Vencer del índice de vencimientos se recalcula a medianoche (en los workers
+        # creados por fork el hilo no sobrevive y el recálculo ocurre en la primera consulta del día)
+        programar_recalculo_diario()
+        config = load_config()
+        if config.get('alertas', {}).get('habilitado'):
+            programar_resumen_diario(RUTAS_ALERTAS, config['alertas'], config.get('nombre_empresa', ''))
+        _inicializacion['hecha'] = True
+
+def precompilar_plantillas():
+    """
+    Compila todas las plantillas (incluidas las de correspondencia, que se eligen
+    dinámicamente) para que el primer render de cada página no pague la compilación.
+    Con gunicorn se ejecuta en el proceso maestro y los workers la heredan.
+    """
+    inicio = datetime.now()
+    compiladas = 0
+    for nombre in app.jinja_env.list_templates(extensions=['html', 'txt']):
+        try:
+            app.jinja_env.get_template(nombre)
+            compiladas += 1
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudo compilar la plantilla {nombre}: {e}")
+    print(f"{compiladas} plantillas compiladas en {(datetime.now() - inicio).total_seconds():.2f} s")
+
+@app.before_request
+def _asegurar_inicializacion():
+    if not _inicializacion['hecha']:
+        inicializar_aplicacion()
 
 # Obtener el consecutivo
 def obtener_consecutivo():
+    # Leer-incrementar-escribir debe ser atómico entre workers para no repetir consecutivos
+    with bloqueo_interproceso('consecutivo'):
+        return _obtener_consecutivo_sin_bloqueo()
+
+def _obtener_consecutivo_sin_bloqueo():
     if not os.path.exists(CONSECUTIVO_FILE):
         with open(CONSECUTIVO_FILE, 'w') as f:
             f.write('1')
@@ -248,7 +511,7 @@ def guardar_remision(datos):
     df = pd.DataFrame([datos])
     try:
         if os.path.exists(EXCEL_FILE):
-            df_existente = pd.read_excel(EXCEL_FILE)
+            df_existente = leer_excel(EXCEL_FILE)
             df_final = pd.concat([df_existente, df], ignore_index=True)
         else:
             df_final = df
@@ -271,7 +534,9 @@ def guardar_remision(datos):
         else:
             print("ADVERTENCIA: ORDEN_COLUMNAS_EXCEL_REMISIONES no está definida o no es una lista. remisiones.xlsx se guardará con el orden actual del DataFrame.")
 
-        df_final.to_excel(EXCEL_FILE, index=False)
+        with registro_de_cambios('remisiones', 'consecutivo') as diario:
+            diario.insertar([datos])
+            escribir_excel(df_final, EXCEL_FILE, index=False)
         return True
     except Exception as e:
         print(f"Error al guardar en Excel: {e}")
@@ -281,7 +546,7 @@ def guardar_cobros(nuevos_cobros):
     df = pd.DataFrame(nuevos_cobros)
     try:
         if os.path.exists(COBROS_FILE):
-            df_existente = pd.read_excel(COBROS_FILE)
+            df_existente = leer_excel(COBROS_FILE)
             df_final = pd.concat([df_existente, df], ignore_index=True)
         else:
             df_final = df
@@ -292,7 +557,10 @@ def guardar_cobros(nuevos_cobros):
                 df_final[col] = ""
         df_final = df_final[ORDEN_COLUMNAS_COBROS]
 
-        df_final.to_excel(COBROS_FILE, index=False)
+        with registro_de_cambios('cobros', 'ID_COBRO') as diario:
+            diario.insertar(nuevos_cobros)
+            escribir_excel(df_final, COBROS_FILE, index=False)
+        indexar_clientes('cobros', nuevos_cobros)
         return True
     except Exception as e:
         print(f"Error al guardar en {COBROS_FILENAME}: {e}")
@@ -301,12 +569,66 @@ def guardar_cobros(nuevos_cobros):
 def cargar_remisiones():
     if os.path.exists(EXCEL_FILE):
         try:
-            return pd.read_excel(EXCEL_FILE).to_dict(orient='records')
+            # Las plantillas comparan las casillas con 'si'/'no'
+            return banderas_a_texto(leer_dataset('remisiones'), 'remisiones').to_dict(orient='records')
         except Exception as e:
             print(f"Error al cargar desde Excel: {e}")
             return []
     return []
 
+# --- Mantenimiento del índice de clientes ---
+def indexar_clientes(dataset, registros, reconstruir=False):
+    """Agrega registros al índice de clientes (o reconstruye la sección del dataset)."""
+    conf = INDICE_CLIENTES_DATASETS[dataset]
+    funcion = reconstruir_indice_clientes if reconstruir else agregar_a_indice_clientes
+    try:
+        funcion(INDICES_DATA_DIR, dataset, registros, conf['nit'], conf['nombre'], conf['clave'], conf['resumen'])
+    except Exception as e:
+        print(f"ADVERTENCIA: No se pudo actualizar el índice de clientes ({dataset}): {e}")
+
+def actualizar_indice_clientes(dataset, claves, cambios):
+    """Refleja en el índice de clientes un cambio puntual (estado, factura, responsable...)."""
+    try:
+        actualizar_resumen_cliente(INDICES_DATA_DIR, dataset, claves, cambios)
+    except Exception as e:
+        print(f"ADVERTENCIA: No se pudo actualizar el índice de clientes ({dataset}): {e}")
+
+def indexar_carpeta_cliente(nombre_carpeta, nit, nombre):
+    try:
+        registrar_carpeta_cliente(INDICES_DATA_DIR, nombre_carpeta, nit, nombre)
+    except Exception as e:
+        print(f"ADVERTENCIA: No se pudo indexar la carpeta de cliente '{nombre_carpeta}': {e}")
+
+def _leer_registros_excel(ruta):
+    if ruta and os.path.exists(ruta):
+        return leer_excel(ruta).to_dict(orient='records')
+    return []
+
+def asegurar_indices_clientes():
+    """Construye una sola vez las secciones del índice de clientes que aún no existen (instalaciones previas)."""
+    origenes = {
+        'remisiones': cargar_remisiones,
+        'cobros': lambda: _leer_registros_excel(COBROS_FILE),
+        'cartera': lambda: _leer_registros_excel(app.config['CARTERA_PROCESADA_FILE_PATH']),
+        'vencimientos': lambda: _leer_registros_excel(app.config['VENCIMIENTOS_PROCESADA_FILE_PATH']),
+        'siniestros': lambda: almacen_siniestros.iterar_siniestros(app.config['SINIESTROS_DB_PATH']),
+    }
+    for dataset, cargar in origenes.items():
+        if not indice_clientes_existe(INDICES_DATA_DIR, dataset):
+            indexar_clientes(dataset, cargar(), reconstruir=True)
+    if not indice_clientes_existe(INDICES_DATA_DIR, 'carpetas'):
+        reconstruir_indice_carpetas(INDICES_DATA_DIR, app.config['CLIENT_FOLDERS_BASE_DIR'])
+
+@app.errorhandler(413)
+def carga_demasiado_grande(e):
+    if isinstance(e, ArchivoDemasiadoGrande):
+        limite_mb = app.config['CARGAS_TAMANO_MAXIMO_ARCHIVO'] // (1024 * 1024)
+        mensaje = f'Un archivo adjunto supera el tamaño máximo permitido ({limite_mb} MB por archivo).'
+    else:  # MAX_CONTENT_LENGTH: la solicitud completa (todos los adjuntos y campos)
+        limite_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        mensaje = f'Los archivos adjuntos superan en conjunto el tamaño máximo permitido ({limite_mb} MB por solicitud).'
+    return jsonify({'success': False, 'status': 'error', 'message': mensaje}), 413
+
 @app.route('/', methods=['GET'])
 def index():
     config = load_config()
@@ -328,14 +650,19 @@ def panel_configuraciones():
                 relative_save_path = os.path.join('logos', filename)
                 absolute_save_path = os.path.join(BASE_DIR, 'static', relative_save_path)
                 logo_file.save(absolute_save_path)
-                config['logo_path'] = f"logos/{filename}"
-                save_config(config)
+                # El logo ya está guardado: el bloqueo solo cubre leer-modificar-escribir config.json
+                with seccion_de_escritura('config'):
+                    config = load_config()
+                    config['logo_path'] = f"logos/{filename}"
+                    save_config(config)
                 flash('Logo actualizado exitosamente.', 'success')
 
         elif form_section == 'general':
-            config['nombre_empresa'] = request.form.get('nombre_empresa', '').strip()
-            config['prefijo_consecutivo'] = request.form.get('prefijo_consecutivo', '').strip()
-            save_config(config)
+            with seccion_de_escritura('config'):
+                config = load_config()
+                config['nombre_empresa'] = request.form.get('nombre_empresa', '').strip()
+                config['prefijo_consecutivo'] = request.form.get('prefijo_consecutivo', '').strip()
+                save_config(config)
             flash('Información general actualizada exitosamente.', 'success')
 
         return redirect(url_for('panel_configuraciones'))
@@ -343,6 +670,7 @@ def panel_configuraciones():
     return render_template('configuraciones.html', config=config)
 
 @app.route('/configuraciones/listas/<list_name>', methods=['GET', 'POST'])
+@escritura_coordinada('config')
 def gestionar_lista(list_name):
     config = load_config()
     # Asegurarse de que la lista exista en la configuración
@@ -539,6 +867,7 @@ def registrar():
         tipos = request.form.getlist("tipo_archivo[]")
         otros_tipos_nombres = request.form.getlist("otro_tipo_nombre[]")
         nombres_archivos_guardados = []
+        tareas_guardado = []
 
         for i, archivo in enumerate(archivos):
             if archivo and archivo.filename:
@@ -570,56 +899,65 @@ def registrar():
                 else: # Includes 'Otro'
                     ruta_destino_final = os.path.join(ruta_base_cliente, 'DOCUMENTOS')
 
-                os.makedirs(ruta_destino_final, exist_ok=True)
-
                 nombre_base_archivo = f"{ramo_form}_{datos.get('poliza', 'SINPOLIZA')}_{datos.get('aseguradora', 'SINASEGURADORA')}_{tipo_para_usar_en_nombre}".replace(' ', '_')
                 filename = secure_filename(nombre_base_archivo + extension)
                 # Truncation logic can be added here if needed
 
                 ruta_archivo_con_nombre = os.path.join(ruta_destino_final, filename)
-                archivo.save(ruta_archivo_con_nombre)
+                tareas_guardado.append((archivo, ruta_archivo_con_nombre))
                 nombres_archivos_guardados.append(os.path.relpath(ruta_archivo_con_nombre, app.config['CLIENT_FOLDERS_BASE_DIR']))
 
+        # Los adjuntos ya llegaron a disco durante la carga; aquí solo se mueven a su carpeta en paralelo
+        guardar_archivos_en_paralelo(tareas_guardado, almacen=almacen_adjuntos)
         datos['archivos'] = ", ".join(nombres_archivos_guardados)
 
-        if guardar_remision(datos):
-            # --- Lógica para generar cuotas de cobro ---
-            if datos.get('periodicidad_pago') == 'Mensual' and datos.get('forma_pago') != 'Contado':
-                try:
-                    num_cuotas = int(datos.get('numero_cuotas', 0))
-                    if num_cuotas > 0:
-                        nuevos_cobros = []
-                        # Use YYYY-MM-DD format for parsing, which is what HTML date inputs provide
-                        fecha_inicio_dt = datetime.strptime(datos.get('fecha_inicio'), '%Y-%m-%d')
-
-                        for i in range(num_cuotas):
-                            fecha_vencimiento = fecha_inicio_dt + relativedelta(months=i)
-
-                            cobro = {
-                                'ID_COBRO': uuid.uuid4().hex[:10].upper(),
-                                'CONSECUTIVO_REMISION': datos.get('consecutivo'),
-                                'Tomador': datos.get('tomador'),
-                                'NIT_CC': datos.get('nit'),
-                                'Aseguradora': datos.get('aseguradora'),
-                                'Ramo': datos.get('ramo'),
-                                'N_Poliza': datos.get('poliza'),
-                                'N_Cuota': i + 1,
-                                'Total_Cuotas': num_cuotas,
-                                'Fecha_Vencimiento_Cuota': fecha_vencimiento.strftime('%Y-%m-%d'),
-                                'Fecha_Inicio_Vigencia': datos.get('fecha_inicio'),
-                                'Fecha_Fin_Vigencia': datos.get('fecha_fin'),
-                                'Estado': 'Pendiente',
-                                'Tipo_Movimiento': datos_formulario.get('tipo_movimiento', 'Cobro mensual')
-                            }
-                            nuevos_cobros.append(cobro)
-
-                        guardar_cobros(nuevos_cobros)
-                except (ValueError, TypeError) as e:
-                    print(f"Error al procesar cuotas de cobro para {datos.get('consecutivo')}: {e}")
-
+        # Los bloqueos se toman solo para leer-modificar-escribir, con los archivos ya recibidos y guardados
+        with seccion_de_escritura('remisiones', 'cobros'):
+            guardada = guardar_remision(datos)
+            if guardada:
+                # La póliza de enlace (old_policy_number si se modificó) se calcula una sola vez aquí
+                registrar_enlace_remision(INDICES_DATA_DIR, datos['consecutivo'], poliza_de_enlace_remision(datos))
+                indexar_clientes('remisiones', [datos])
+                indexar_carpeta_cliente(nombre_carpeta_cliente_seguro, nit_cliente_form, nombre_cliente_form)
+
+                # --- Lógica para generar cuotas de cobro ---
+                if datos.get('periodicidad_pago') == 'Mensual' and datos.get('forma_pago') != 'Contado':
+                    try:
+                        num_cuotas = int(datos.get('numero_cuotas', 0))
+                        if num_cuotas > 0:
+                            nuevos_cobros = []
+                            # Use YYYY-MM-DD format for parsing, which is what HTML date inputs provide
+                            fecha_inicio_dt = datetime.strptime(datos.get('fecha_inicio'), '%Y-%m-%d')
+                            from dateutil.relativedelta import relativedelta
+
+                            for i in range(num_cuotas):
+                                fecha_vencimiento = fecha_inicio_dt + relativedelta(months=i)
+
+                                cobro = {
+                                    'ID_COBRO': uuid.uuid4().hex[:10].upper(),
+                                    'CONSECUTIVO_REMISION': datos.get('consecutivo'),
+                                    'Tomador': datos.get('tomador'),
+                                    'NIT_CC': datos.get('nit'),
+                                    'Aseguradora': datos.get('aseguradora'),
+                                    'Ramo': datos.get('ramo'),
+                                    'N_Poliza': datos.get('poliza'),
+                                    'N_Cuota': i + 1,
+                                    'Total_Cuotas': num_cuotas,
+                                    'Fecha_Vencimiento_Cuota': fecha_vencimiento.strftime('%Y-%m-%d'),
+                                    'Fecha_Inicio_Vigencia': datos.get('fecha_inicio'),
+                                    'Fecha_Fin_Vigencia': datos.get('fecha_fin'),
+                                    'Estado': 'Pendiente',
+                                    'Tipo_Movimiento': datos_formulario.get('tipo_movimiento', 'Cobro mensual')
+                                }
+                                nuevos_cobros.append(cobro)
+
+                            guardar_cobros(nuevos_cobros)
+                    except (ValueError, TypeError) as e:
+                        print(f"Error al procesar cuotas de cobro para {datos.get('consecutivo')}: {e}")
+
+        if guardada:
             return jsonify({'success': True, 'message': 'Remisión guardada exitosamente', 'consecutivo': datos.get('consecutivo')})
-        else:
-            return jsonify({'success': False, 'message': 'Error al guardar la remisión en Excel.'}), 500
+        return jsonify({'success': False, 'message': 'Error al guardar la remisión en Excel.'}), 500
 
     except Exception as e:
         print(f"Error en /registrar: {type(e).__name__} - {e}")
@@ -628,6 +966,7 @@ def registrar():
         return jsonify({'success': False, 'message': f'Error interno del servidor: {e}'}), 500
 
 @app.route('/control')
+@respuesta_en_cache('remisiones', 'config')
 def control():
     config = load_config()
     remisiones_data = cargar_remisiones()
@@ -659,19 +998,24 @@ def control():
                            opciones_plantilla=config.get('listas', {}).get('tipos_plantilla_correspondencia', []))
 
 @app.route('/marcar_creado', methods=['POST'])
+@escritura_coordinada('remisiones')
 def marcar_creado():
     consecutivo_a_marcar = request.form.get('consecutivo')
     remisiones_actuales = cargar_remisiones()
     actualizado = False
     for remision in remisiones_actuales:
         if remision['consecutivo'] == consecutivo_a_marcar:
+            estado_anterior = remision.get('estado')
             remision['estado'] = 'Creado'
             actualizado = True
             break
     if actualizado:
         df = pd.DataFrame(remisiones_actuales)
         try:
-            df.to_excel(EXCEL_FILE, index=False)
+            with registro_de_cambios('remisiones', 'consecutivo') as diario:
+                diario.actualizar(consecutivo_a_marcar, {'estado': estado_anterior}, {'estado': 'Creado'})
+                escribir_excel(df, EXCEL_FILE, index=False)
+            actualizar_indice_clientes('remisiones', [consecutivo_a_marcar], {'estado': 'Creado'})
         except Exception as e:
             print(f"Error al guardar Excel después de marcar como creado: {e}")
     return redirect(url_for('control'))
@@ -715,7 +1059,66 @@ def editar_remision(consecutivo_id):
     else:
         return f"Error: Remisión con consecutivo {consecutivo_id} no encontrada. Verifique el número o contacte soporte.", 404
 
+def filas_de_poliza(df_vencimientos, numero_poliza):
+    """
+    Máscara de las filas de vencimientos de una póliza según el índice de pólizas
+    (solo se leen las filas indexadas), o None si el índice falta o ya no coincide con
+    el DataFrame (otra fila en esa posición, p. ej. tras una edición manual del Excel).
+    """
+    if not indice_polizas_existe(INDICES_DATA_DIR, 'vencimientos'):
+        return None
+    clave = normalizar_numero_poliza(numero_poliza)
+    posiciones = []
+    for id_venc, fila in buscar_poliza(INDICES_DATA_DIR, 'vencimientos', numero_poliza):
+        posicion = fila - 2  # Fila 1 = encabezados
+        if not 0 <= posicion < len(df_vencimientos) \
+                or normalizar_numero_poliza(df_vencimientos['ID_VENCIMIENTO'].iat[posicion]) != normalizar_numero_poliza(id_venc) \
+                or normalizar_numero_poliza(df_vencimientos['NÚMERO PÓLIZA'].iat[posicion]) != clave:
+            return None
+        posiciones.append(posicion)
+    mascara = pd.Series(False, index=df_vencimientos.index)
+    mascara.iloc[posiciones] = True
+    return mascara
+
+def actualizar_vencimientos_por_poliza(numero_poliza, cambios):
+    """
+    Aplica 'cambios' ({columna: valor}) a los vencimientos de una póliza y reescribe el
+    Excel. Las filas salen del índice de pólizas; si el índice falta o está desactualizado
+    se recorre la columna NÚMERO PÓLIZA y se reconstruye.
+    Devuelve el número de registros modificados.
+    """
+    ruta_vencimientos = app.config['VENCIMIENTOS_PROCESADA_FILE_PATH']
+    df_vencimientos = leer_excel(ruta_vencimientos)
+    if 'NÚMERO PÓLIZA' not in df_vencimientos.columns:
+        print(f"Advertencia: Columna 'NÚMERO PÓLIZA' no encontrada en {ruta_vencimientos} al intentar actualizar vencimientos.")
+        return 0
+
+    for col_m_v in ORDEN_COLUMNAS_VENCIMIENTOS:
+        if col_m_v not in df_vencimientos.columns:
+            df_vencimientos[col_m_v] = 0 if col_m_v == 'ID_VENCIMIENTO' else ''
+    df_vencimientos = normalizar_versiones(df_vencimientos[ORDEN_COLUMNAS_VENCIMIENTOS])
+
+    filas_afectadas_mask = filas_de_poliza(df_vencimientos, numero_poliza)
+    if filas_afectadas_mask is None:
+        filas_afectadas_mask = df_vencimientos['NÚMERO PÓLIZA'].map(normalizar_numero_poliza) == normalizar_numero_poliza(numero_poliza)
+        # Los cambios no tocan NÚMERO PÓLIZA ni el orden de las filas: el índice reconstruido sigue valiendo tras escribir
+        reconstruir_indice_polizas(INDICES_DATA_DIR, 'vencimientos', df_vencimientos, 'NÚMERO PÓLIZA', 'ID_VENCIMIENTO')
+    vencimientos_modificados_count = int(filas_afectadas_mask.sum())
+    if vencimientos_modificados_count > 0:
+        with registro_de_cambios('vencimientos', 'ID_VENCIMIENTO') as diario:
+            # La versión nueva también va al diario: reproducir debe dejar la misma VERSION_FILA
+            diario.actualizar_filas(df_vencimientos, filas_afectadas_mask,
+                                    {**cambios, COLUMNA_VERSION: df_vencimientos[COLUMNA_VERSION] + 1})
+            for columna, valor in cambios.items():
+                df_vencimientos[columna] = df_vencimientos[columna].astype(object)
+                df_vencimientos.loc[filas_afectadas_mask, columna] = valor
+            incrementar_versiones(df_vencimientos, filas_afectadas_mask)
+            escribir_excel(df_vencimientos, ruta_vencimientos, index=False)
+        actualizar_indice_clientes('vencimientos', df_vencimientos.loc[filas_afectadas_mask, 'ID_VENCIMIENTO'].tolist(), cambios)
+    return vencimientos_modificados_count
+
 @app.route('/guardar_numero_remision', methods=['POST'])
+@escritura_coordinada('remisiones', 'vencimientos')
 def guardar_numero_remision():
     consecutivo_a_actualizar = request.form.get('consecutivo')
     nuevo_numero_remision = request.form.get('numero_remision_manual', '').strip()
@@ -724,10 +1127,13 @@ def guardar_numero_remision():
     remisiones = cargar_remisiones()
     remisiones_actualizadas_df_list = []
     actualizacion_realizada = False
+    remision_actualizada_data = None
     for remision_data in remisiones:
         if str(remision_data.get('consecutivo')).strip() == str(consecutivo_a_actualizar).strip():
+            numero_anterior = remision_data.get('numero_remision_manual')
             remision_data['numero_remision_manual'] = nuevo_numero_remision
             actualizacion_realizada = True
+            remision_actualizada_data = remision_data
         remisiones_actualizadas_df_list.append(remision_data)
     if actualizacion_realizada:
         df = pd.DataFrame(remisiones_actualizadas_df_list)
@@ -744,84 +1150,41 @@ def guardar_numero_remision():
             else:
                 print("ADVERTENCIA en guardar_numero_remision: ORDEN_COLUMNAS_EXCEL_REMISIONES no definida. Remisiones se guardará con orden actual.")
 
-            df.to_excel(EXCEL_FILE, index=False)
+            with registro_de_cambios('remisiones', 'consecutivo') as diario:
+                diario.actualizar(consecutivo_a_actualizar, {'numero_remision_manual': numero_anterior},
+                                  {'numero_remision_manual': nuevo_numero_remision})
+                escribir_excel(df, EXCEL_FILE, index=False)
+            actualizar_indice_clientes('remisiones', [consecutivo_a_actualizar], {'numero_remision_manual': nuevo_numero_remision})
             # flash(f'Número de remisión para {consecutivo_a_actualizar} guardado.', 'success') # Example original flash
         except Exception as e:
             print(f"Error al guardar Excel en /guardar_numero_remision: {e}")
             return f"Error crítico al intentar guardar los cambios en el archivo Excel: {e}. Por favor, contacte soporte.", 500
 
         # --- Inicia lógica para actualizar vencimientos asociados ---
-        # 'actualizacion_realizada' should be True if the above save was successful.
-        # 'nuevo_numero_remision' is from request.form
-        # 'numero_poliza_de_remision' should have been extracted from df for the updated row.
-        # 'consecutivo_a_actualizar' is also available.
-
         if actualizacion_realizada and nuevo_numero_remision.strip() : # Only proceed if a non-empty numero_remision_manual was set
-            numero_poliza_a_buscar = None
-            remision_actualizada_data = df[df['consecutivo'] == consecutivo_a_actualizar].iloc[0]
-
-            # Check if the policy number was modified and use the old one if available
-            policy_modified_flag = remision_actualizada_data.get('policy_number_modified')
-            old_policy_number = remision_actualizada_data.get('old_policy_number')
-
-            if policy_modified_flag == 'si' and pd.notna(old_policy_number) and str(old_policy_number).strip():
-                # Convert to int to remove decimals, then to string for matching.
-                try:
-                    numero_poliza_a_buscar = str(int(float(old_policy_number))).strip()
-                except (ValueError, TypeError):
-                    # Fallback if conversion fails for some reason
-                    numero_poliza_a_buscar = str(old_policy_number).strip()
+            # La póliza de enlace se calculó al registrar la remisión (incluye old_policy_number);
+            # las remisiones anteriores al índice se calculan aquí como respaldo.
+            numero_poliza_a_buscar = poliza_enlace_de_consecutivo(INDICES_DATA_DIR, consecutivo_a_actualizar)
+            if numero_poliza_a_buscar is None:
+                numero_poliza_a_buscar = poliza_de_enlace_remision(remision_actualizada_data)
+
+            ruta_vencimientos = app.config.get('VENCIMIENTOS_PROCESADA_FILE_PATH')
+            if not numero_poliza_a_buscar:
+                flash('No se proporcionó un número de póliza válido en la remisión, no se actualizaron vencimientos.', 'info')
+            elif not (ruta_vencimientos and os.path.exists(ruta_vencimientos)):
+                flash('Archivo de vencimientos no encontrado. No se pudieron actualizar estados de vencimiento.', 'info')
             else:
-                numero_poliza_a_buscar = str(remision_actualizada_data.get('poliza', '')).strip()
-
-            if numero_poliza_a_buscar and numero_poliza_a_buscar not in ['N/A', 'None', '', 'nan', 'NaN']:
-                ruta_vencimientos = app.config.get('VENCIMIENTOS_PROCESADA_FILE_PATH')
-                if ruta_vencimientos and os.path.exists(ruta_vencimientos):
-                    try:
-                        df_vencimientos = pd.read_excel(ruta_vencimientos)
-                        vencimientos_modificados_count = 0
-
-                        if 'NÚMERO PÓLIZA' in df_vencimientos.columns:
-                            # Ensure consistent string comparison
-                            df_vencimientos['NÚMERO PÓLIZA_str_comp'] = df_vencimientos['NÚMERO PÓLIZA'].astype(str).str.strip().fillna('')
-
-                            filas_afectadas_mask = df_vencimientos['NÚMERO PÓLIZA_str_comp'] == numero_poliza_a_buscar
-
-                            if filas_afectadas_mask.any():
-                                if 'Estado' not in df_vencimientos.columns: df_vencimientos['Estado'] = ''
-                                if 'Remision_Asociada' not in df_vencimientos.columns: df_vencimientos['Remision_Asociada'] = ''
-                                if 'Observaciones_adicionales' not in df_vencimientos.columns: df_vencimientos['Observaciones_adicionales'] = ''
-
-                                df_vencimientos.loc[filas_afectadas_mask, 'Estado'] = "Renovado"
-                                df_vencimientos.loc[filas_afectadas_mask, 'Remision_Asociada'] = nuevo_numero_remision
-                                df_vencimientos.loc[filas_afectadas_mask, 'Observaciones_adicionales'] = f"Remisión: {nuevo_numero_remision}"
-                                vencimientos_modificados_count = filas_afectadas_mask.sum()
-
-                            if 'NÚMERO PÓLIZA_str_comp' in df_vencimientos.columns: # Drop helper column
-                                df_vencimientos = df_vencimientos.drop(columns=['NÚMERO PÓLIZA_str_comp'])
-                        else:
-                            print(f"Advertencia: Columna 'NÚMERO PÓLIZA' no encontrada en {ruta_vencimientos} al intentar actualizar vencimientos.")
-
-                        if vencimientos_modificados_count > 0:
-                            if 'ORDEN_COLUMNAS_VENCIMIENTOS' in globals() and isinstance(ORDEN_COLUMNAS_VENCIMIENTOS, list):
-                                for col_m_v in ORDEN_COLUMNAS_VENCIMIENTOS:
-                                    if col_m_v not in df_vencimientos.columns:
-                                        default_val_venc = 0 if col_m_v == 'ID_VENCIMIENTO' else ''
-                                        df_vencimientos[col_m_v] = default_val_venc
-                                df_vencimientos = df_vencimientos[ORDEN_COLUMNAS_VENCIMIENTOS]
-                            else:
-                                print("ADVERTENCIA: ORDEN_COLUMNAS_VENCIMIENTOS no definida. Vencimientos se guardará con orden actual.")
-
-                            df_vencimientos.to_excel(ruta_vencimientos, index=False)
-                            flash(f'{vencimientos_modificados_count} registro(s) de vencimiento para póliza "{numero_poliza_a_buscar}" actualizados a "Renovado" (Remisión: {nuevo_numero_remision}).', 'info')
-
-                    except Exception as e_venc:
-                        print(f"Error al actualizar vencimientos asociados: {type(e_venc).__name__} - {e_venc}")
-                        flash(f'N° Remisión guardado, pero ocurrió un error al intentar actualizar vencimientos asociados: {str(e_venc)}', 'warning')
-                elif ruta_vencimientos and not os.path.exists(ruta_vencimientos):
-                    flash('Archivo de vencimientos no encontrado. No se pudieron actualizar estados de vencimiento.', 'info')
-                elif not (numero_poliza_a_buscar and numero_poliza_a_buscar not in ['N/A', 'None', '', 'nan', 'NaN']):
-                     flash('No se proporcionó un número de póliza válido en la remisión, no se actualizaron vencimientos.', 'info')
+                try:
+                    vencimientos_modificados_count = actualizar_vencimientos_por_poliza(numero_poliza_a_buscar, {
+                        'Estado': "Renovado",
+                        'Remision_Asociada': nuevo_numero_remision,
+                        'Observaciones_adicionales': f"Remisión: {nuevo_numero_remision}"
+                    })
+                    if vencimientos_modificados_count > 0:
+                        flash(f'{vencimientos_modificados_count} registro(s) de vencimiento para póliza "{numero_poliza_a_buscar}" actualizados a "Renovado" (Remisión: {nuevo_numero_remision}).', 'info')
+                except Exception as e_venc:
+                    print(f"Error al actualizar vencimientos asociados: {type(e_venc).__name__} - {e_venc}")
+                    flash(f'N° Remisión guardado, pero ocurrió un error al intentar actualizar vencimientos asociados: {str(e_venc)}', 'warning')
 
         elif actualizacion_realizada and not nuevo_numero_remision.strip():
             flash('Número de remisión manual está vacío, no se intentó actualizar vencimientos.', 'info')
@@ -861,25 +1224,24 @@ def ejecutar_crear_carpeta():
             os.makedirs(ruta_sub, exist_ok=True)
         ruta_sarlaft_ano = os.path.join(ruta_cliente_completa, "SARLAFT", ano_actual)
         os.makedirs(ruta_sarlaft_ano, exist_ok=True)
+        indexar_carpeta_cliente(nombre_carpeta_cliente_seguro, nit_o_cc_cliente, nombre_cliente)
         documentos_sarlaft_config = {
             'doc_cedula': 'Cedula_Representante_legal', 'doc_sarlaft': 'Sarlaft_Cliente',
             'doc_rut': 'RUT_Cliente', 'doc_declaracion': 'Declaracion_Renta', 'doc_camara': 'Camara_Comercio'
             , 'estados_financieros': 'Estados_Financieros_Notas', 'consulta_cliente': 'Consulta_Cliente_Desqubra',
         }
-        archivos_cargados_count = 0
+        tareas_guardado = []
         for input_name, nombre_base_fijo in documentos_sarlaft_config.items():
             archivo = request.files.get(input_name)
             if archivo and archivo.filename:
-                try:
-                    nombre_original_del_archivo_subido = archivo.filename
-                    extension = os.path.splitext(nombre_original_del_archivo_subido)[1].lower()
-                    nombre_archivo_final = nombre_base_fijo + extension
-                    nombre_archivo_seguro = secure_filename(nombre_archivo_final)
-                    ruta_guardado = os.path.join(ruta_sarlaft_ano, nombre_archivo_seguro)
-                    archivo.save(ruta_guardado)
-                    archivos_cargados_count += 1
-                except Exception as e_file:
-                    print(f"Error al guardar el archivo {input_name} ({archivo.filename}): {e_file}")
+                nombre_original_del_archivo_subido = archivo.filename
+                extension = os.path.splitext(nombre_original_del_archivo_subido)[1].lower()
+                nombre_archivo_final = nombre_base_fijo + extension
+                nombre_archivo_seguro = secure_filename(nombre_archivo_final)
+                ruta_guardado = os.path.join(ruta_sarlaft_ano, nombre_archivo_seguro)
+                tareas_guardado.append((archivo, ruta_guardado))
+        resultados_guardado = guardar_archivos_en_paralelo(tareas_guardado, omitir_errores=True, almacen=almacen_adjuntos)
+        archivos_cargados_count = sum(1 for r in resultados_guardado if r)
         mensaje_exito = f'Estructura de carpetas para "{nombre_cliente}" creada/verificada exitosamente.'
         if archivos_cargados_count > 0:
             mensaje_exito += f' {archivos_cargados_count} documento(s) SARLAFT procesados.'
@@ -892,6 +1254,7 @@ def ejecutar_crear_carpeta():
         return jsonify({'success': False, 'message': f'Error inesperado al crear carpetas: {e}'}), 500
 
 @app.route('/prospectos/crear', methods=['GET', 'POST'])
+@escritura_coordinada('prospectos')
 def crear_prospecto():
     config = load_config()
     if request.method == 'GET':
@@ -930,7 +1293,7 @@ def crear_prospecto():
             PROSPECTOS_FILE = app.config['PROSPECTOS_FILE_PATH']
 
             if os.path.exists(PROSPECTOS_FILE):
-                df_prospectos = pd.read_excel(PROSPECTOS_FILE)
+                df_prospectos = leer_excel(PROSPECTOS_FILE)
             else:
                 df_prospectos = pd.DataFrame(columns=ORDEN_COLUMNAS_PROSPECTOS)
 
@@ -943,7 +1306,9 @@ def crear_prospecto():
 
             df_prospectos = df_prospectos[ORDEN_COLUMNAS_PROSPECTOS]
 
-            df_prospectos.to_excel(PROSPECTOS_FILE, index=False)
+            with registro_de_cambios('prospectos', 'ID_PROSPECTO') as diario:
+                diario.insertar([datos_formulario])
+                escribir_excel(df_prospectos, PROSPECTOS_FILE, index=False)
 
             return jsonify({'status': 'success', 'message': 'Prospecto guardado exitosamente'})
 
@@ -951,6 +1316,7 @@ def crear_prospecto():
             return jsonify({'status': 'error', 'message': str(e)})
 
 @app.route('/prospectos/visualizar', methods=['GET'])
+@respuesta_en_cache('prospectos', 'config', por_dia=True)
 def prospectos_vista():
     config = load_config()
     try:
@@ -959,7 +1325,7 @@ def prospectos_vista():
         kpi_top_ramos = []
 
         if os.path.exists(PROSPECTOS_FILE):
-            df = pd.read_excel(PROSPECTOS_FILE)
+            df = leer_dataset('prospectos')
 
             # --- Data Cleaning and Preparation ---
             df['Fecha inicio poliza'] = pd.to_datetime(df['Fecha inicio poliza'], errors='coerce')
@@ -981,7 +1347,7 @@ def prospectos_vista():
 
             kpi_recaudo_mes = df_ganado_mes_actual['Comision $'].sum()
 
-            top_ramos = df_ganado_mes_actual.groupby('Ramo')['Comision $'].sum().nlargest(3).reset_index()
+            top_ramos = df_ganado_mes_actual.groupby('Ramo', observed=True)['Comision $'].sum().nlargest(3).reset_index()
             kpi_top_ramos = top_ramos.to_dict(orient='records')
 
             # --- Sorting (más reciente primero) ---
@@ -991,7 +1357,8 @@ def prospectos_vista():
                 # Fallback to ID if Fecha Creacion doesn't exist yet
                 df.sort_values(by='ID_PROSPECTO', ascending=False, inplace=True)
 
-            prospectos_data = df.head(20).to_dict(orient='records')
+            # La vista y su JS comparan es_TPP con 'si'
+            prospectos_data = banderas_a_texto(df.head(20).copy(), 'prospectos').to_dict(orient='records')
         else:
             prospectos_data = []
 
@@ -1017,7 +1384,7 @@ def prospecto_editar(prospecto_id):
         flash('El archivo de prospectos no existe.', 'danger')
         return redirect(url_for('prospectos_vista'))
 
-    df = pd.read_excel(PROSPECTOS_FILE, dtype={'ID_PROSPECTO': str})
+    df = leer_vigente('prospectos', columnas=COLUMNAS_EDITAR_PROSPECTO)  # Con escritura diferida, la copia en memoria
     prospecto_data = df[df['ID_PROSPECTO'] == prospecto_id].to_dict('records')
 
     if not prospecto_data:
@@ -1035,13 +1402,14 @@ def prospecto_editar(prospecto_id):
                            nombre_empresa=config.get('nombre_empresa'))
 
 @app.route('/prospectos/guardar_edicion', methods=['POST'])
+@escritura_coordinada('prospectos')
 def prospecto_guardar_edicion():
     try:
         datos = request.form.to_dict()
         prospecto_id = datos.get('ID_PROSPECTO')
 
         PROSPECTOS_FILE = app.config['PROSPECTOS_FILE_PATH']
-        df = pd.read_excel(PROSPECTOS_FILE, dtype={'ID_PROSPECTO': str})
+        df = leer_excel(PROSPECTOS_FILE, dtype={'ID_PROSPECTO': str})
 
         index_list = df[df['ID_PROSPECTO'] == prospecto_id].index
         if not index_list.any():
@@ -1049,6 +1417,7 @@ def prospecto_guardar_edicion():
             return redirect(url_for('prospectos_vista'))
 
         idx = index_list[0]
+        anterior = df.loc[idx].to_dict()
 
         for key, value in datos.items():
             if key in df.columns:
@@ -1068,7 +1437,11 @@ def prospecto_guardar_edicion():
 
         df.loc[idx, 'Comision $'] = comision_calculada
 
-        df.to_excel(PROSPECTOS_FILE, index=False)
+        nuevo = df.loc[idx].to_dict()
+        modificadas = [c for c in nuevo if str(nuevo[c]) != str(anterior.get(c))]
+        with registro_de_cambios('prospectos', 'ID_PROSPECTO') as diario:
+            diario.actualizar(prospecto_id, {c: anterior.get(c) for c in modificadas}, {c: nuevo[c] for c in modificadas})
+            escribir_excel(df, PROSPECTOS_FILE, index=False)
         flash('Prospecto actualizado con éxito.', 'success')
 
     except Exception as e:
@@ -1077,6 +1450,7 @@ def prospecto_guardar_edicion():
     return redirect(url_for('prospectos_vista'))
 
 @app.route('/prospectos/actualizar_estado', methods=['POST'])
+@escritura_coordinada('prospectos', diferida=True)
 def actualizar_estado_prospecto():
     try:
         data = request.get_json()
@@ -1091,22 +1465,26 @@ def actualizar_estado_prospecto():
         if not os.path.exists(PROSPECTOS_FILE):
             return jsonify({'status': 'error', 'message': 'El archivo de prospectos no existe.'}), 404
 
-        df = pd.read_excel(PROSPECTOS_FILE, dtype={'ID_PROSPECTO': str})
+        fecha_emision = datetime.now().strftime('%Y-%m-%d') if nuevo_estado == 'Ganado' else None
+        cambios = {'Estado': nuevo_estado}
+        if fecha_emision:
+            cambios['Fecha inicio poliza'] = fecha_emision
 
+        df = leer_para_escritura('prospectos')
         index = df[df['ID_PROSPECTO'] == str(prospecto_id)].index
-
         if not index.empty:
-            df.loc[index, 'Estado'] = nuevo_estado
-
-            fecha_emision = None
-            if nuevo_estado == 'Ganado':
-                fecha_emision = datetime.now().strftime('%Y-%m-%d')
-                if 'Fecha inicio poliza' not in df.columns:
-                    df['Fecha inicio poliza'] = ''
-                df.loc[index, 'Fecha inicio poliza'] = fecha_emision
-
-            df.to_excel(PROSPECTOS_FILE, index=False)
-
+            with registro_de_cambios('prospectos', 'ID_PROSPECTO') as diario:
+                diario.actualizar_filas(df, index, cambios)
+                df.loc[index, 'Estado'] = nuevo_estado
+                if fecha_emision:
+                    if 'Fecha inicio poliza' not in df.columns:
+                        df['Fecha inicio poliza'] = ''
+                    df.loc[index, 'Fecha inicio poliza'] = fecha_emision
+
+                guardar_dataset('prospectos', df)
+        actualizadas = len(index)
+
+        if actualizadas:
             response = {'status': 'success', 'message': f'Prospecto marcado como {nuevo_estado}.'}
             if fecha_emision:
                 response['fecha_emision'] = fecha_emision
@@ -1117,29 +1495,52 @@ def actualizar_estado_prospecto():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-import locale
-
-# Set locale to Spanish for month names
-try:
-    locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
-except locale.Error:
-    try:
-        locale.setlocale(locale.LC_TIME, 'es')
-    except locale.Error:
-        print("Locale 'es_ES' or 'es' not found. Month names will be in English.")
-
 def format_date_in_spanish(date_str):
-    if not date_str or pd.isna(date_str):
-        return ""
-    try:
-        # First, try to parse with slashes, then with hyphens
-        try:
-            dt = datetime.strptime(str(date_str), '%d/%m/%Y')
-        except ValueError:
-            dt = datetime.strptime(str(date_str), '%Y-%m-%d')
-        return dt.strftime('%d de %B de %Y')
-    except (ValueError, TypeError):
-        return date_str # Return original if format is unexpected
+    """Fecha en formato largo en español ('05 de marzo de 2025'), sin usar el locale del proceso."""
+    return formatear_fecha_larga(date_str)
+
+def contexto_carta(contexto, config):
+    """Variables de la plantilla de correspondencia para una remisión (con los datos del formulario ya mezclados)."""
+    # Generar asunto automático
+    ref_asunto_auto = f"{contexto.get('consecutivo', '')} | {contexto.get('tomador', '')} | {contexto.get('ramo', '')} No {contexto.get('poliza', '')}"
+
+    # Limpiar nombres de archivos para la descripción
+    archivos_str = contexto.get('archivos', '')
+    if archivos_str and isinstance(archivos_str, str):
+        # Extraer solo el nombre base del archivo sin la ruta y la extensión
+        nombres_limpios = [os.path.splitext(os.path.basename(f))[0].split('_')[-1] for f in archivos_str.split(',')]
+        descripcion_archivos = ' - '.join(nombres_limpios)
+    else:
+        descripcion_archivos = ''
+
+    return {
+        'empresa': contexto.get('tomador'),
+        'sr_sra': contexto.get('sr_sra'),
+        'correo': contexto.get('correo'),
+        'fecha': fecha_actual_larga(),
+        'consecutivo': contexto.get('consecutivo'),
+        'ref_asunto': ref_asunto_auto,
+        'aseguradora': contexto.get('aseguradora'),
+        'fecha_inicio': format_date_in_spanish(contexto.get('fecha_inicio')),
+        'fecha_terminacion': format_date_in_spanish(contexto.get('fecha_fin')),
+        'ramo': contexto.get('ramo'),
+        'poliza': contexto.get('poliza'),
+        'descripcion': descripcion_archivos,
+        'valor_a_pagar': contexto.get('valor_a_pagar'),
+        'garantias': contexto.get('garantias'),
+        'fecha_de_pago': format_date_in_spanish(contexto.get('fecha_limite_pago')),
+        'link_de_pago': contexto.get('link_de_pago'),
+        'nombre_empresa': config.get('nombre_empresa')
+    }
+
+def plantillas_correspondencia_disponibles():
+    """Tipos de plantilla existentes en templates/correspondencia (sin extensión)."""
+    disponibles = []
+    for nombre in app.jinja_env.list_templates(extensions=['html']):
+        carpeta, _, archivo = nombre.partition('/')
+        if carpeta == 'correspondencia' and archivo:
+            disponibles.append(os.path.splitext(archivo)[0])
+    return sorted(disponibles)
 
 @app.route('/correspondencia/vista_previa')
 def correspondencia_vista_previa():
@@ -1152,7 +1553,7 @@ def correspondencia_vista_previa():
         if not consecutivo or not tipo_plantilla:
             return "Error: Faltan parámetros.", 400
 
-        remisiones_df = pd.read_excel(EXCEL_FILE, dtype={'consecutivo': str})
+        remisiones_df = leer_excel(EXCEL_FILE, dtype={'consecutivo': str})
         remision_data = remisiones_df[remisiones_df['consecutivo'] == consecutivo].to_dict('records')
 
         if not remision_data:
@@ -1161,43 +1562,63 @@ def correspondencia_vista_previa():
         contexto = remision_data[0]
         contexto.update(datos)
 
-        # Generar asunto automático
-        ref_asunto_auto = f"{contexto.get('consecutivo', '')} | {contexto.get('tomador', '')} | {contexto.get('ramo', '')} No {contexto.get('poliza', '')}"
-
-        # Limpiar nombres de archivos para la descripción
-        archivos_str = contexto.get('archivos', '')
-        if archivos_str:
-            # Extraer solo el nombre base del archivo sin la ruta y la extensión
-            nombres_limpios = [os.path.splitext(os.path.basename(f))[0].split('_')[-1] for f in archivos_str.split(',')]
-            descripcion_archivos = ' - '.join(nombres_limpios)
-        else:
-            descripcion_archivos = ''
-
-        contexto_plantilla = {
-            'empresa': contexto.get('tomador'),
-            'sr_sra': contexto.get('sr_sra'),
-            'correo': contexto.get('correo'),
-            'fecha': datetime.now().strftime('%d de %B de %Y'),
-            'consecutivo': contexto.get('consecutivo'),
-            'ref_asunto': ref_asunto_auto,
-            'aseguradora': contexto.get('aseguradora'),
-            'fecha_inicio': format_date_in_spanish(contexto.get('fecha_inicio')),
-            'fecha_terminacion': format_date_in_spanish(contexto.get('fecha_fin')),
-            'ramo': contexto.get('ramo'),
-            'poliza': contexto.get('poliza'),
-            'descripcion': descripcion_archivos,
-            'valor_a_pagar': contexto.get('valor_a_pagar'),
-            'garantias': contexto.get('garantias'),
-            'fecha_de_pago': format_date_in_spanish(contexto.get('fecha_limite_pago')),
-            'link_de_pago': contexto.get('link_de_pago'),
-            'nombre_empresa': config.get('nombre_empresa')
-        }
-
-        return render_template(f'correspondencia/{tipo_plantilla}.html', **contexto_plantilla)
+        return render_template(f'correspondencia/{tipo_plantilla}.html', **contexto_carta(contexto, config))
 
     except Exception as e:
         return f"Error al generar la vista previa: {e}", 500
 
+@app.route('/correspondencia/lote', methods=['POST'])
+def correspondencia_lote():
+    """
+    Genera en un solo paso las cartas de varias remisiones.
+    Parámetros (formulario o JSON): consecutivos (lista o separados por coma), tipo_plantilla,
+    formato ('zip' o 'html') y, opcionales y comunes a todas las cartas, sr_sra, correo,
+    valor_a_pagar, garantias, link_de_pago.
+    """
+    datos = request.get_json(silent=True) or request.form.to_dict()
+    consecutivos = datos.get('consecutivos') or request.form.getlist('consecutivos[]')
+    if isinstance(consecutivos, str):
+        consecutivos = consecutivos.split(',')
+    consecutivos = list(dict.fromkeys(str(c).strip() for c in consecutivos if str(c).strip()))
+    tipo_plantilla = datos.get('tipo_plantilla', '')
+    formato = datos.get('formato', 'zip')
+
+    if not consecutivos:
+        return jsonify({'success': False, 'message': 'Debe indicar al menos un consecutivo.'}), 400
+    if tipo_plantilla not in plantillas_correspondencia_disponibles():
+        return jsonify({'success': False, 'message': f"Tipo de plantilla no válido: '{tipo_plantilla}'."}), 400
+    if formato not in ('zip', 'html'):
+        return jsonify({'success': False, 'message': "El formato debe ser 'zip' o 'html'."}), 400
+    if not os.path.exists(EXCEL_FILE):
+        return jsonify({'success': False, 'message': 'No hay remisiones registradas.'}), 404
+
+    # Una sola lectura del Excel para todo el lote
+    remisiones_df = leer_excel(EXCEL_FILE, dtype={'consecutivo': str})
+    remisiones_df = remisiones_df[remisiones_df['consecutivo'].isin(consecutivos)].copy()
+    # Fechas de todo el lote formateadas por columna (contexto_carta deja intactos los textos ya formateados)
+    for columna in ('fecha_inicio', 'fecha_fin', 'fecha_limite_pago'):
+        if columna in remisiones_df.columns:
+            remisiones_df[columna] = formatear_columna(remisiones_df[columna])
+    por_consecutivo = {r['consecutivo']: r for r in remisiones_df.fillna('').to_dict('records')}
+    faltantes = [c for c in consecutivos if c not in por_consecutivo]
+    if faltantes:
+        return jsonify({'success': False, 'message': f"Remisiones no encontradas: {', '.join(faltantes)}"}), 404
+
+    config = load_config()
+    comunes = {campo: datos.get(campo, '') for campo in ('sr_sra', 'correo', 'valor_a_pagar', 'garantias', 'link_de_pago')}
+    plantilla = app.jinja_env.get_template(f'correspondencia/{tipo_plantilla}.html')  # compilada una vez
+
+    def cartas():
+        for consecutivo in consecutivos:
+            contexto = dict(por_consecutivo[consecutivo], **comunes)
+            yield f"{secure_filename(consecutivo)}_{tipo_plantilla}.html", plantilla.render(**contexto_carta(contexto, config))
+
+    nombre_lote = f"correspondencia_{tipo_plantilla}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if formato == 'zip':
+        return Response(stream_with_context(generar_zip(cartas())), mimetype='application/zip',
+                        headers={'Content-Disposition': f'attachment; filename={nombre_lote}.zip'})
+    return Response(stream_with_context(generar_html_multipagina(cartas())), mimetype='text/html')
+
 @app.route('/siniestros/registrar', methods=['GET', 'POST'])
 def siniestros_registrar():
     if request.method == 'GET':
@@ -1208,43 +1629,100 @@ def siniestros_registrar():
             datos = request.form.to_dict()
             archivos = request.files.getlist('documentos')
 
-            # --- 1. Guardar registro en siniestros.xlsx ---
-            SINIESTROS_FILE = os.path.join(BASE_DIR, 'siniestros.xlsx')
+            for campo in ['nombre_cliente', 'nit_cc', 'ramo', 'fecha_siniestro']:
+                if not datos.get(campo, '').strip():
+                    return jsonify({'status': 'error', 'message': f'El campo {campo} es obligatorio.'}), 400
+
+            # --- 1. Guardar registro en el almacén de siniestros ---
+            datos['ID_SINIESTRO'] = uuid.uuid4().hex[:8].upper()
             nombres_archivos = [secure_filename(f.filename) for f in archivos if f.filename]
             datos['archivos_adjuntos'] = ', '.join(nombres_archivos)
+            try:
+                registro = almacen_siniestros.construir_registro(datos)
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
 
-            df_siniestros_existente = pd.DataFrame()
-            if os.path.exists(SINIESTROS_FILE):
-                df_siniestros_existente = pd.read_excel(SINIESTROS_FILE)
-
-            nuevo_siniestro_df = pd.DataFrame([datos])
-            df_final = pd.concat([df_siniestros_existente, nuevo_siniestro_df], ignore_index=True)
-            df_final.to_excel(SINIESTROS_FILE, index=False)
+            almacen_siniestros.insertar_siniestro(app.config['SINIESTROS_DB_PATH'], registro)
+            indexar_clientes('siniestros', [registro])
 
             # --- 2. Subir archivos a carpetas ---
-            nombre_cliente = secure_filename(datos['nombre_cliente'])
-            nit_cc = secure_filename(datos['nit_cc'])
-            ramo = secure_filename(datos['ramo'])
-            ano_siniestro = datetime.strptime(datos['fecha_siniestro'], '%Y-%m-%d').strftime('%Y')
+            nombre_cliente = secure_filename(registro['nombre_cliente'])
+            nit_cc = secure_filename(registro['nit_cc'])
+            ramo = secure_filename(registro['ramo'])
+            ano_siniestro = registro['fecha_siniestro'][:4]
 
             ruta_carpeta_cliente = os.path.join(app.config['CLIENT_FOLDERS_BASE_DIR'], f"{nombre_cliente}_{nit_cc}")
+            indexar_carpeta_cliente(f"{nombre_cliente}_{nit_cc}", registro['nit_cc'], registro['nombre_cliente'])
             ruta_destino = os.path.join(ruta_carpeta_cliente, 'SINIESTROS', ramo, ano_siniestro)
 
-            os.makedirs(ruta_destino, exist_ok=True)
-
-            for archivo in archivos:
-                if archivo and archivo.filename:
-                    filename = secure_filename(archivo.filename)
-                    archivo.save(os.path.join(ruta_destino, filename))
+            tareas_guardado = [(archivo, os.path.join(ruta_destino, secure_filename(archivo.filename)))
+                               for archivo in archivos if archivo and archivo.filename]
+            guardar_archivos_en_paralelo(tareas_guardado, almacen=almacen_adjuntos)
 
-            return jsonify({'status': 'success', 'message': 'Siniestro registrado y archivos subidos exitosamente.'})
+            return jsonify({'status': 'success', 'message': 'Siniestro registrado y archivos subidos exitosamente.',
+                            'id_siniestro': registro['ID_SINIESTRO']})
 
         except Exception as e:
             import traceback
             traceback.print_exc()
             return jsonify({'status': 'error', 'message': f'Error interno del servidor: {e}'}), 500
 
+def _filtros_siniestros_desde_request():
+    ano = request.args.get('ano', '').strip()
+    return {
+        'nit': request.args.get('nit', '').strip(),
+        'ramo': request.args.get('ramo', '').strip(),
+        'ano': int(ano) if ano.isdigit() else None,
+        'texto': request.args.get('q', '').strip(),
+    }
+
+def _pagina_desde_request():
+    pagina = request.args.get('pagina', '1')
+    por_pagina = request.args.get('por_pagina', '25')
+    pagina = int(pagina) if pagina.isdigit() else 1
+    por_pagina = int(por_pagina) if por_pagina.isdigit() else 25
+    # Mismos límites que almacen_siniestros.buscar_siniestros (por_pagina=0 dividiría por cero)
+    return max(pagina, 1), max(min(por_pagina, 200), 1)
+
+@app.route('/siniestros/visualizar', methods=['GET'])
+def siniestros_vista():
+    config = load_config()
+    filtros = _filtros_siniestros_desde_request()
+    pagina, por_pagina = _pagina_desde_request()
+    ruta_db = app.config['SINIESTROS_DB_PATH']
+    try:
+        siniestros, total = almacen_siniestros.buscar_siniestros(ruta_db, pagina=pagina, por_pagina=por_pagina, **filtros)
+        ramos_disponibles, anos_disponibles = almacen_siniestros.valores_filtro(ruta_db)
+    except Exception as e:
+        flash(f'Error al consultar los siniestros: {e}', 'danger')
+        siniestros, total, ramos_disponibles, anos_disponibles = [], 0, [], []
+
+    total_paginas = max((total + por_pagina - 1) // por_pagina, 1)
+    return render_template('siniestros_vista.html',
+                           siniestros=siniestros,
+                           total=total,
+                           pagina=pagina,
+                           por_pagina=por_pagina,
+                           total_paginas=total_paginas,
+                           filtros=filtros,
+                           ramos_disponibles=ramos_disponibles,
+                           anos_disponibles=anos_disponibles,
+                           nombre_empresa=config.get('nombre_empresa'))
+
+@app.route('/api/siniestros', methods=['GET'])
+def api_siniestros():
+    filtros = _filtros_siniestros_desde_request()
+    pagina, por_pagina = _pagina_desde_request()
+    try:
+        siniestros, total = almacen_siniestros.buscar_siniestros(app.config['SINIESTROS_DB_PATH'],
+                                                                 pagina=pagina, por_pagina=por_pagina, **filtros)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error al consultar los siniestros: {e}'}), 500
+    return jsonify({'success': True, 'total': total, 'pagina': pagina, 'por_pagina': por_pagina,
+                    'siniestros': siniestros})
+
 @app.route('/cartera/visualizar', methods=['GET'])
+@respuesta_en_cache('cartera', 'config')
 def visualizar_cartera():
     config = load_config()
     ruta_archivo_procesado = app.config['CARTERA_PROCESADA_FILE_PATH']
@@ -1254,7 +1732,7 @@ def visualizar_cartera():
         return redirect(url_for('mostrar_formulario_carga_maestra'))
 
     try:
-        df = pd.read_excel(ruta_archivo_procesado)
+        df = leer_dataset('cartera')
 
         anos_disponibles = []
         if 'FECHA CREACIÓN' in df.columns:
@@ -1334,14 +1812,14 @@ def visualizar_cartera():
         df_display = df_display.fillna('')
         lista_remisiones = df_display.to_dict(orient='records')
 
-        nombres_meses_template = [
-            (1, "Enero"), (2, "Febrero"), (3, "Marzo"), (4, "Abril"),
-            (5, "Mayo"), (6, "Junio"), (7, "Julio"), (8, "Agosto"),
-            (9, "Septiembre"), (10, "Octubre"), (11, "Noviembre"), (12, "Diciembre")
-        ]
+        nombres_meses_template = list(enumerate(MESES_CAPITALIZADOS, start=1))
 
+        # Filas renderizadas una vez por (ID_CARTERA, contenido); solo se re-renderizan las que cambian
+        filas_html = renderizar_filas(app.jinja_env, 'parciales/fila_cartera.html', 'remision',
+                                      lista_remisiones, 'ID_CARTERA')
         return render_template('cartera_vista.html',
                                remisiones=lista_remisiones,
+                               filas_html=filas_html,
                                meses_para_filtro=nombres_meses_template,
                                anos_disponibles_filtro=anos_disponibles,
                                aseguradoras_disponibles_filtro=aseguradoras_disponibles,
@@ -1364,7 +1842,7 @@ def mostrar_formulario_editar_cartera(id_registro):
         return redirect(url_for('visualizar_cartera'))
 
     try:
-        df = pd.read_excel(ruta_archivo_procesado)
+        df = leer_excel(ruta_archivo_procesado)
         # ID_CARTERA fue guardado como int, id_registro viene como int de la URL
         registro_para_editar_df = df[df['ID_CARTERA'] == id_registro]
 
@@ -1384,6 +1862,7 @@ def mostrar_formulario_editar_cartera(id_registro):
         return redirect(url_for('visualizar_cartera'))
 
 @app.route('/cartera/guardar_edicion', methods=['POST'])
+@escritura_coordinada('cartera')
 def guardar_edicion_cartera():
     id_cartera_actualizar = request.form.get('id_cartera')
     if not id_cartera_actualizar:
@@ -1396,6 +1875,12 @@ def guardar_edicion_cartera():
         flash('ID de cartera inválido.', 'danger')
         return redirect(url_for('visualizar_cartera'))
 
+    try:
+        version_recibida = leer_version(request.form.get('version_fila'))
+    except ValueError:
+        flash('Versión del registro inválida.', 'danger')
+        return redirect(url_for('visualizar_cartera'))
+
     # Nuevos valores desde el formulario
     n_factura_manual = request.form.get('N_FACTURA_Manual', '').strip()
     clasificacion_manual = request.form.get('Clasificacion_Manual', '').strip()
@@ -1407,7 +1892,7 @@ def guardar_edicion_cartera():
         return redirect(url_for('visualizar_cartera'))
 
     try:
-        df = pd.read_excel(ruta_archivo_procesado)
+        df = normalizar_versiones(leer_excel(ruta_archivo_procesado))
 
         columnas_manuales_a_asegurar_str = ['N_FACTURA_Manual', 'Clasificacion_Manual', 'Line_of_Business_Manual']
         for col in columnas_manuales_a_asegurar_str:
@@ -1421,10 +1906,22 @@ def guardar_edicion_cartera():
 
         if not indice_fila.empty:
             idx = indice_fila[0]
+            if version_obsoleta(df.loc[idx, COLUMNA_VERSION], version_recibida):
+                # Otro usuario o una carga del reporte maestro cambió la fila: se muestra la versión vigente
+                flash(f'El registro de cartera ID {id_cartera_actualizar} fue modificado por otra persona o por una carga '
+                      f'del reporte maestro. Revise los datos actuales y vuelva a guardar.', 'warning')
+                return render_template('cartera_editar_registro.html',
+                                       registro=df.loc[idx].fillna('').to_dict(),
+                                       nombre_empresa=load_config().get('nombre_empresa')), 409
+            cambios_cartera = {'N_FACTURA_Manual': n_factura_manual, 'Clasificacion_Manual': clasificacion_manual,
+                               'Line_of_Business_Manual': line_of_business_manual,
+                               COLUMNA_VERSION: int(df.loc[idx, COLUMNA_VERSION]) + 1}
+            anterior = {c: df.loc[idx, c] for c in cambios_cartera}
             # Actualizar los campos
             df.loc[idx, 'N_FACTURA_Manual'] = n_factura_manual
             df.loc[idx, 'Clasificacion_Manual'] = clasificacion_manual
             df.loc[idx, 'Line_of_Business_Manual'] = line_of_business_manual
+            df.loc[idx, COLUMNA_VERSION] = cambios_cartera[COLUMNA_VERSION]
 
             # Ensure all columns from the master order list exist and enforce order
             for col_maestra in ORDEN_COLUMNAS_EXCEL_CARTERA:
@@ -1436,7 +1933,10 @@ def guardar_edicion_cartera():
             df = df[ORDEN_COLUMNAS_EXCEL_CARTERA]
 
             # Guardar el DataFrame modificado
-            df.to_excel(ruta_archivo_procesado, index=False)
+            with registro_de_cambios('cartera', 'ID_CARTERA') as diario:
+                diario.actualizar(id_cartera_actualizar, anterior, cambios_cartera)
+                escribir_excel(df, ruta_archivo_procesado, index=False)
+            actualizar_indice_clientes('cartera', [id_cartera_actualizar], {'N_FACTURA_Manual': n_factura_manual})
             flash(f'Registro de cartera ID {id_cartera_actualizar} actualizado exitosamente.', 'success')
         else:
             flash(f'No se encontró el registro de cartera con ID {id_cartera_actualizar} para actualizar.', 'warning')
@@ -1448,6 +1948,7 @@ def guardar_edicion_cartera():
     return redirect(url_for('visualizar_cartera'))
 
 @app.route('/cartera/aplicar_factura_lote', methods=['POST'])
+@escritura_coordinada('cartera')
 def aplicar_factura_lote():
     try:
         data = request.get_json()
@@ -1472,7 +1973,7 @@ def aplicar_factura_lote():
         if not os.path.exists(ruta_archivo_procesado):
             return jsonify({'success': False, 'message': 'Error crítico: Archivo de cartera procesada no encontrado en el servidor.'}), 500
 
-        df = pd.read_excel(ruta_archivo_procesado)
+        df = normalizar_versiones(leer_excel(ruta_archivo_procesado))
 
         if 'ID_CARTERA' not in df.columns:
             return jsonify({'success': False, 'message': 'Error de configuración: La columna ID_CARTERA no se encontró en el archivo Excel.'}), 500
@@ -1496,18 +1997,23 @@ def aplicar_factura_lote():
         else:
             df['N_FACTURA_Manual'] = pd.Series([''] * len(df), index=df.index, dtype=object) # Create if missing
 
-        df.loc[indices_filas_a_actualizar, 'N_FACTURA_Manual'] = numero_factura
+        with registro_de_cambios('cartera', 'ID_CARTERA') as diario:
+            diario.actualizar_filas(df, filas_a_actualizar_mask, {'N_FACTURA_Manual': numero_factura,
+                                                                  COLUMNA_VERSION: df[COLUMNA_VERSION] + 1})
+            df.loc[indices_filas_a_actualizar, 'N_FACTURA_Manual'] = numero_factura
+            incrementar_versiones(df, filas_a_actualizar_mask)
 
-        # Ensure all columns from the master order list exist and enforce order
-        for col_maestra in ORDEN_COLUMNAS_EXCEL_CARTERA:
-            if col_maestra not in df.columns:
-                if '_Calc' in col_maestra or col_maestra in ['PRIMA NETA', 'COMISIÓN', 'PORCENTAJE DE COMISIÓN', 'ID_CARTERA']:
-                    df[col_maestra] = 0
-                else:
-                    df[col_maestra] = pd.Series([''] * len(df), index=df.index, dtype=object)
-        df = df[ORDEN_COLUMNAS_EXCEL_CARTERA]
+            # Ensure all columns from the master order list exist and enforce order
+            for col_maestra in ORDEN_COLUMNAS_EXCEL_CARTERA:
+                if col_maestra not in df.columns:
+                    if '_Calc' in col_maestra or col_maestra in ['PRIMA NETA', 'COMISIÓN', 'PORCENTAJE DE COMISIÓN', 'ID_CARTERA']:
+                        df[col_maestra] = 0
+                    else:
+                        df[col_maestra] = pd.Series([''] * len(df), index=df.index, dtype=object)
+            df = df[ORDEN_COLUMNAS_EXCEL_CARTERA]
 
-        df.to_excel(ruta_archivo_procesado, index=False)
+            escribir_excel(df, ruta_archivo_procesado, index=False)
+        actualizar_indice_clientes('cartera', df.loc[indices_filas_a_actualizar, 'ID_CARTERA'].tolist(), {'N_FACTURA_Manual': numero_factura})
 
         return jsonify({'success': True, 'message': f'{len(indices_filas_a_actualizar)} registro(s) fueron actualizados exitosamente con el N° de Factura: {numero_factura}.'}), 200
 
@@ -1538,7 +2044,38 @@ def descargar_reporte_cartera_final():
         flash(f'Ocurrió un error al generar la descarga del reporte: {str(e)}', 'danger')
         return redirect(url_for('visualizar_cartera'))
 
+@app.route('/exportar/<dataset>', methods=['GET'])
+def exportar_dataset(dataset):
+    """
+    Reporte CSV o XLSX de un dataset, filtrado y enviado en streaming (exportaciones.py):
+    /exportar/cobros?formato=xlsx&desde=2025-01-01&hasta=2025-03-31&aseguradora=SURA&estado=Pendiente
+    """
+    formato = request.args.get('formato', 'csv').strip().lower()
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({'success': False, 'message': f"Formato '{formato}' no válido. Use csv o xlsx."}), 400
+    try:
+        filtros = preparar_filtros(dataset, desde=request.args.get('desde'), hasta=request.args.get('hasta'),
+                                   aseguradora=request.args.get('aseguradora'), estado=request.args.get('estado'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    ruta_excel = ARCHIVOS_DATASETS[dataset]
+    if not os.path.exists(ruta_excel):
+        return jsonify({'success': False, 'message': f"No hay datos de '{dataset}' para exportar."}), 404
+    try:
+        contenido, cerrar = exportar(dataset, ruta_excel, formato, filtros)
+    except Exception as e:
+        print(f"Error al exportar '{dataset}': {type(e).__name__} - {e}")
+        return jsonify({'success': False, 'message': f'No se pudo generar la exportación: {str(e)}'}), 500
+
+    nombre = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    respuesta = Response(stream_with_context(contenido), mimetype=FORMATOS_EXPORTACION[formato],
+                         headers={'Content-Disposition': f'attachment; filename={nombre}'})
+    respuesta.call_on_close(cerrar)  # Elimina la copia del Excel aunque el cliente corte la descarga
+    return respuesta
+
 @app.route('/vencimientos/visualizar', methods=['GET'])
+@respuesta_en_cache('vencimientos', 'config', por_dia=True)
 def visualizar_vencimientos():
     ruta_archivo_vencimientos = app.config['VENCIMIENTOS_PROCESADA_FILE_PATH']
 
@@ -1547,129 +2084,101 @@ def visualizar_vencimientos():
         return redirect(url_for('mostrar_formulario_carga_maestra'))
 
     try:
-        df_venc = pd.read_excel(ruta_archivo_vencimientos)
-        df_venc.rename(columns={'NOMBRES CLIENTE': 'Tomador'}, inplace=True)
-
-        if 'FECHA FIN' not in df_venc.columns:
+        try:
+            indice = obtener_indice(ruta_archivo_vencimientos, lambda _: leer_dataset('vencimientos'),
+                                    version=generacion_en_memoria('vencimientos'))
+        except KeyError:
             flash('El archivo de vencimientos no contiene la columna "FECHA FIN".', 'danger')
             return render_template('vencimientos_vista.html', registros=[], kpis={}, ramos_kpis=[], search_term='')
 
-        df_venc['FECHA FIN_dt'] = pd.to_datetime(df_venc['FECHA FIN'], errors='coerce')
-        df_venc.dropna(subset=['FECHA FIN_dt'], inplace=True)
-
-        hoy = datetime.now()
-        df_venc['Dias_Para_Vencer'] = (df_venc['FECHA FIN_dt'] - hoy).dt.days
-
-        # Filtrar por defecto a pólizas vencidas en los últimos 100 días y por vencer en los próximos 100 días.
-        df_filtrado = df_venc[(df_venc['Dias_Para_Vencer'] >= -100) & (df_venc['Dias_Para_Vencer'] <= 100)].copy()
-
         # Get search term
         search_term = request.args.get('search_term', '').strip()
-        if search_term:
-            df_filtrado = df_filtrado[df_filtrado['Tomador'].str.contains(search_term, case=False, na=False)]
-
-        # Excluir 'CUMPLIMIENTO' de los KPIs generales
-        df_sin_cumplimiento = df_filtrado[df_filtrado['RAMO PRINCIPAL'] != 'CUMPLIMIENTO']
-
-        # Calcular KPIs
-        kpis = {
-            'vencer_15_dias': len(df_sin_cumplimiento[(df_sin_cumplimiento['Dias_Para_Vencer'] >= 0) & (df_sin_cumplimiento['Dias_Para_Vencer'] <= 15)]),
-            'vencer_30_dias': len(df_sin_cumplimiento[(df_sin_cumplimiento['Dias_Para_Vencer'] >= 0) & (df_sin_cumplimiento['Dias_Para_Vencer'] <= 30)]),
-            'vencer_60_dias': len(df_sin_cumplimiento[(df_sin_cumplimiento['Dias_Para_Vencer'] >= 0) & (df_sin_cumplimiento['Dias_Para_Vencer'] <= 60)]),
-            'vencidas': len(df_sin_cumplimiento[df_sin_cumplimiento['Dias_Para_Vencer'] < 0]),
-            'cumplimiento': len(df_filtrado[(df_filtrado['RAMO PRINCIPAL'] == 'CUMPLIMIENTO') & (df_filtrado['Dias_Para_Vencer'] >= 0) & (df_filtrado['Dias_Para_Vencer'] <= 45)])
-        }
-
-        # Calcular KPIs por ramo (usando el dataframe ya filtrado)
-        df_vencer_30_dias = df_filtrado[(df_filtrado['Dias_Para_Vencer'] >= 0) & (df_filtrado['Dias_Para_Vencer'] <= 30)]
-        ramos_kpis = [
-            {
-                'ramo': 'AUTOS/VEHÍCULOS',
-                'count': len(df_vencer_30_dias[df_vencer_30_dias['RAMO PRINCIPAL'].str.contains('AUTOS|VEHICULOS', case=False, na=False)])
-            },
-            {
-                'ramo': 'COPROPIEDADES',
-                'count': len(df_vencer_30_dias[df_vencer_30_dias['RAMO PRINCIPAL'].str.contains('COPROPIEDADES', case=False, na=False)])
-            },
-            {
-                'ramo': 'HOGAR',
-                'count': len(df_vencer_30_dias[df_vencer_30_dias['RAMO PRINCIPAL'].str.contains('HOGAR', case=False, na=False)])
-            },
-            {
-                'ramo': 'ARRENDAMIENTO',
-                'count': len(df_vencer_30_dias[df_vencer_30_dias['RAMO PRINCIPAL'].str.contains('ARRENDAMIENTO', case=False, na=False)])
-            }
-        ]
-
-        def determinar_alerta(dias, estado_actual):
-            estado_actual_lower = str(estado_actual).lower() # Normalize estado for comparison
-
-            if estado_actual_lower == 'renovado':
-                return {'css_class': 'alerta-renovado', 'icon': 'fas fa-check-double', 'text': 'Renovado'}
-            elif estado_actual_lower == 'no renovado':
-                return {'css_class': 'alerta-no-renovado', 'icon': 'fas fa-ban', 'text': 'No Renovado'}
-
-            if pd.isna(dias):
-                return {'css_class': 'alerta-gris', 'icon': 'fas fa-question-circle', 'text': 'Fecha Fin Inválida'}
-
-            dias = int(dias)
-
-            if dias < 0 and estado_actual_lower in ['pendiente seguimiento', 'en proceso', '']:
-                return {'css_class': 'alerta-rojo', 'icon': 'fas fa-skull-crossbones', 'text': f'Vencido (Hace {-dias} días)'}
-
-            if estado_actual_lower == 'vencido':
-                return {'css_class': 'alerta-rojo', 'icon': 'fas fa-calendar-times', 'text': 'Vencido (Estado)'}
-
-            if dias <= 5:
-                return {'css_class': 'alerta-rojo', 'icon': 'fas fa-skull-crossbones', 'text': f'Vencido (Hace {-dias} días)' if dias < 0 else f'Vence en {dias} días'}
-            elif 6 <= dias <= 20:
-                return {'css_class': 'alerta-amarillo', 'icon': 'fas fa-exclamation-triangle', 'text': f'Vence en {dias} días'}
-            elif 21 <= dias <= 30:
-                return {'css_class': 'alerta-verde', 'icon': 'fas fa-calendar-check', 'text': f'Vence en {dias} días'}
-            else:
-                return {'css_class': 'alerta-azul', 'icon': 'fas fa-info-circle', 'text': f'Vence en {dias} días'}
-
-        if 'Estado' not in df_filtrado.columns:
-            df_filtrado['Estado'] = ''
-        else:
-            df_filtrado['Estado'] = df_filtrado['Estado'].astype(str).fillna('')
-
-        # Se aplica la función para determinar la alerta sobre el DataFrame ya filtrado
-        resultados_alerta = df_filtrado.apply(lambda row: determinar_alerta(row.get('Dias_Para_Vencer'), row.get('Estado')), axis=1)
-
-        # Se asignan los resultados al DataFrame filtrado.
-        # Es crucial que 'resultados_alerta' tenga el mismo número de filas que 'df_filtrado'.
-        df_filtrado['Indicador_Vencimiento_CSS_Class'] = [a['css_class'] for a in resultados_alerta]
-        df_filtrado['Indicador_Vencimiento_Icon'] = [a['icon'] for a in resultados_alerta]
-        df_filtrado['Indicador_Vencimiento_Text'] = [a['text'] for a in resultados_alerta]
-
-        df_display = df_filtrado.copy()
-
-        # Ordenar por 'Dias_Para_Vencer' de mayor a menor
-        df_display.sort_values(by='Dias_Para_Vencer', ascending=False, inplace=True)
-
-        # Formatear fechas para mostrar
-        df_display['FECHA FIN'] = df_display['FECHA FIN_dt'].dt.strftime('%Y-%m-%d')
-        if 'Fecha_inicio_seguimiento' in df_display.columns:
-             df_display['Fecha_inicio_seguimiento'] = pd.to_datetime(df_display['Fecha_inicio_seguimiento'], errors='coerce').dt.strftime('%Y-%m-%d')
-
-        df_display = df_display.fillna('')
-        lista_registros = df_display.to_dict(orient='records')
-
+        try:
+            ventana = leer_ventana(request.args, app.config['VENCIMIENTOS_VENTANA'])
+        except ValueError as e:
+            flash(str(e), 'warning')
+            ventana = app.config['VENCIMIENTOS_VENTANA']
+
+        # KPIs y primera página desde el índice; el resto de páginas y bandas las pide el navegador a /vencimientos/consulta
+        kpis, ramos_kpis = indice.kpis(ventana, search_term)
+        posiciones = indice.posiciones(ventana, termino=search_term)
+        lista_registros, pagina, paginas = indice.pagina(posiciones, 1, app.config['VENCIMIENTOS_FILAS_POR_PAGINA'])
+
+        config = load_config()
+        filas_html = renderizar_filas(app.jinja_env, 'parciales/fila_vencimiento.html', 'registro',
+                                      lista_registros, 'ID_VENCIMIENTO')
         return render_template('vencimientos_vista.html',
                                 registros=lista_registros,
+                                filas_html=filas_html,
                                 kpis=kpis,
                                 ramos_kpis=ramos_kpis,
+                                total_registros=len(posiciones),
+                                pagina=pagina,
+                                paginas=paginas,
                                 opciones_responsable_js=config.get('listas', {}).get('responsables_vencimientos', []),
                                 opciones_estado_js=config.get('listas', {}).get('estados_vencimientos', []),
                                 search_term=search_term,
+                                ventana_desde=ventana[0],
+                                ventana_hasta=ventana[1],
                                 nombre_empresa=config.get('nombre_empresa'))
     except Exception as e:
         print(f"Error crítico al visualizar el reporte de vencimientos: {type(e).__name__} - {e}")
         flash(f'Ocurrió un error crítico al intentar mostrar el reporte de vencimientos: {str(e)}', 'danger')
         return redirect(url_for('mostrar_formulario_carga_maestra'))
 
+@app.route('/vencimientos/consulta', methods=['GET'])
+@respuesta_en_cache('vencimientos', por_dia=True)
+def consultar_vencimientos():
+    """
+    Filas de una banda KPI (15, 30, 60, vencidas, cumplimiento o ramo + 'ramo') dentro
+    de la ventana pedida (desde/hasta en días o fecha_desde/fecha_hasta) que coinciden
+    con la búsqueda, paginadas. Devuelve los IDs y el HTML de las filas de la página,
+    además de los KPIs recalculados para la ventana y el término buscado.
+    """
+    ruta_archivo_vencimientos = app.config['VENCIMIENTOS_PROCESADA_FILE_PATH']
+    if not os.path.exists(ruta_archivo_vencimientos):
+        return jsonify({'success': False, 'message': 'No hay reporte de vencimientos procesado.'}), 404
+
+    try:
+        ventana = leer_ventana(request.args, app.config['VENCIMIENTOS_VENTANA'])
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        pagina = int(request.args.get('pagina', 1))
+        por_pagina = min(int(request.args.get('por_pagina', app.config['VENCIMIENTOS_FILAS_POR_PAGINA'])), 500)
+        if por_pagina < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parámetros de paginación inválidos.'}), 400
+
+    try:
+        indice = obtener_indice(ruta_archivo_vencimientos, lambda _: leer_dataset('vencimientos'),
+                                version=generacion_en_memoria('vencimientos'))
+        search_term = request.args.get('search_term', '').strip()
+        posiciones = indice.posiciones(ventana, request.args.get('banda') or None, request.args.get('ramo'), search_term)
+        registros, pagina, paginas = indice.pagina(posiciones, pagina, por_pagina)
+        kpis, ramos_kpis = indice.kpis(ventana, search_term)
+    except KeyError:
+        return jsonify({'success': False, 'message': 'El archivo de vencimientos no contiene la columna "FECHA FIN".'}), 500
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    filas_html = renderizar_filas(app.jinja_env, 'parciales/fila_vencimiento.html', 'registro',
+                                  registros, 'ID_VENCIMIENTO')
+    return jsonify({
+        'success': True,
+        'ids': [registro.get('ID_VENCIMIENTO') for registro in registros],
+        'filas_html': ''.join(filas_html),
+        'total': len(posiciones),
+        'pagina': pagina,
+        'paginas': paginas,
+        'kpis': kpis,
+        'ramos_kpis': ramos_kpis,
+    })
+
 @app.route('/vencimientos/actualizar_registro', methods=['POST'])
+@escritura_coordinada('vencimientos', diferida=True)
 def actualizar_registro_vencimiento():
     try:
         data = request.get_json()
@@ -1677,6 +2186,10 @@ def actualizar_registro_vencimiento():
             return jsonify({'success': False, 'message': 'No se recibieron datos JSON.'}), 400
 
         id_vencimiento = data.get('id_vencimiento')
+        try:
+            version_recibida = leer_version(data.get('version_fila'))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Versión del registro inválida.'}), 400
         # Obtener los nuevos valores, usando .get() con default por si no vienen todos los campos
         nuevo_responsable = data.get('Responsable', '').strip()
         nuevo_estado = data.get('Estado', '').strip()
@@ -1694,7 +2207,7 @@ def actualizar_registro_vencimiento():
         if not os.path.exists(ruta_archivo_vencimientos):
             return jsonify({'success': False, 'message': 'Archivo de datos de vencimientos no encontrado en el servidor.'}), 500
 
-        df = pd.read_excel(ruta_archivo_vencimientos)
+        df = leer_para_escritura('vencimientos')
 
         if 'ID_VENCIMIENTO' not in df.columns:
             return jsonify({'success': False, 'message': 'Error crítico: Columna ID_VENCIMIENTO no encontrada en el archivo Excel.'}), 500
@@ -1709,10 +2222,18 @@ def actualizar_registro_vencimiento():
 
         if not indice_fila_arr.empty:
             idx = indice_fila_arr[0]
+            normalizar_versiones(df)
+            version_vigente = int(df.loc[idx, COLUMNA_VERSION])
+            if version_obsoleta(version_vigente, version_recibida):
+                return jsonify({'success': False, 'conflicto': True, 'version_fila': version_vigente,
+                                'message': f'El vencimiento ID {id_vencimiento} fue modificado por otra persona o por una carga '
+                                           f'del reporte maestro. Recargue la página para ver los datos actuales.'}), 409
+            cambios_vencimiento = {'Responsable': nuevo_responsable, 'Estado': nuevo_estado,
+                                   'Observaciones_adicionales': nuevas_observaciones,
+                                   COLUMNA_VERSION: version_vigente + 1}
+            anterior = {c: df.loc[idx, c] for c in cambios_vencimiento if c in df.columns}
             # Actualizar los campos. Asegurar que las columnas sean de tipo string si no existen.
-            for col_name, new_value in [('Responsable', nuevo_responsable),
-                                        ('Estado', nuevo_estado),
-                                        ('Observaciones_adicionales', nuevas_observaciones)]:
+            for col_name, new_value in cambios_vencimiento.items():
                 if col_name not in df.columns:
                     df[col_name] = pd.Series(dtype='object') # Crear como object para strings
                 df.loc[idx, col_name] = new_value
@@ -1732,9 +2253,13 @@ def actualizar_registro_vencimiento():
             else:
                 print("ADVERTENCIA: ORDEN_COLUMNAS_VENCIMIENTOS no está definida o no es una lista. El Excel se guardará con el orden actual del DataFrame.")
 
-            df.to_excel(ruta_archivo_vencimientos, index=False)
+            with registro_de_cambios('vencimientos', 'ID_VENCIMIENTO') as diario:
+                diario.actualizar(id_vencimiento, anterior, cambios_vencimiento)
+                guardar_dataset('vencimientos', df)
+            actualizar_indice_clientes('vencimientos', [id_vencimiento], {'Responsable': nuevo_responsable, 'Estado': nuevo_estado})
             print(f"INFO: Archivo de vencimientos guardado en {ruta_archivo_vencimientos} después de actualizar ID {id_vencimiento}.")
-            return jsonify({'success': True, 'message': f'Registro de vencimiento ID {id_vencimiento} actualizado exitosamente.'}), 200
+            return jsonify({'success': True, 'version_fila': version_vigente + 1,
+                            'message': f'Registro de vencimiento ID {id_vencimiento} actualizado exitosamente.'}), 200
         else:
             print(f"WARN: No se encontró el ID_VENCIMIENTO {id_vencimiento} para actualizar.")
             return jsonify({'success': False, 'message': f'Error: No se encontró el registro de vencimiento con ID {id_vencimiento}.'}), 404
@@ -1762,11 +2287,18 @@ def procesar_reporte_maestro():
         return redirect(url_for('mostrar_formulario_carga_maestra'))
 
     try:
-        df_maestro = pd.read_excel(archivo)
+        df_maestro = leer_excel(archivo)
     except Exception as e:
         flash(f'Error al leer el archivo maestro Excel: {str(e)}', 'danger')
         return redirect(url_for('mostrar_formulario_carga_maestra'))
 
+    # El archivo ya se recibió y se leyó: los bloqueos solo cubren leer-modificar-escribir
+    with seccion_de_escritura('cartera', 'vencimientos'):
+        aplicar_reporte_maestro(df_maestro)
+    return redirect(url_for('index')) # Final redirect
+
+def aplicar_reporte_maestro(df_maestro):
+    """Incorpora el reporte maestro a cartera y vencimientos (con sus bloqueos tomados)."""
     # --- 2. Cartera Module Logic ---
     try:
         ruta_cartera = app.config['CARTERA_PROCESADA_FILE_PATH']
@@ -1776,13 +2308,14 @@ def procesar_reporte_maestro():
             flash(f'Columnas de Cartera faltantes en archivo maestro: {cols_str}. No se procesó Cartera.', 'warning')
         else:
             # --- Corrected Unique Key Creation ---
-            df_maestro['CLAVE_UNICA'] = df_maestro['NÚMERO PÓLIZA'].astype(str).str.strip() + "_" + pd.to_datetime(df_maestro['FECHA CREACIÓN'], format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m-%d').fillna('NODATE')
+            # Misma clave en el reporte y en el archivo guardado (las fechas llegan con formatos distintos)
+            df_maestro['CLAVE_UNICA'] = clave_poliza_fecha(df_maestro['NÚMERO PÓLIZA'], df_maestro['FECHA CREACIÓN'], 'NODATE')
 
             df_cartera_existente = pd.DataFrame()
             if os.path.exists(ruta_cartera):
-                df_cartera_existente = pd.read_excel(ruta_cartera)
+                df_cartera_existente = normalizar_versiones(leer_excel(ruta_cartera))
                 if not df_cartera_existente.empty and 'NÚMERO PÓLIZA' in df_cartera_existente.columns and 'FECHA CREACIÓN' in df_cartera_existente.columns:
-                    df_cartera_existente['CLAVE_UNICA'] = df_cartera_existente['NÚMERO PÓLIZA'].astype(str).str.strip() + "_" + df_cartera_existente['FECHA CREACIÓN'].astype(str).str.strip()
+                    df_cartera_existente['CLAVE_UNICA'] = clave_poliza_fecha(df_cartera_existente['NÚMERO PÓLIZA'], df_cartera_existente['FECHA CREACIÓN'], 'NODATE_EXIST')
 
             # --- Data Processing ---
             df_cartera_procesados_nuevos = df_maestro[COLUMNAS_A_EXTRAER_CARTERA + ['CLAVE_UNICA']].copy()
@@ -1814,22 +2347,27 @@ def procesar_reporte_maestro():
                 cols_para_update = [col for col in columnas_desde_maestro if col in df_cartera_existente.columns and col in df_para_actualizar.columns]
                 df_cartera_existente.set_index('CLAVE_UNICA', inplace=True)
                 df_para_actualizar.set_index('CLAVE_UNICA', inplace=True)
+                valores_anteriores = df_cartera_existente[cols_para_update].copy()
                 df_cartera_existente.update(df_para_actualizar[cols_para_update])
+                cambiadas = filas_cambiadas(valores_anteriores, df_cartera_existente[cols_para_update])
                 df_cartera_existente.reset_index(inplace=True)
+                incrementar_versiones(df_cartera_existente, cambiadas)
 
             df_cartera_final = pd.concat([df_cartera_existente, df_nuevos_para_anadir], ignore_index=True, sort=False)
 
             # --- Finalize and Save ---
-            if 'ID_CARTERA' in df_cartera_final.columns:
-                df_cartera_final.drop(columns=['ID_CARTERA'], inplace=True, errors='ignore')
-            df_cartera_final.insert(0, 'ID_CARTERA', range(1, len(df_cartera_final) + 1))
+            # Las filas existentes conservan su ID_CARTERA; las nuevas se numeran a continuación
+            asignar_ids_estables(df_cartera_final, 'ID_CARTERA')
+            normalizar_versiones(df_cartera_final)
 
             for col in ORDEN_COLUMNAS_EXCEL_CARTERA:
                 if col not in df_cartera_final.columns:
                     df_cartera_final[col] = ''
             df_cartera_final = df_cartera_final[ORDEN_COLUMNAS_EXCEL_CARTERA]
 
-            df_cartera_final.to_excel(ruta_cartera, index=False)
+            escribir_excel(df_cartera_final, ruta_cartera, index=False)
+            crear_punto_control('cartera')  # Carga masiva: el diario se reproduce desde aquí
+            indexar_clientes('cartera', df_cartera_final.to_dict(orient='records'), reconstruir=True)
             flash(f'Módulo Cartera actualizado: {len(df_nuevos_para_anadir)} registros nuevos añadidos, {len(df_para_actualizar)} registros existentes actualizados.', 'success')
     except Exception as e_cartera:
         flash(f'Error procesando la sección de Cartera del archivo maestro: {str(e_cartera)}', 'danger')
@@ -1849,13 +2387,13 @@ def procesar_reporte_maestro():
         else:
             # --- Unique Key Creation for Vencimientos ---
             df_maestro.drop_duplicates(subset=['NÚMERO PÓLIZA', 'FECHA FIN'], keep='first', inplace=True)
-            df_maestro['CLAVE_UNICA_VENC'] = df_maestro['NÚMERO PÓLIZA'].astype(str).str.strip() + "_" + pd.to_datetime(df_maestro['FECHA FIN'], format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m-%d').fillna('NODATE_VENC')
+            df_maestro['CLAVE_UNICA_VENC'] = clave_poliza_fecha(df_maestro['NÚMERO PÓLIZA'], df_maestro['FECHA FIN'], 'NODATE_VENC')
 
             df_venc_existente = pd.DataFrame()
             if os.path.exists(ruta_vencimientos):
-                df_venc_existente = pd.read_excel(ruta_vencimientos)
+                df_venc_existente = normalizar_versiones(leer_excel(ruta_vencimientos))
                 if not df_venc_existente.empty and 'NÚMERO PÓLIZA' in df_venc_existente.columns and 'FECHA FIN' in df_venc_existente.columns:
-                    df_venc_existente['CLAVE_UNICA_VENC'] = df_venc_existente['NÚMERO PÓLIZA'].astype(str).str.strip() + "_" + pd.to_datetime(df_venc_existente['FECHA FIN'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('NODATE_VENC_EXIST')
+                    df_venc_existente['CLAVE_UNICA_VENC'] = clave_poliza_fecha(df_venc_existente['NÚMERO PÓLIZA'], df_venc_existente['FECHA FIN'], 'NODATE_VENC_EXIST')
 
             # --- Data Processing for Vencimientos ---
             df_venc_procesados_nuevos = df_maestro[COLUMNAS_A_EXTRAER_VENCIMIENTOS + ['CLAVE_UNICA_VENC']].copy()
@@ -1878,30 +2416,35 @@ def procesar_reporte_maestro():
                 cols_para_update_venc = [col for col in columnas_desde_maestro_venc if col in df_venc_existente.columns and col in df_para_actualizar_venc.columns]
                 df_venc_existente.set_index('CLAVE_UNICA_VENC', inplace=True)
                 df_para_actualizar_venc.set_index('CLAVE_UNICA_VENC', inplace=True)
+                valores_anteriores_venc = df_venc_existente[cols_para_update_venc].copy()
                 df_venc_existente.update(df_para_actualizar_venc[cols_para_update_venc])
+                cambiadas_venc = filas_cambiadas(valores_anteriores_venc, df_venc_existente[cols_para_update_venc])
                 df_venc_existente.reset_index(inplace=True)
+                incrementar_versiones(df_venc_existente, cambiadas_venc)
 
             df_venc_final = pd.concat([df_venc_existente, df_nuevos_para_anadir_venc], ignore_index=True, sort=False)
 
             # --- Finalize and Save Vencimientos ---
-            if 'ID_VENCIMIENTO' in df_venc_final.columns:
-                df_venc_final.drop(columns=['ID_VENCIMIENTO'], inplace=True, errors='ignore')
-            df_venc_final.insert(0, 'ID_VENCIMIENTO', range(1, len(df_venc_final) + 1))
+            # Las filas existentes conservan su ID_VENCIMIENTO; las nuevas se numeran a continuación
+            asignar_ids_estables(df_venc_final, 'ID_VENCIMIENTO')
+            normalizar_versiones(df_venc_final)
 
             for col in ORDEN_COLUMNAS_VENCIMIENTOS:
                 if col not in df_venc_final.columns:
                     df_venc_final[col] = ''
             df_venc_final = df_venc_final[ORDEN_COLUMNAS_VENCIMIENTOS]
 
-            df_venc_final.to_excel(ruta_vencimientos, index=False)
+            escribir_excel(df_venc_final, ruta_vencimientos, index=False)
+            crear_punto_control('vencimientos')  # Carga masiva: el diario se reproduce desde aquí
+            reconstruir_indice_polizas(INDICES_DATA_DIR, 'vencimientos', df_venc_final, 'NÚMERO PÓLIZA', 'ID_VENCIMIENTO')
+            indexar_clientes('vencimientos', df_venc_final.to_dict(orient='records'), reconstruir=True)
             flash(f'Módulo Vencimientos actualizado: {len(df_nuevos_para_anadir_venc)} registros nuevos añadidos, {len(df_para_actualizar_venc)} registros existentes actualizados.', 'success')
 
     except Exception as e_venc:
         flash(f'Error procesando la sección de Vencimientos del archivo maestro: {str(e_venc)}', 'danger')
 
-    return redirect(url_for('index')) # Final redirect
-
 @app.route('/recaudo')
+@respuesta_en_cache('remisiones', 'config', por_dia=True)
 def recaudo():
     config = load_config()
     # Initialize all variables
@@ -1909,10 +2452,14 @@ def recaudo():
     renovaciones_data, prospectos_data, modificaciones_data, tpp_data = [], [], [], []
     chart_data = {'labels': [], 'data': []}
 
-    remisiones = cargar_remisiones()
-    if remisiones:
-        df = pd.DataFrame(remisiones)
-
+    df = None
+    if os.path.exists(EXCEL_FILE):
+        try:
+            # Tipos de esquemas.py: estado/ramo categóricos y casillas booleanas
+            df = leer_dataset('remisiones', columnas=COLUMNAS_RECAUDO)
+        except Exception as e:
+            print(f"Error al cargar desde Excel: {e}")
+    if df is not None and not df.empty:
         required_cols = ['renovacion', 'negocio_nuevo', 'modificacion', 'estado', 'fecha_registro', 'uib', 'ramo', 'co_corretaje_opcion', 'ComisionTPP']
         if all(col in df.columns for col in required_cols):
             # Clean and prepare data
@@ -1925,26 +2472,26 @@ def recaudo():
 
             # Base filter for remisiones created in the current month
             base_filter = (
-                (df['estado'].astype(str).str.strip().str.lower() == 'creado') &
+                igual_a(df['estado'], 'creado') &
                 (df['fecha_registro_dt'].dt.month == hoy.month) &
                 (df['fecha_registro_dt'].dt.year == hoy.year)
             )
             df_mes_actual = df[base_filter]
 
             # --- Calculations for KPI cards ---
-            df_renovaciones = df_mes_actual[df_mes_actual['renovacion'].astype(str).str.strip().str.lower() == 'si']
+            df_renovaciones = df_mes_actual[df_mes_actual['renovacion']]
             total_renovaciones = df_renovaciones['uib'].sum()
             renovaciones_data = df_renovaciones.to_dict(orient='records')
 
-            df_prospectos = df_mes_actual[df_mes_actual['negocio_nuevo'].astype(str).str.strip().str.lower() == 'si']
+            df_prospectos = df_mes_actual[df_mes_actual['negocio_nuevo']]
             total_prospectos = df_prospectos['uib'].sum()
             prospectos_data = df_prospectos.to_dict(orient='records')
 
-            df_modificaciones = df_mes_actual[df_mes_actual['modificacion'].astype(str).str.strip().str.lower() == 'si']
+            df_modificaciones = df_mes_actual[df_mes_actual['modificacion']]
             total_modificaciones = df_modificaciones['uib'].sum()
             modificaciones_data = df_modificaciones.to_dict(orient='records')
 
-            df_tpp = df_mes_actual[df_mes_actual['co_corretaje_opcion'].astype(str).str.strip().str.lower() == 'si']
+            df_tpp = df_mes_actual[df_mes_actual['co_corretaje_opcion']]
             total_tpp = df_tpp['ComisionTPP'].sum()
             tpp_data = df_tpp.to_dict(orient='records')
 
@@ -1952,7 +2499,7 @@ def recaudo():
 
             # --- Chart Data Calculation ---
             if not df_mes_actual.empty:
-                ramos_data = df_mes_actual.groupby('ramo')['uib'].sum().sort_values(ascending=False).head(10)
+                ramos_data = df_mes_actual.groupby('ramo', observed=True)['uib'].sum().sort_values(ascending=False).head(10)
                 chart_data['labels'] = ramos_data.index.tolist()
                 chart_data['data'] = ramos_data.values.tolist()
         else:
@@ -1980,7 +2527,7 @@ def visualizar_sarlaft():
 
     if os.path.exists(client_folders_path):
         if search_query:
-            for folder_name in os.listdir(client_folders_path):
+            for folder_name in listar_directorio(client_folders_path):
                 if search_query in folder_name.lower():
                     found_folders.append(folder_name)
 
@@ -1996,10 +2543,10 @@ def visualizar_sarlaft_docs(folder_name):
     found_docs = []
 
     if os.path.exists(sarlaft_folder_path):
-        for year_folder in os.listdir(sarlaft_folder_path):
+        for year_folder in listar_directorio(sarlaft_folder_path):
             year_folder_path = os.path.join(sarlaft_folder_path, year_folder)
             if os.path.isdir(year_folder_path):
-                for doc_name in os.listdir(year_folder_path):
+                for doc_name in listar_directorio(year_folder_path):
                     doc_name_lower = doc_name.lower()
                     # Check for both SARLAFT and Consulta Cliente documents
                     if 'sarlaft' in doc_name_lower or 'consulta_cliente_desqubra' in doc_name_lower:
@@ -2015,13 +2562,65 @@ def serve_sarlaft_doc(folder_name, year, doc_name):
     else:
         return "Archivo no encontrado", 404
 
+def consultar_cliente_360(identificador):
+    """
+    Reúne desde el índice de clientes los registros de un cliente en todos los módulos,
+    buscando primero por NIT/CC y, si no hay coincidencias, por nombre del tomador.
+    """
+    asegurar_indices_clientes()
+    datasets = list(INDICE_CLIENTES_DATASETS) + ['carpetas']
+
+    resultado = buscar_cliente(INDICES_DATA_DIR, datasets, nit=identificador)
+    if not any(resultado.values()):
+        resultado = buscar_cliente(INDICES_DATA_DIR, datasets, nombre=identificador)
+
+    carpetas = [r['carpeta'] for r in resultado.pop('carpetas', [])]
+    documentos_sarlaft = []
+    for carpeta in carpetas:
+        ruta_sarlaft = os.path.join(app.config['CLIENT_FOLDERS_BASE_DIR'], carpeta, 'SARLAFT')
+        if not os.path.isdir(ruta_sarlaft):
+            continue
+        for year_folder in sorted(listar_directorio(ruta_sarlaft), reverse=True):
+            ruta_ano = os.path.join(ruta_sarlaft, year_folder)
+            if os.path.isdir(ruta_ano):
+                for doc_name in sorted(listar_directorio(ruta_ano)):
+                    documentos_sarlaft.append({'carpeta': carpeta, 'year': year_folder, 'doc_name': doc_name})
+
+    resultado['nit'] = normalizar_nit(identificador)
+    resultado['carpetas'] = carpetas
+    resultado['sarlaft'] = documentos_sarlaft
+    return resultado
+
+@app.route('/cliente/<nit>')
+def cliente_360(nit):
+    config = load_config()
+    datos_cliente = consultar_cliente_360(nit)
+    return render_template('cliente_360.html',
+                           identificador=nit,
+                           cliente=datos_cliente,
+                           nombre_empresa=config.get('nombre_empresa'))
+
+@app.route('/api/cliente/<nit>')
+def api_cliente_360(nit):
+    datos_cliente = consultar_cliente_360(nit)
+    encontrado = any(datos_cliente[d] for d in INDICE_CLIENTES_DATASETS) or bool(datos_cliente['carpetas'])
+    return jsonify({'success': encontrado, 'cliente': datos_cliente}), (200 if encontrado else 404)
+
+@app.route('/adjuntos/estadisticas', methods=['GET'])
+def estadisticas_adjuntos():
+    """Reporte del almacén deduplicado: documentos, blobs únicos y espacio ahorrado."""
+    try:
+        return jsonify({'success': True, 'estadisticas': almacen_adjuntos.estadisticas()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error al calcular las estadísticas de adjuntos: {e}'}), 500
+
 @app.route('/cobros/editar/<id_cobro>')
 def editar_cobro(id_cobro):
     config = load_config()
     cobro_data = None
     if os.path.exists(COBROS_FILE):
         try:
-            df = pd.read_excel(COBROS_FILE)
+            df = leer_vigente('cobros', columnas=COLUMNAS_EDITAR_COBRO)  # Con escritura diferida, la copia en memoria
             df['ID_COBRO'] = df['ID_COBRO'].astype(str)
             cobro_data = df[df['ID_COBRO'] == id_cobro].to_dict('records')
             if not cobro_data:
@@ -2036,12 +2635,13 @@ def editar_cobro(id_cobro):
                            nombre_empresa=config.get('nombre_empresa'))
 
 @app.route('/cobros')
+@respuesta_en_cache('cobros', por_dia=True)
 def panel_cobros():
     cobros_list = []
     pagos_list = []
     if os.path.exists(COBROS_FILE):
         try:
-            df = pd.read_excel(COBROS_FILE)
+            df = leer_dataset('cobros', columnas=COLUMNAS_PANEL_COBROS)
             df['Fecha_Vencimiento_Cuota'] = pd.to_datetime(df['Fecha_Vencimiento_Cuota'], errors='coerce')
             df.dropna(subset=['Fecha_Vencimiento_Cuota'], inplace=True)
 
@@ -2049,16 +2649,16 @@ def panel_cobros():
             df_filtrado = df[
                 (df['Fecha_Vencimiento_Cuota'].dt.month == hoy.month) &
                 (df['Fecha_Vencimiento_Cuota'].dt.year == hoy.year)
-            ]
+            ].copy()
 
             # Handle missing Tipo_Movimiento column for backward compatibility
             if 'Tipo_Movimiento' not in df_filtrado.columns:
                 df_filtrado['Tipo_Movimiento'] = 'Cobro' # Default old records to 'Cobro'
-            df_filtrado['Tipo_Movimiento'].fillna('Cobro', inplace=True)
+            df_filtrado['Tipo_Movimiento'] = rellenar(df_filtrado['Tipo_Movimiento'], 'Cobro')
 
-            # Split into two dataframes using contains for flexibility
-            df_cobros = df_filtrado[df_filtrado['Tipo_Movimiento'].str.contains('Cobro', case=False, na=False)].sort_values(by='Fecha_Vencimiento_Cuota')
-            df_pagos = df_filtrado[df_filtrado['Tipo_Movimiento'].str.contains('Pago', case=False, na=False)].sort_values(by='Fecha_Vencimiento_Cuota')
+            # Split into two dataframes using contains for flexibility (categórica: compara códigos)
+            df_cobros = df_filtrado[contiene(df_filtrado['Tipo_Movimiento'], 'Cobro')].sort_values(by='Fecha_Vencimiento_Cuota')
+            df_pagos = df_filtrado[contiene(df_filtrado['Tipo_Movimiento'], 'Pago')].sort_values(by='Fecha_Vencimiento_Cuota')
 
             cobros_list = df_cobros.to_dict(orient='records')
             pagos_list = df_pagos.to_dict(orient='records')
@@ -2069,15 +2669,24 @@ def panel_cobros():
     return render_template('cobros.html', cobros=cobros_list, pagos=pagos_list)
 
 @app.route('/marcar_cobrado/<id_cobro>', methods=['POST'])
+@escritura_coordinada('cobros', diferida=True)
 def marcar_cobrado(id_cobro):
     if os.path.exists(COBROS_FILE):
         try:
-            df = pd.read_excel(COBROS_FILE)
+            df = leer_para_escritura('cobros')
             df['ID_COBRO'] = df['ID_COBRO'].astype(str)
-
             if id_cobro in df['ID_COBRO'].values:
-                df.loc[df['ID_COBRO'] == id_cobro, 'Estado'] = 'Cobrado'
-                df.to_excel(COBROS_FILE, index=False)
+                mascara = df['ID_COBRO'] == id_cobro
+                with registro_de_cambios('cobros', 'ID_COBRO') as diario:
+                    diario.actualizar_filas(df, mascara, {'Estado': 'Cobrado'})
+                    df.loc[mascara, 'Estado'] = 'Cobrado'
+                    guardar_dataset('cobros', df)
+                actualizadas = int(mascara.sum())
+            else:
+                actualizadas = 0
+
+            if actualizadas:
+                actualizar_indice_clientes('cobros', [id_cobro], {'Estado': 'Cobrado'})
                 flash('Cuota marcada como Cobrada.', 'success')
             else:
                 flash('Error: No se encontró el ID del cobro.', 'danger')
@@ -2089,8 +2698,18 @@ def marcar_cobrado(id_cobro):
     return redirect(url_for('panel_cobros'))
 
 if __name__ == '__main__':
+    # 'python app.py --dev' arranca el servidor de desarrollo de Flask (recarga y depurador).
+    # Sin argumentos se usa el servidor de producción (ver servidor.py).
+    import sys
     try:
-        app.run(host='0.0.0.0', port=5000, debug=True)
+        if '--dev' in sys.argv:
+            app.config['TEMPLATES_AUTO_RELOAD'] = True
+            inicializar_aplicacion()
+            app.run(host='0.0.0.0', port=5000, debug=True)
+        else:
+            inicializar_aplicacion()
+            from servidor import servir
+            servir(app)
     except Exception as e:
         import traceback
         with open('server_error.log', 'w') as f:
@@ -0,0 +1,296 @@
+"""
+Benchmarks de las rutas principales con datos sintéticos.
+
+Para cada tamaño se crea un espacio de trabajo temporal con una copia de la
+aplicación (app.py, módulos, plantillas, static y config.json), se generan los
+Excel de remisiones, cobros, prospectos, cartera y vencimientos con los esquemas
+reales, y se ejercitan las rutas con el cliente de pruebas de Flask. Cada tamaño
+corre en un subproceso propio para que el pico de RSS sea el de ese tamaño.
+
+Uso:
+    python benchmarks/ejecutar.py                              # 1k y 10k filas
+    python benchmarks/ejecutar.py --tamanos 1000 10000 100000 1000000
+    python benchmarks/ejecutar.py --guardar-linea-base         # fija la referencia
+    python benchmarks/ejecutar.py --tolerancia 0.25            # compara contra la referencia
+
+El resultado se escribe en benchmarks/ultimo_resultado.json. Si existe
+benchmarks/linea_base.json se marcan las regresiones (p50/p95 o RSS por encima de
+la tolerancia) y el proceso termina con código 1.
+
+Nota: generar los Excel de 1M de filas con openpyxl tarda varios minutos.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DIR_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIR_PROYECTO = os.path.dirname(DIR_BENCHMARKS)
+RUTA_LINEA_BASE = os.path.join(DIR_BENCHMARKS, 'linea_base.json')
+RUTA_ULTIMO_RESULTADO = os.path.join(DIR_BENCHMARKS, 'ultimo_resultado.json')
+
+TAMANOS_POR_DEFECTO = [1000, 10000]
+# Diferencias menores a esto se consideran ruido aunque superen la tolerancia relativa
+PISO_RUIDO_MS = 5.0
+PISO_RUIDO_RSS_MB = 20.0
+
+# Elementos del proyecto que se copian al espacio de trabajo (nunca los datos reales)
+ELEMENTOS_APLICACION = ['templates', 'static', 'plantillas', 'config.json']
+
+
+# --- Espacio de trabajo y datos ---
+
+def preparar_espacio_trabajo():
+    destino = tempfile.mkdtemp(prefix='bench_cicloseguros_')
+    for nombre in os.listdir(DIR_PROYECTO):
+        origen = os.path.join(DIR_PROYECTO, nombre)
+        if nombre.endswith('.py') and os.path.isfile(origen):
+            shutil.copy2(origen, destino)
+        elif nombre in ELEMENTOS_APLICACION:
+            if os.path.isdir(origen):
+                shutil.copytree(origen, os.path.join(destino, nombre))
+            else:
+                shutil.copy2(origen, destino)
+    desactivar_cache_respuestas(os.path.join(destino, 'config.json'))
+    return destino
+
+
+def desactivar_cache_respuestas(ruta_config):
+    """
+    Sin esto, cada GET después del calentamiento sería un acierto de la caché de
+    respuestas (cache_respuestas.py) y el benchmark no mediría la ruta.
+    """
+    config = {}
+    if os.path.exists(ruta_config):
+        with open(ruta_config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    config['cache_respuestas'] = {**config.get('cache_respuestas', {}), 'habilitado': False}
+    with open(ruta_config, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+
+
+def poblar_datos(modulo_app, tamano):
+    """Escribe los Excel sintéticos en las rutas que usa la aplicación. Devuelve el reporte maestro en bytes."""
+    sys.path.insert(0, DIR_BENCHMARKS)
+    import generadores as g
+
+    app = modulo_app.app
+    clientes = g.generar_clientes(max(tamano // 10, 10))
+    g.generar_remisiones(modulo_app.ORDEN_COLUMNAS_EXCEL_REMISIONES, tamano, clientes) \
+        .to_excel(modulo_app.EXCEL_FILE, index=False)
+    g.generar_cobros(modulo_app.ORDEN_COLUMNAS_COBROS, tamano, clientes) \
+        .to_excel(modulo_app.COBROS_FILE, index=False)
+    g.generar_prospectos(modulo_app.ORDEN_COLUMNAS_PROSPECTOS, tamano, clientes) \
+        .to_excel(app.config['PROSPECTOS_FILE_PATH'], index=False)
+    g.generar_cartera(modulo_app.ORDEN_COLUMNAS_EXCEL_CARTERA, tamano, clientes) \
+        .to_excel(app.config['CARTERA_PROCESADA_FILE_PATH'], index=False)
+    g.generar_vencimientos(modulo_app.ORDEN_COLUMNAS_VENCIMIENTOS, tamano, clientes) \
+        .to_excel(app.config['VENCIMIENTOS_PROCESADA_FILE_PATH'], index=False)
+    with open(modulo_app.CONSECUTIVO_FILE, 'w') as f:
+        f.write(str(tamano))
+
+    reporte = io.BytesIO()
+    g.generar_reporte_maestro(modulo_app.COLUMNAS_A_EXTRAER_CARTERA, modulo_app.COLUMNAS_A_EXTRAER_VENCIMIENTOS,
+                              tamano, clientes).to_excel(reporte, index=False)
+    return reporte.getvalue(), clientes
+
+
+# --- Medición ---
+
+def pico_rss_mb():
+    """Pico de memoria residente del proceso actual en MB (None si no se puede medir)."""
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta KB; macOS, bytes
+        return round(pico / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (sin interpolar)."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def resumir(tiempos_ms, estados):
+    return {
+        'n': len(tiempos_ms),
+        'p50_ms': round(percentil(tiempos_ms, 50), 2),
+        'p90_ms': round(percentil(tiempos_ms, 90), 2),
+        'p95_ms': round(percentil(tiempos_ms, 95), 2),
+        'p99_ms': round(percentil(tiempos_ms, 99), 2),
+        'max_ms': round(max(tiempos_ms), 2),
+        'media_ms': round(sum(tiempos_ms) / len(tiempos_ms), 2),
+        'estados': sorted(set(estados)),
+    }
+
+
+def escenarios(reporte_maestro, clientes):
+    """(nombre, método, ruta, fábrica de kwargs para client.open)."""
+    sys.path.insert(0, DIR_BENCHMARKS)
+    import generadores as g
+    contador = {'i': 0}
+
+    def form_registrar():
+        contador['i'] += 1
+        return {'data': g.formulario_remision(contador['i'], clientes)}
+
+    def form_reporte():
+        return {'data': {'archivo': (io.BytesIO(reporte_maestro), 'reporte_maestro.xlsx')},
+                'content_type': 'multipart/form-data'}
+
+    return [
+        ('registrar', 'POST', '/registrar', form_registrar),
+        ('control', 'GET', '/control', dict),
+        ('recaudo', 'GET', '/recaudo', dict),
+        ('cobros', 'GET', '/cobros', dict),
+        ('vencimientos_visualizar', 'GET', '/vencimientos/visualizar', dict),
+        ('cartera_visualizar', 'GET', '/cartera/visualizar', dict),
+        ('procesar_reporte_maestro', 'POST', '/procesar_reporte_maestro', form_reporte),
+    ]
+
+
+def trabajador(tamano, repeticiones, ruta_salida):
+    """Corre todos los escenarios para un tamaño (en un subproceso) y escribe el JSON en ruta_salida."""
+    espacio = preparar_espacio_trabajo()
+    try:
+        os.chdir(espacio)
+        sys.path.insert(0, espacio)
+        import app as modulo_app
+        modulo_app.inicializar_aplicacion()  # crea los directorios de datos que poblar_datos escribe
+
+        inicio = time.perf_counter()
+        reporte_maestro, clientes = poblar_datos(modulo_app, tamano)
+        segundos_generacion = round(time.perf_counter() - inicio, 2)
+
+        app = modulo_app.app
+        app.config['TESTING'] = True
+        app.config['METRICAS_UMBRAL_LENTO_MS'] = None  # el benchmark ya mide todo
+        cliente = app.test_client()
+
+        rss_inicial = pico_rss_mb()
+        resultados = {}
+        for nombre, metodo, ruta, kwargs in escenarios(reporte_maestro, clientes):
+            cliente.open(ruta, method=metodo, **kwargs())  # calentamiento
+            tiempos, estados = [], []
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                respuesta = cliente.open(ruta, method=metodo, **kwargs())
+                tiempos.append((time.perf_counter() - t0) * 1000)
+                estados.append(respuesta.status_code)
+                respuesta.close()
+            resultados[nombre] = resumir(tiempos, estados)
+            resultados[nombre]['pico_rss_mb'] = pico_rss_mb()
+            print(f"  {tamano:>8} {nombre:<26} p50={resultados[nombre]['p50_ms']:>9.1f} ms "
+                  f"p95={resultados[nombre]['p95_ms']:>9.1f} ms estados={resultados[nombre]['estados']}")
+
+        salida = {
+            'tamano': tamano,
+            'repeticiones': repeticiones,
+            'segundos_generacion': segundos_generacion,
+            'rss_tras_generacion_mb': rss_inicial,
+            'pico_rss_mb': pico_rss_mb(),
+            'escenarios': resultados,
+        }
+        with open(ruta_salida, 'w', encoding='utf-8') as f:
+            json.dump(salida, f, indent=2)
+    finally:
+        os.chdir(DIR_PROYECTO)
+        shutil.rmtree(espacio, ignore_errors=True)
+
+
+# --- Comparación con la línea base ---
+
+def comparar(actual, base, tolerancia):
+    """Lista de regresiones (texto) de 'actual' frente a 'base'."""
+    regresiones = []
+    for tamano, datos in actual['tamanos'].items():
+        datos_base = base.get('tamanos', {}).get(tamano)
+        if not datos_base:
+            continue
+        for nombre, metricas in datos['escenarios'].items():
+            metricas_base = datos_base['escenarios'].get(nombre)
+            if not metricas_base:
+                continue
+            for clave in ('p50_ms', 'p95_ms'):
+                valor, referencia = metricas[clave], metricas_base[clave]
+                if valor > referencia * (1 + tolerancia) and valor - referencia > PISO_RUIDO_MS:
+                    regresiones.append(f"{tamano} filas, {nombre}: {clave} {referencia} -> {valor} "
+                                       f"(+{(valor / referencia - 1) * 100:.0f}%)")
+        rss, rss_base = datos.get('pico_rss_mb'), datos_base.get('pico_rss_mb')
+        if rss and rss_base and rss > rss_base * (1 + tolerancia) and rss - rss_base > PISO_RUIDO_RSS_MB:
+            regresiones.append(f"{tamano} filas: pico RSS {rss_base} MB -> {rss} MB")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de CicloSeguros con datos sintéticos.')
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS_POR_DEFECTO)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help='Aumento relativo permitido frente a la línea base (0.25 = 25%%).')
+    parser.add_argument('--guardar-linea-base', action='store_true')
+    parser.add_argument('--trabajador', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--salida', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trabajador:
+        trabajador(args.trabajador, args.repeticiones, args.salida)
+        return 0
+
+    resultado = {'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'python': sys.version.split()[0], 'tamanos': {}}
+    for tamano in args.tamanos:
+        print(f"Tamaño {tamano} filas...")
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+            ruta_salida = tmp.name
+        try:
+            proceso = subprocess.run([sys.executable, os.path.abspath(__file__), '--trabajador', str(tamano),
+                                      '--repeticiones', str(args.repeticiones), '--salida', ruta_salida])
+            if proceso.returncode != 0:
+                print(f"ERROR: el benchmark de {tamano} filas terminó con código {proceso.returncode}")
+                continue
+            with open(ruta_salida, encoding='utf-8') as f:
+                resultado['tamanos'][str(tamano)] = json.load(f)
+        finally:
+            os.remove(ruta_salida)
+
+    with open(RUTA_ULTIMO_RESULTADO, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2)
+    print(f"Resultado guardado en {RUTA_ULTIMO_RESULTADO}")
+
+    if args.guardar_linea_base:
+        shutil.copyfile(RUTA_ULTIMO_RESULTADO, RUTA_LINEA_BASE)
+        print(f"Línea base actualizada: {RUTA_LINEA_BASE}")
+        return 0
+
+    if os.path.exists(RUTA_LINEA_BASE):
+        with open(RUTA_LINEA_BASE, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(resultado, base, args.tolerancia)
+        if regresiones:
+            print(f"REGRESIONES frente a la línea base del {base.get('fecha')}:")
+            for linea in regresiones:
+                print(f"  - {linea}")
+            return 1
+        print(f"Sin regresiones frente a la línea base del {base.get('fecha')}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Generadores de datos sintéticos para los benchmarks.
+
+Producen DataFrames con los esquemas reales de app.py (ORDEN_COLUMNAS_* y
+COLUMNAS_A_EXTRAER_*), que se reciben como parámetro para no duplicarlos aquí.
+Los valores son realistas en forma (NIT con dígito de verificación, pólizas
+numéricas, fechas en los formatos que usa cada módulo, montos en pesos) y la
+misma semilla produce siempre los mismos datos.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+ASEGURADORAS = ['SURA', 'ALLIANZ', 'BOLIVAR', 'AXA COLPATRIA', 'MAPFRE', 'LIBERTY', 'HDI', 'SBS', 'PREVISORA', 'ESTADO']
+RAMOS = ['AUTOS', 'SALUD', 'VIDA GRUPO', 'HOGAR', 'PYME', 'RESPONSABILIDAD CIVIL', 'CUMPLIMIENTO', 'TRANSPORTE', 'SOAT']
+VENDEDORES = ['DIRECTO', 'ANA GOMEZ', 'CARLOS RUIZ', 'LUISA PEREZ', 'JORGE DIAZ']
+RESPONSABLES = ['ANALISTA 1', 'ANALISTA 2', 'ANALISTA 3', '']
+ESTADOS_VENCIMIENTO = ['', 'En gestión', 'Renovada', 'No renovada', 'Cotizando']
+ESTADOS_PROSPECTO = ['Cotizado', 'En negociación', 'Ganado', 'Perdido']
+PALABRAS_EMPRESA = ['INVERSIONES', 'COMERCIALIZADORA', 'TRANSPORTES', 'INDUSTRIAS', 'SERVICIOS', 'CONSTRUCTORA',
+                    'DISTRIBUIDORA', 'AGROPECUARIA', 'LOGISTICA', 'ALIMENTOS']
+SUFIJOS_EMPRESA = ['S.A.S.', 'S.A.', 'LTDA', 'E.U.']
+APELLIDOS = ['GARCIA', 'RODRIGUEZ', 'MARTINEZ', 'LOPEZ', 'GONZALEZ', 'HERNANDEZ', 'RAMIREZ', 'TORRES', 'VARGAS', 'MORENO']
+
+
+def _rng(semilla):
+    return np.random.default_rng(semilla)
+
+
+def generar_clientes(n_clientes, semilla=0):
+    """Universo de clientes (nombre, NIT) compartido entre módulos para que se crucen."""
+    rng = _rng(semilla)
+    palabras = rng.choice(PALABRAS_EMPRESA, n_clientes)
+    apellidos = rng.choice(APELLIDOS, n_clientes)
+    sufijos = rng.choice(SUFIJOS_EMPRESA, n_clientes)
+    nombres = [f'{p} {a} {i} {s}' for i, (p, a, s) in enumerate(zip(palabras, apellidos, sufijos))]
+    bases = rng.integers(800_000_000, 999_999_999, n_clientes)
+    digitos = rng.integers(0, 10, n_clientes)
+    nits = [f'{b}-{d}' for b, d in zip(bases, digitos)]
+    return pd.DataFrame({'nombre': nombres, 'nit': nits})
+
+
+def _fechas(rng, n, inicio, dias):
+    return pd.to_datetime(inicio) + pd.to_timedelta(rng.integers(0, dias, n), unit='D')
+
+
+def _polizas(rng, n):
+    return rng.integers(1_000_000, 99_999_999, n).astype(str)
+
+
+def _montos(rng, n, minimo=300_000, maximo=80_000_000):
+    return np.round(rng.uniform(minimo, maximo, n), -3)
+
+
+def generar_remisiones(columnas, n, clientes, semilla=1, prefijo='CAM'):
+    rng = _rng(semilla)
+    idx = rng.integers(0, len(clientes), n)
+    fecha_inicio = _fechas(rng, n, datetime.now() - timedelta(days=730), 1095)
+    prima = _montos(rng, n)
+    porcentaje = rng.choice([10.0, 12.5, 15.0, 17.5, 20.0], n)
+    comision = prima * porcentaje / 100
+    co_corretaje = rng.random(n) < 0.15
+    porcentaje_tpp = np.where(co_corretaje, rng.choice([20.0, 30.0, 50.0], n), 0.0)
+    comision_tpp = comision * porcentaje_tpp / 100
+    forma_pago = rng.choice(['Contado', 'Financiado'], n, p=[0.7, 0.3])
+    tipo = rng.integers(0, 3, n)  # 0 renovación, 1 negocio nuevo, 2 modificación
+
+    datos = {
+        'consecutivo': [f'{prefijo}{i + 1:06d}' for i in range(n)],
+        'estado': rng.choice(['Pendiente', 'Creado'], n, p=[0.2, 0.8]),
+        'fecha_registro': (fecha_inicio - pd.to_timedelta(rng.integers(1, 30, n), unit='D')).strftime('%d/%m/%Y %H:%M:%S'),
+        'renovacion': np.where(tipo == 0, 'si', 'no'),
+        'negocio_nuevo': np.where(tipo == 1, 'si', 'no'),
+        'renovable': rng.choice(['si', 'no'], n),
+        'modificacion': np.where(tipo == 2, 'si', 'no'),
+        'anexo_checkbox': 'no',
+        'policy_number_modified': 'no',
+        'fecha_recepcion': (fecha_inicio - pd.to_timedelta(rng.integers(1, 30, n), unit='D')).strftime('%Y-%m-%d'),
+        'tomador': clientes['nombre'].values[idx],
+        'nit': clientes['nit'].values[idx],
+        'aseguradora': rng.choice(ASEGURADORAS, n),
+        'ramo': rng.choice(RAMOS, n),
+        'poliza': _polizas(rng, n),
+        'fecha_inicio': fecha_inicio.strftime('%Y-%m-%d'),
+        'fecha_fin': (fecha_inicio + pd.DateOffset(years=1)).strftime('%Y-%m-%d'),
+        'fecha_limite_pago': (fecha_inicio + pd.to_timedelta(30, unit='D')).strftime('%Y-%m-%d'),
+        'tipo_moneda': 'COP',
+        'prima_neta': prima,
+        'porcentaje_comision_valor': porcentaje,
+        'Comision$': comision,
+        'vendedor': rng.choice(VENDEDORES, n),
+        'porcentaje_vendedor': rng.choice([0, 10, 20], n),
+        'co_corretaje_opcion': np.where(co_corretaje, 'si', 'no'),
+        'co_corretaje_porcentaje': porcentaje_tpp,
+        'ComisionTPP': comision_tpp,
+        'ComisionUIB': comision - comision_tpp,
+        'uib': comision - comision_tpp,
+        'forma_pago': forma_pago,
+        'numero_cuotas': np.where(forma_pago == 'Financiado', rng.choice([3, 6, 10, 12], n), 1),
+        'periodicidad_pago': np.where(forma_pago == 'Financiado', 'Mensual', 'Anual'),
+        'analista_responsable': rng.choice(RESPONSABLES[:-1], n),
+    }
+    return _con_columnas(datos, columnas, n)
+
+
+def generar_cobros(columnas, n, clientes, semilla=2):
+    rng = _rng(semilla)
+    idx = rng.integers(0, len(clientes), n)
+    total_cuotas = rng.choice([3, 6, 10, 12], n)
+    cuota = np.minimum(rng.integers(1, 13, n), total_cuotas)
+    fecha_inicio = _fechas(rng, n, datetime.now() - timedelta(days=365), 365)
+    datos = {
+        'ID_COBRO': [f'{v:010X}' for v in rng.integers(0, 16 ** 10, n, dtype=np.int64)],
+        'CONSECUTIVO_REMISION': [f'CAM{v:06d}' for v in rng.integers(1, max(n, 2), n)],
+        'Tomador': clientes['nombre'].values[idx],
+        'NIT_CC': clientes['nit'].values[idx],
+        'Aseguradora': rng.choice(ASEGURADORAS, n),
+        'Ramo': rng.choice(RAMOS, n),
+        'N_Poliza': _polizas(rng, n),
+        'N_Cuota': cuota,
+        'Total_Cuotas': total_cuotas,
+        'Fecha_Vencimiento_Cuota': (fecha_inicio + pd.to_timedelta((cuota - 1) * 30, unit='D')).strftime('%Y-%m-%d'),
+        'Fecha_Inicio_Vigencia': fecha_inicio.strftime('%Y-%m-%d'),
+        'Fecha_Fin_Vigencia': (fecha_inicio + pd.DateOffset(years=1)).strftime('%Y-%m-%d'),
+        'Estado': rng.choice(['Pendiente', 'Cobrado'], n, p=[0.6, 0.4]),
+        'Tipo_Movimiento': rng.choice(['Cobro mensual', 'Pago mensual'], n, p=[0.8, 0.2]),
+    }
+    return _con_columnas(datos, columnas, n)
+
+
+def generar_prospectos(columnas, n, clientes, semilla=3):
+    rng = _rng(semilla)
+    idx = rng.integers(0, len(clientes), n)
+    prima = _montos(rng, n)
+    porcentaje = rng.choice([10.0, 12.5, 15.0, 20.0], n)
+    es_tpp = rng.random(n) < 0.1
+    fecha_cotizacion = _fechas(rng, n, datetime.now() - timedelta(days=365), 365)
+    datos = {
+        'ID_PROSPECTO': [f'{v:08X}' for v in rng.integers(0, 16 ** 8, n, dtype=np.int64)],
+        'Nombre Cliente': clientes['nombre'].values[idx],
+        'Responsable Tecnico': rng.choice(RESPONSABLES[:-1], n),
+        'Responsable Comercial': rng.choice(VENDEDORES, n),
+        'Fecha de Cotizacion': fecha_cotizacion.strftime('%Y-%m-%d'),
+        'Fecha inicio poliza': (fecha_cotizacion + pd.to_timedelta(rng.integers(5, 60, n), unit='D')).strftime('%Y-%m-%d'),
+        'es_TPP': np.where(es_tpp, 'si', 'no'),
+        'Nombre_TPP': np.where(es_tpp, rng.choice(VENDEDORES, n), ''),
+        'Porcentaje_comision_TPP': np.where(es_tpp, 30, 0),
+        'Ramo': rng.choice(RAMOS, n),
+        'Aseguradora': rng.choice(ASEGURADORAS, n),
+        'Prima': prima,
+        'Comision %': porcentaje,
+        'Comision $': prima * porcentaje / 100,
+        'Estado': rng.choice(ESTADOS_PROSPECTO, n),
+        'Fecha Creacion': fecha_cotizacion.strftime('%Y-%m-%d'),
+    }
+    return _con_columnas(datos, columnas, n)
+
+
+def _base_reporte(rng, n, clientes):
+    idx = rng.integers(0, len(clientes), n)
+    prima = _montos(rng, n)
+    porcentaje = rng.choice([10.0, 12.5, 15.0, 17.5, 20.0], n)
+    fecha_creacion = _fechas(rng, n, datetime.now() - timedelta(days=365), 365)
+    return {
+        'NÚMERO PÓLIZA': _polizas(rng, n),
+        'ASEGURADORA': rng.choice(ASEGURADORAS, n),
+        'NOMBRES CLIENTE': clientes['nombre'].values[idx],
+        'PRIMA NETA': prima,
+        'COMISIÓN': prima * porcentaje / 100,
+        'PORCENTAJE DE COMISIÓN': porcentaje,
+        'FECHA CREACIÓN': fecha_creacion.strftime('%d/%m/%Y'),
+        'VENDEDOR': rng.choice(VENDEDORES, n),
+        'FECHA FIN': (fecha_creacion + pd.DateOffset(years=1)),
+        'RAMO PRINCIPAL': rng.choice(RAMOS, n),
+    }
+
+
+def generar_reporte_maestro(columnas_cartera, columnas_vencimientos, n, clientes, semilla=4):
+    """Reporte maestro de la aseguradora con las columnas que extraen cartera y vencimientos."""
+    rng = _rng(semilla)
+    datos = _base_reporte(rng, n, clientes)
+    datos['SUCURSAL'] = rng.choice(['BOGOTA', 'MEDELLIN', 'CALI', 'BARRANQUILLA'], n)
+    columnas = list(dict.fromkeys(list(columnas_cartera) + list(columnas_vencimientos) + ['SUCURSAL']))
+    return _con_columnas(datos, columnas, n)
+
+
+def generar_cartera(columnas, n, clientes, semilla=5):
+    """cartera_procesada.xlsx tal como la deja procesar_reporte_maestro."""
+    rng = _rng(semilla)
+    datos = _base_reporte(rng, n, clientes)
+    comision = datos['COMISIÓN']
+    retencion = comision * 0.11
+    reteica = comision * 0.00966
+    datos.update({
+        'ID_CARTERA': np.arange(1, n + 1),
+        'N_FACTURA_Manual': np.where(rng.random(n) < 0.5, [f'FE{v}' for v in rng.integers(1000, 99999, n)], ''),
+        'Retencion_Calc': retencion,
+        'Reteica_Calc': reteica,
+        'Valor_Comision_UIB_Neto_Calc': comision - retencion - reteica,
+        'Intermediario_Original': datos['VENDEDOR'],
+        'Porc_Com_Intermediario_Original': datos['PORCENTAJE DE COMISIÓN'],
+        'Valor_Comision_Intermediario_Calc': np.where(datos['VENDEDOR'] == 'DIRECTO', 0.0, comision * 0.2),
+        'Clasificacion_Manual': rng.choice(['', 'Nuevo', 'Renovación'], n),
+        'Line_of_Business_Manual': rng.choice(['', 'Personas', 'Empresas'], n),
+    })
+    return _con_columnas(datos, columnas, n)
+
+
+def generar_vencimientos(columnas, n, clientes, semilla=6):
+    """vencimientos_procesados.xlsx tal como la deja procesar_reporte_maestro."""
+    rng = _rng(semilla)
+    datos = _base_reporte(rng, n, clientes)
+    fecha_fin = _fechas(rng, n, datetime.now() - timedelta(days=30), 180)
+    datos.update({
+        'ID_VENCIMIENTO': np.arange(1, n + 1),
+        'FECHA FIN': fecha_fin.strftime('%Y-%m-%d'),
+        'Fecha_inicio_seguimiento': (fecha_fin - pd.to_timedelta(45, unit='D')).strftime('%Y-%m-%d'),
+        'Responsable': rng.choice(RESPONSABLES, n),
+        'Estado': rng.choice(ESTADOS_VENCIMIENTO, n),
+        'Observaciones_adicionales': '',
+        'Remision_Asociada': '',
+    })
+    return _con_columnas(datos, columnas, n)
+
+
+def formulario_remision(i, clientes, semilla=7):
+    """Campos del formulario de /registrar para una remisión nueva (financiada a 6 cuotas)."""
+    rng = _rng(semilla + i)
+    cliente = clientes.iloc[int(rng.integers(0, len(clientes)))]
+    inicio = datetime.now().date()
+    return {
+        'negocio_nuevo': 'on',
+        'fecha_recepcion': inicio.isoformat(),
+        'tomador': cliente['nombre'],
+        'nit': cliente['nit'],
+        'aseguradora': str(rng.choice(ASEGURADORAS)),
+        'ramo': str(rng.choice(RAMOS)),
+        'poliza': str(int(rng.integers(1_000_000, 99_999_999))),
+        'fecha_inicio': inicio.isoformat(),
+        'fecha_fin': inicio.replace(year=inicio.year + 1).isoformat() if not (inicio.month == 2 and inicio.day == 29)
+        else (inicio + timedelta(days=365)).isoformat(),
+        'tipo_moneda': 'COP',
+        'prima_neta': '$2.500.000',
+        'porcentaje_comision_valor': '15',
+        'vendedor': 'DIRECTO',
+        'co_corretaje_opcion': 'no',
+        'forma_pago': 'Financiado',
+        'numero_cuotas': '6',
+        'periodicidad_pago': 'Mensual',
+        'analista_responsable': 'ANALISTA 1',
+    }
+
+
+def _con_columnas(datos, columnas, n):
+    """DataFrame con exactamente 'columnas' en ese orden; las no generadas quedan vacías."""
+    return pd.DataFrame({col: (datos[col] if col in datos else [''] * n) for col in columnas})
@@ -0,0 +1,129 @@
+"""
+Comprobación de la recuperación de la escritura diferida tras una caída.
+
+En un espacio de trabajo temporal (el mismo de ejecutar.py) con la escritura
+diferida habilitada y un intervalo largo, un subproceso marca varios cobros como
+Cobrado y termina con os._exit: ni el temporizador ni atexit llegan a escribir el
+Excel. Después se ejecuta 'python diario.py reproducir cobros' en el espacio de
+trabajo y se verifica que el Excel reconstruido tiene los cambios que el de disco
+perdió.
+
+Uso:
+    python benchmarks/recuperacion_diferida.py
+    python benchmarks/recuperacion_diferida.py --tamano 5000 --cambios 20
+
+Termina con código 0 si la recuperación es completa y 1 si no.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from ejecutar import DIR_PROYECTO, preparar_espacio_trabajo, poblar_datos
+
+
+def habilitar_escritura_diferida(ruta_config):
+    """Intervalo y máximo de mutaciones que ninguna prueba alcanza: solo atexit escribiría el Excel."""
+    with open(ruta_config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['escritura_diferida'] = {**config.get('escritura_diferida', {}), 'habilitado': True,
+                                    'intervalo_segundos': 3600, 'maximo_mutaciones': 100000}
+    config['diario'] = {**config.get('diario', {}), 'habilitado': True}
+    with open(ruta_config, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+
+
+def trabajador(espacio, tamano, cambios, ruta_salida):
+    """Marca 'cambios' cobros como Cobrado y muere sin escribir el Excel. IDs y ruta del Excel van a ruta_salida."""
+    os.chdir(espacio)
+    sys.path.insert(0, espacio)
+    import pandas as pd
+    import app as modulo_app
+    modulo_app.inicializar_aplicacion()
+    poblar_datos(modulo_app, tamano)
+
+    df = pd.read_excel(modulo_app.COBROS_FILE, dtype={'ID_COBRO': str})
+    ids = df.loc[df['Estado'].astype(str) != 'Cobrado', 'ID_COBRO'].head(cambios).tolist()
+
+    app = modulo_app.app
+    app.config['TESTING'] = True
+    cliente = app.test_client()
+    for id_cobro in ids:
+        cliente.post(f'/marcar_cobrado/{id_cobro}').close()
+
+    with open(ruta_salida, 'w', encoding='utf-8') as f:
+        json.dump({'ids': ids, 'ruta_cobros': modulo_app.COBROS_FILE}, f)
+    sys.stdout.flush()
+    os._exit(0)  # Caída simulada: sin atexit ni temporizador, los cambios solo están en el diario
+
+
+def comprobar(espacio, ids, ruta_cobros):
+    """Lista de errores (texto) del Excel en disco y del reconstruido por diario.py."""
+    import pandas as pd
+
+    ruta_recuperado = os.path.join(espacio, 'cobros_recuperado.xlsx')
+    errores = []
+    en_disco = pd.read_excel(ruta_cobros, dtype={'ID_COBRO': str}).set_index('ID_COBRO')['Estado']
+    if (en_disco.reindex(ids).astype(str) == 'Cobrado').any():
+        errores.append('El Excel en disco ya tiene cambios: la caída no ocurrió antes de escribirlo.')
+
+    proceso = subprocess.run([sys.executable, 'diario.py', 'reproducir', 'cobros', '--salida', ruta_recuperado],
+                             cwd=espacio, capture_output=True, text=True)
+    print(proceso.stdout.strip())
+    if proceso.returncode != 0:
+        errores.append(f"diario.py reproducir terminó con código {proceso.returncode}: {proceso.stderr.strip()}")
+        return errores
+
+    recuperado = pd.read_excel(ruta_recuperado, dtype={'ID_COBRO': str}).set_index('ID_COBRO')
+    faltantes = [i for i in ids if i not in recuperado.index or str(recuperado.at[i, 'Estado']) != 'Cobrado']
+    if faltantes:
+        errores.append(f"{len(faltantes)} de {len(ids)} cambios no se recuperaron: {faltantes[:10]}")
+    if len(recuperado) != len(en_disco):
+        errores.append(f"El Excel reconstruido tiene {len(recuperado)} filas; el de disco, {len(en_disco)}.")
+    return errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recuperación de la escritura diferida tras una caída.')
+    parser.add_argument('--tamano', type=int, default=1000)
+    parser.add_argument('--cambios', type=int, default=10)
+    parser.add_argument('--trabajador', help=argparse.SUPPRESS)
+    parser.add_argument('--salida', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trabajador:
+        trabajador(args.trabajador, args.tamano, args.cambios, args.salida)
+        return 0
+
+    espacio = preparar_espacio_trabajo()
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+        ruta_ids = tmp.name
+    try:
+        habilitar_escritura_diferida(os.path.join(espacio, 'config.json'))
+        proceso = subprocess.run([sys.executable, os.path.abspath(__file__), '--trabajador', espacio,
+                                  '--tamano', str(args.tamano), '--cambios', str(args.cambios), '--salida', ruta_ids])
+        if proceso.returncode != 0:
+            print(f"ERROR: el subproceso terminó con código {proceso.returncode}")
+            return 1
+        with open(ruta_ids, encoding='utf-8') as f:
+            datos = json.load(f)
+        ids = datos['ids']
+        errores = comprobar(espacio, ids, datos['ruta_cobros'])
+    finally:
+        os.remove(ruta_ids)
+        os.chdir(DIR_PROYECTO)
+        shutil.rmtree(espacio, ignore_errors=True)
+
+    if errores:
+        for error in errores:
+            print(f"ERROR: {error}")
+        return 1
+    print(f"Recuperación completa: {len(ids)} cambios perdidos en disco reconstruidos desde el diario.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Control del tiempo de importación de app.py (arranque en frío de cada worker).
+
+Ejecuta 'python -X importtime -c "import app"' en un proceso limpio, suma el tiempo
+acumulado y falla (código 1) si se supera el presupuesto o si al importar se cargan
+módulos que deben ser diferidos (pandas, numpy, openpyxl, dateutil).
+
+Uso:
+    python benchmarks/tiempo_importacion.py                     # presupuesto por defecto
+    python benchmarks/tiempo_importacion.py --presupuesto-ms 600 --top 15
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+DIR_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRESUPUESTO_MS = 800
+MODULOS_PROHIBIDOS = ('pandas', 'numpy', 'openpyxl', 'dateutil')
+
+# import time: self [us] | cumulative | imported package
+_LINEA = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def medir():
+    """Lista de (modulo, propio_us, acumulado_us, profundidad) de importar app."""
+    proceso = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                             cwd=DIR_PROYECTO, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        raise RuntimeError(f'No se pudo importar app:\n{proceso.stderr[-2000:]}')
+    filas = []
+    for linea in proceso.stderr.splitlines():
+        coincidencia = _LINEA.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, modulo = coincidencia.groups()
+            filas.append((modulo, int(propio), int(acumulado), (len(sangria) - 1) // 2))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Presupuesto de tiempo de importación de app.py.')
+    parser.add_argument('--presupuesto-ms', type=float, default=PRESUPUESTO_MS)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    filas = medir()
+    total_ms = next((acumulado for modulo, _, acumulado, _ in filas if modulo == 'app'), 0) / 1000
+    cargados = {modulo.split('.')[0] for modulo, _, _, _ in filas}
+    prohibidos = sorted(cargados.intersection(MODULOS_PROHIBIDOS))
+
+    print(f'Importar app: {total_ms:.0f} ms (presupuesto {args.presupuesto_ms:.0f} ms)')
+    print('Módulos de primer nivel más costosos:')
+    for modulo, _, acumulado, _ in sorted((f for f in filas if f[3] == 1), key=lambda f: -f[2])[:args.top]:
+        print(f'  {acumulado / 1000:>8.1f} ms  {modulo}')
+
+    fallas = []
+    if total_ms > args.presupuesto_ms:
+        fallas.append(f'el tiempo de importación ({total_ms:.0f} ms) supera el presupuesto')
+    if prohibidos:
+        fallas.append(f"se importan al arrancar módulos que deben ser diferidos: {', '.join(prohibidos)}")
+    for falla in fallas:
+        print(f'ERROR: {falla}')
+    return 1 if fallas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
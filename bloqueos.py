@@ -0,0 +1,155 @@
+"""
+Bloqueos de escritura coordinados entre hilos y procesos.
+
+Con un servidor multi-proceso (servidor.py) varios workers pueden intentar
+leer-modificar-escribir el mismo Excel/JSON a la vez. Cada dataset tiene un
+archivo de bloqueo en DATOS_BLOQUEOS; el bloqueo es exclusivo entre procesos
+(fcntl en Linux, msvcrt en Windows) y reentrante dentro del mismo hilo.
+"""
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_directorio_bloqueos = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DATOS_BLOQUEOS')
+
+_locks_hilos = {}
+_lock_registro = threading.Lock()
+_estado_local = threading.local()
+_observadores_escritura = []  # funciones(*datasets) llamadas tras cada escritura coordinada
+_observadores_inicio = []  # funciones(*datasets) llamadas antes de las escrituras directas al Excel
+
+
+def configurar_directorio(directorio):
+    """Define dónde se crean los archivos .lock (por defecto DATOS_BLOQUEOS junto a app.py)."""
+    global _directorio_bloqueos
+    _directorio_bloqueos = directorio  # se crea al adquirir el primer bloqueo
+
+
+def _obtener_rlock(nombre):
+    with _lock_registro:
+        if nombre not in _locks_hilos:
+            _locks_hilos[nombre] = threading.RLock()
+        return _locks_hilos[nombre]
+
+
+def _adquirir_archivo(nombre):
+    os.makedirs(_directorio_bloqueos, exist_ok=True)
+    archivo = open(os.path.join(_directorio_bloqueos, f'{nombre}.lock'), 'a+b')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            archivo.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK se rinde tras ~10 s; seguimos esperando
+                    time.sleep(0.05)
+        else:
+            import fcntl
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+    except Exception:
+        archivo.close()
+        raise
+    return archivo
+
+
+def _liberar_archivo(archivo):
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            archivo.seek(0)
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+    finally:
+        archivo.close()
+
+
+@contextmanager
+def bloqueo_interproceso(nombre):
+    """Bloqueo exclusivo por nombre de dataset, válido entre hilos y procesos."""
+    rlock = _obtener_rlock(nombre)
+    with rlock:
+        if not hasattr(_estado_local, 'abiertos'):
+            _estado_local.abiertos = {}
+        abiertos = _estado_local.abiertos
+        if nombre in abiertos:  # reentrada en el mismo hilo
+            abiertos[nombre][1] += 1
+        else:
+            abiertos[nombre] = [_adquirir_archivo(nombre), 1]
+        try:
+            yield
+        finally:
+            abiertos[nombre][1] -= 1
+            if abiertos[nombre][1] == 0:
+                archivo, _ = abiertos.pop(nombre)
+                _liberar_archivo(archivo)
+
+
+@contextmanager
+def bloqueo_datasets(*nombres):
+    """Adquiere varios bloqueos en orden alfabético (evita interbloqueos entre rutas)."""
+    nombres = sorted(set(nombres))
+    if not nombres:
+        yield
+        return
+    with bloqueo_interproceso(nombres[0]):
+        with bloqueo_datasets(*nombres[1:]):
+            yield
+
+
+def al_completar_escritura(observador):
+    """Registra observador(*datasets), que se llama con el bloqueo aún tomado tras cada escritura coordinada."""
+    _observadores_escritura.append(observador)
+
+
+def al_iniciar_escritura(observador):
+    """
+    Registra observador(*datasets), que se llama con el bloqueo ya tomado antes de cada
+    escritura coordinada que no es diferida (p. ej. vaciar la escritura diferida).
+    """
+    _observadores_inicio.append(observador)
+
+
+@contextmanager
+def seccion_de_escritura(*datasets, diferida=False):
+    """
+    Bloque leer-modificar-escribir coordinado: toma los bloqueos de los datasets y
+    avisa a los observadores antes y después. Las rutas con archivos subidos lo usan
+    solo alrededor de la escritura, después de recibir y guardar los archivos, para
+    que una carga lenta no detenga a los demás escritores.
+    """
+    with bloqueo_datasets(*datasets):
+        if not diferida:
+            for observador in _observadores_inicio:
+                observador(*datasets)
+        try:
+            yield
+        finally:
+            for observador in _observadores_escritura:
+                observador(*datasets)
+
+
+def escritura_coordinada(*datasets, metodos=('POST',), diferida=False):
+    """
+    Decorador de rutas Flask: serializa entre workers las peticiones que modifican
+    los datasets indicados. Las peticiones con otros métodos (GET) no se bloquean.
+    Al terminar se avisa a los observadores (p. ej. versiones de la caché de respuestas).
+    diferida=True marca las rutas que guardan con escritura_diferida.guardar_dataset
+    en lugar de escribir el Excel directamente.
+    Las rutas que reciben archivos usan seccion_de_escritura dentro de la vista.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            from flask import request
+            if request.method not in metodos:
+                return funcion(*args, **kwargs)
+            with seccion_de_escritura(*datasets, diferida=diferida):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
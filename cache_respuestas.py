@@ -0,0 +1,128 @@
+"""
+Caché de respuestas para las páginas de solo lectura, con ETag y Last-Modified.
+
+Cada dataset (remisiones, cobros, cartera, ...) tiene un contador de versión en
+disco que incrementan las rutas de escritura (a través de escritura_coordinada en
+bloqueos.py) y que se combina con la fecha de modificación de sus archivos, de modo
+que también se detectan cambios hechos a mano en los Excel. La clave de caché es
+(endpoint, argumentos de la URL[, fecha del día]) y la versión forma el ETag: si la
+versión cambia, la entrada deja de servir y se vuelve a generar.
+
+Los contadores viven en archivos para que todos los workers vean el mismo valor;
+el contenido cacheado es por proceso (LRU en memoria).
+"""
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+_config = {'directorio_versiones': None, 'archivos': {}, 'maximo_entradas': 64, 'habilitado': True}
+_entradas = OrderedDict()  # clave -> (etag, cuerpo, status, mimetype)
+_lock = threading.Lock()
+
+
+def configurar_cache(directorio_versiones, archivos_por_dataset, maximo_entradas=64, habilitado=True):
+    """archivos_por_dataset: {dataset: [rutas cuyo mtime forma parte de la versión]}."""
+    _config.update(directorio_versiones=directorio_versiones, archivos=archivos_por_dataset,
+                   maximo_entradas=int(maximo_entradas), habilitado=bool(habilitado))
+
+
+def _ruta_version(dataset):
+    return os.path.join(_config['directorio_versiones'], f'{dataset}.version')
+
+
+def _leer_contador(dataset):
+    try:
+        with open(_ruta_version(dataset), 'r') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def incrementar_version(*datasets):
+    """
+    Marca los datasets como modificados. Se llama con el bloqueo del dataset tomado
+    (escritura_coordinada), así que leer-incrementar-escribir no compite con otro worker.
+    """
+    if not _config['directorio_versiones']:
+        return
+    os.makedirs(_config['directorio_versiones'], exist_ok=True)
+    for dataset in datasets:
+        ruta = _ruta_version(dataset)
+        temporal = f'{ruta}.tmp'
+        with open(temporal, 'w') as f:
+            f.write(str(_leer_contador(dataset) + 1))
+        os.replace(temporal, ruta)
+
+
+def version_datasets(datasets):
+    """(contadores, mtimes) de los datasets y el mtime más reciente de sus archivos (para Last-Modified)."""
+    partes, ultimo_mtime = [], 0
+    for dataset in datasets:
+        partes.append(f'{dataset}:{_leer_contador(dataset)}')
+        for ruta in _config['archivos'].get(dataset, []):
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                partes.append(f'{ruta}:-')
+                continue
+            partes.append(f'{estado.st_mtime_ns}:{estado.st_size}')
+            ultimo_mtime = max(ultimo_mtime, estado.st_mtime)
+    return '|'.join(partes), ultimo_mtime
+
+
+def limpiar_cache():
+    with _lock:
+        _entradas.clear()
+
+
+def respuesta_en_cache(*datasets, por_dia=False):
+    """
+    Decorador de rutas GET: sirve la respuesta desde caché mientras la versión de
+    'datasets' no cambie y responde 304 a los navegadores que ya la tienen.
+    por_dia=True para páginas que dependen de la fecha actual (KPIs del mes, bandas de vencimiento).
+    No se cachea si hay mensajes flash pendientes o si la vista genera alguno.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            from flask import make_response, request, session
+            if not _config['habilitado'] or request.method != 'GET' or session.get('_flashes'):
+                return funcion(*args, **kwargs)
+
+            hoy = datetime.now().strftime('%Y-%m-%d') if por_dia else ''
+            clave = (request.endpoint, tuple(sorted(request.view_args.items())),
+                     tuple(sorted(request.args.items(multi=True))), hoy)
+            version, ultimo_mtime = version_datasets(datasets)
+            etag = hashlib.sha1(repr((clave, version)).encode('utf-8')).hexdigest()
+
+            with _lock:
+                entrada = _entradas.get(clave)
+                if entrada is not None and entrada[0] == etag:
+                    _entradas.move_to_end(clave)
+                else:
+                    entrada = None
+
+            if entrada is not None:
+                respuesta = make_response(entrada[1], entrada[2])
+                respuesta.mimetype = entrada[3]
+            else:
+                respuesta = make_response(funcion(*args, **kwargs))
+                if respuesta.status_code != 200 or session.get('_flashes') or respuesta.direct_passthrough:
+                    return respuesta
+                with _lock:
+                    _entradas[clave] = (etag, respuesta.get_data(), respuesta.status_code, respuesta.mimetype)
+                    _entradas.move_to_end(clave)
+                    while len(_entradas) > _config['maximo_entradas']:
+                        _entradas.popitem(last=False)
+
+            respuesta.set_etag(etag)
+            if ultimo_mtime and not por_dia:
+                respuesta.last_modified = datetime.fromtimestamp(int(ultimo_mtime), tz=timezone.utc)
+            # El navegador puede guardar la página pero debe revalidarla siempre (304 si no cambió)
+            respuesta.headers['Cache-Control'] = 'private, no-cache'
+            return respuesta.make_conditional(request)
+        return envoltura
+    return decorador
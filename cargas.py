@@ -0,0 +1,175 @@
+"""
+Carga de adjuntos en streaming.
+
+Werkzeug guarda cada archivo del formulario multipart en un temporal y luego
+archivo.save() lo vuelve a copiar al destino. Aquí el temporal se crea desde el
+principio en CARGAS_TEMPORALES (mismo disco que CLIENTES_CARPETAS), el SHA-256 se
+calcula mientras llegan los bloques y el guardado final es un os.replace (sin
+copia) ejecutado en un pool pequeño de hilos para varios archivos a la vez.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+TAMANO_BLOQUE = 1024 * 1024  # 1 MB
+
+_pool = None
+_lock_pool = threading.Lock()
+
+
+class ArchivoDemasiadoGrande(RequestEntityTooLarge):
+    """Un adjunto superó CARGAS_TAMANO_MAXIMO_ARCHIVO (la solicitud completa se limita con MAX_CONTENT_LENGTH)."""
+
+
+class ArchivoCargaConHash:
+    """
+    Archivo temporal que calcula SHA-256 y tamaño a medida que Werkzeug escribe
+    los bloques recibidos. Delega el resto de operaciones en el archivo real.
+    """
+
+    def __init__(self, directorio, tamano_maximo=None):
+        os.makedirs(directorio, exist_ok=True)
+        self._archivo = tempfile.NamedTemporaryFile(dir=directorio, prefix='carga_', suffix='.part', delete=False)
+        self.ruta_temporal = self._archivo.name
+        self.tamano_maximo = tamano_maximo
+        self.bytes_escritos = 0
+        self._hash = hashlib.sha256()
+        self.movido = False
+
+    def write(self, datos):
+        self.bytes_escritos += len(datos)
+        if self.tamano_maximo and self.bytes_escritos > self.tamano_maximo:
+            raise ArchivoDemasiadoGrande(f'El archivo supera el tamaño máximo permitido ({self.tamano_maximo // (1024 * 1024)} MB).')
+        self._hash.update(datos)
+        return self._archivo.write(datos)
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def finalizar(self):
+        """Hace durable el temporal (fsync) y lo cierra; quien lo reciba pasa a ser su dueño."""
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._archivo.close()
+        self.movido = True
+
+    def mover_a(self, ruta_destino):
+        """Hace durable el archivo y lo mueve a su destino final sin copiarlo."""
+        self.finalizar()
+        os.replace(self.ruta_temporal, ruta_destino)
+        _fsync_directorio(os.path.dirname(ruta_destino))
+
+    def close(self):
+        if not self._archivo.closed:
+            self._archivo.close()
+        if not self.movido and os.path.exists(self.ruta_temporal):
+            try:
+                os.remove(self.ruta_temporal)
+            except OSError:
+                pass
+
+    def __getattr__(self, nombre):
+        if nombre == '_archivo':
+            raise AttributeError(nombre)
+        return getattr(self._archivo, nombre)
+
+    def __iter__(self):
+        return iter(self._archivo)
+
+
+class SolicitudConCargaStreaming(Request):
+    """Request de Flask cuyos archivos multipart se escriben en ArchivoCargaConHash."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        return ArchivoCargaConHash(config['CARGAS_TEMPORALES_DIR'], config.get('CARGAS_TAMANO_MAXIMO_ARCHIVO'))
+
+
+def _fsync_directorio(directorio):
+    # En Windows no se puede abrir un directorio para fsync; NTFS ya registra el rename.
+    if os.name != 'posix':
+        return
+    fd = os.open(directorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def guardar_archivo(archivo, ruta_destino, almacen=None):
+    """
+    Guarda un FileStorage en ruta_destino y devuelve {'ruta', 'sha256', 'bytes'}.
+    Si el archivo llegó por SolicitudConCargaStreaming solo se mueve; en otro caso
+    se copia por bloques calculando el hash. Con un AlmacenAdjuntos el contenido se
+    deduplica y ruta_destino queda como enlace al blob.
+    """
+    os.makedirs(os.path.dirname(ruta_destino), exist_ok=True)
+    stream = archivo.stream
+    if isinstance(stream, ArchivoCargaConHash):
+        if almacen is not None:
+            stream.finalizar()
+            almacen.guardar_desde_temporal(stream.ruta_temporal, stream.sha256, stream.bytes_escritos, ruta_destino)
+        else:
+            stream.mover_a(ruta_destino)
+        return {'ruta': ruta_destino, 'sha256': stream.sha256, 'bytes': stream.bytes_escritos}
+
+    if almacen is not None:
+        stream.seek(0)
+        sha256, total = almacen.guardar_desde_stream(stream, ruta_destino)
+        return {'ruta': ruta_destino, 'sha256': sha256, 'bytes': total}
+
+    hash_sha = hashlib.sha256()
+    total = 0
+    stream.seek(0)
+    with open(ruta_destino, 'wb') as destino:
+        while True:
+            bloque = stream.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            hash_sha.update(bloque)
+            destino.write(bloque)
+            total += len(bloque)
+        destino.flush()
+        os.fsync(destino.fileno())
+    return {'ruta': ruta_destino, 'sha256': hash_sha.hexdigest(), 'bytes': total}
+
+
+def _obtener_pool():
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            hilos = current_app.config.get('CARGAS_HILOS', 4)
+            _pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='cargas')
+        return _pool
+
+
+def guardar_archivos_en_paralelo(tareas, omitir_errores=False, almacen=None):
+    """
+    tareas: lista de (FileStorage, ruta_destino). Guarda todos los archivos en el pool
+    y espera a que estén en disco. Devuelve los resultados en el mismo orden.
+    Si alguno falla se relanza la primera excepción después de esperar a los demás,
+    salvo con omitir_errores=True, donde el resultado de ese archivo es None.
+    almacen: AlmacenAdjuntos opcional para deduplicar por contenido.
+    """
+    if not tareas:
+        return []
+
+    pool = _obtener_pool()
+    futuros = [pool.submit(guardar_archivo, archivo, ruta, almacen) for archivo, ruta in tareas]
+    resultados, primer_error = [], None
+    for (archivo, _), futuro in zip(tareas, futuros):
+        try:
+            resultados.append(futuro.result())
+        except Exception as e:
+            print(f"Error al guardar el archivo {archivo.filename}: {e}")
+            resultados.append(None)
+            primer_error = primer_error or e
+    if primer_error and not omitir_errores:
+        raise primer_error
+    return resultados
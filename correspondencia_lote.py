@@ -0,0 +1,68 @@
+"""
+Empaquetado en streaming de cartas de correspondencia generadas en lote.
+
+Las cartas llegan como un iterable de (nombre_archivo, html) que se va renderizando
+a medida que se consume, así que el servidor nunca arma el lote completo en memoria:
+- generar_zip: un .html por carta dentro de un ZIP escrito por partes.
+- generar_html_multipagina: un solo documento con un salto de página por carta.
+"""
+import io
+import re
+import zipfile
+from datetime import datetime
+
+_RE_HEAD = re.compile(r'<head[^>]*>(.*?)</head>', re.IGNORECASE | re.DOTALL)
+_RE_BODY = re.compile(r'<body[^>]*>(.*?)</body>', re.IGNORECASE | re.DOTALL)
+
+
+class _SalidaPorPartes(io.RawIOBase):
+    """Destino no buscable para zipfile: acumula lo escrito hasta que se vacía."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def generar_zip(cartas):
+    """Genera los bytes de un ZIP con una entrada por carta, carta a carta."""
+    salida = _SalidaPorPartes()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        for nombre_archivo, html in cartas:
+            info = zipfile.ZipInfo(nombre_archivo, date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archivo_zip.writestr(info, html.encode('utf-8'))
+            yield salida.vaciar()
+    yield salida.vaciar()
+
+
+def generar_html_multipagina(cartas):
+    """
+    Genera un único HTML imprimible: el <head> (estilos) de la primera carta y el
+    <body> de cada carta en su propia página.
+    """
+    primera = True
+    for _, html in cartas:
+        if primera:
+            cabecera = _RE_HEAD.search(html)
+            yield ('<!DOCTYPE html>\n<html lang="es">\n<head>'
+                   + (cabecera.group(1) if cabecera else '<meta charset="UTF-8">')
+                   + '<style>.carta { page-break-after: always; break-after: page; }'
+                   ' .carta:last-child { page-break-after: auto; break-after: auto; }</style>'
+                   '</head>\n<body>\n')
+            primera = False
+        cuerpo = _RE_BODY.search(html)
+        yield f'<div class="carta">{cuerpo.group(1) if cuerpo else html}</div>\n'
+    if primera:
+        yield '<!DOCTYPE html>\n<html lang="es">\n<head><meta charset="UTF-8"></head>\n<body>\n'
+    yield '</body>\n</html>\n'
@@ -0,0 +1,297 @@
+"""
+Diario de cambios (write-ahead) de los datasets, con herramienta de reproducción.
+
+Antes de escribir un cambio en el Excel, las rutas de escritura anotan en
+DATOS_DIARIO/<dataset>.jsonl una línea por registro modificado o insertado:
+    {"id", "fecha", "dataset", "operacion": "actualizar" | "insertar",
+     "columna_clave", "clave", "anterior": {...}, "nuevo": {...}}
+Si la escritura falla, se anota una línea "anulacion" con los ids afectados.
+Las cargas masivas (reporte maestro) terminan con un "punto_control": una copia del
+Excel en DATOS_DIARIO/puntos_control/<dataset>/ desde la que se puede reproducir.
+El diario de cada dataset empieza siempre con un punto de control: al crearse (con
+el Excel previo al primer cambio, o vacío si aún no existe) y, para los diarios
+anteriores a esta regla, al iniciar la aplicación (asegurar_punto_control).
+
+Uso:
+    python diario.py historial remisiones UIB-0001
+    python diario.py punto-control cobros
+    python diario.py reproducir vencimientos --hasta 2025-03-05T18:00 --salida vencimientos_recuperado.xlsx
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from bloqueos import bloqueo_interproceso
+from indices import _valor_json
+
+_config = {'directorio': None, 'archivos': {}, 'habilitado': True}
+
+
+def configurar_diario(directorio, archivos_por_dataset, habilitado=True):
+    """archivos_por_dataset: {dataset: ruta del Excel}."""
+    _config.update(directorio=directorio, archivos=archivos_por_dataset, habilitado=bool(habilitado))
+
+
+def _ruta_diario(dataset):
+    return os.path.join(_config['directorio'], f'{dataset}.jsonl')
+
+
+def _anotar(dataset, entradas):
+    """Agrega las entradas al diario y las lleva a disco (fsync) antes de devolver."""
+    if not entradas or not _config['habilitado']:
+        return
+    os.makedirs(_config['directorio'], exist_ok=True)
+    with bloqueo_interproceso(f'diario_{dataset}'):
+        if not os.path.exists(_ruta_diario(dataset)) and entradas[0]['operacion'] != 'punto_control':
+            # Diario nuevo: el Excel aún no tiene estos cambios, es la base para reproducirlos
+            entradas = [_copiar_punto_control(dataset)] + entradas
+        lineas = ''.join(json.dumps(entrada, ensure_ascii=False) + '\n' for entrada in entradas)
+        with open(_ruta_diario(dataset), 'a', encoding='utf-8') as f:
+            f.write(lineas)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _entrada(dataset, operacion, **campos):
+    return {'id': uuid.uuid4().hex, 'fecha': datetime.now().isoformat(timespec='seconds'),
+            'dataset': dataset, 'operacion': operacion, **campos}
+
+
+class RegistroDeCambios:
+    """Anota los cambios de un dataset; ver registro_de_cambios."""
+
+    def __init__(self, dataset, columna_clave):
+        self.dataset = dataset
+        self.columna_clave = columna_clave
+        self.ids = []
+
+    def _registrar(self, entradas):
+        _anotar(self.dataset, entradas)
+        self.ids.extend(entrada['id'] for entrada in entradas)
+
+    def actualizar(self, clave, anterior, nuevo):
+        """Un registro: {columna: valor anterior} -> {columna: valor nuevo}."""
+        self._registrar([_entrada(self.dataset, 'actualizar', columna_clave=self.columna_clave,
+                                  clave=str(clave).strip(),
+                                  anterior={k: _valor_json(v) for k, v in anterior.items()},
+                                  nuevo={k: _valor_json(v) for k, v in nuevo.items()})])
+
+    def actualizar_filas(self, df, mascara, cambios):
+        """
+        Anota 'cambios' ({columna: valor}) para las filas de 'df' seleccionadas por
+        'mascara', tomando los valores anteriores del propio df: llamar antes de modificarlo.
+        Un valor puede ser una Series alineada con df (un valor por fila, p. ej. VERSION_FILA + 1).
+        """
+        import pandas as pd
+
+        columnas = [c for c in cambios if c in df.columns]
+        entradas = []
+        for indice, fila in df.loc[mascara].iterrows():
+            nuevo = {c: _valor_json(v.at[indice] if isinstance(v, pd.Series) else v) for c, v in cambios.items()}
+            entradas.append(_entrada(self.dataset, 'actualizar', columna_clave=self.columna_clave,
+                                     clave=str(fila[self.columna_clave]).strip(),
+                                     anterior={c: _valor_json(fila[c]) for c in columnas}, nuevo=nuevo))
+        self._registrar(entradas)
+
+    def insertar(self, registros):
+        self._registrar([_entrada(self.dataset, 'insertar', columna_clave=self.columna_clave,
+                                  clave=str(registro.get(self.columna_clave, '')).strip(),
+                                  nuevo={k: _valor_json(v) for k, v in registro.items()})
+                         for registro in registros])
+
+
+@contextmanager
+def registro_de_cambios(dataset, columna_clave):
+    """
+    Contexto para anotar cambios antes de escribirlos:
+        with registro_de_cambios('cobros', 'ID_COBRO') as diario:
+            diario.actualizar_filas(df, mascara, {'Estado': 'Cobrado'})
+            ...modificar df y escribir_excel(...)
+    Si el bloque lanza una excepción, los cambios anotados se marcan como anulados.
+    """
+    registro = RegistroDeCambios(dataset, columna_clave)
+    try:
+        yield registro
+    except BaseException:
+        if registro.ids:
+            _anotar(dataset, [_entrada(dataset, 'anulacion', ids=registro.ids)])
+        raise
+
+
+def _copiar_punto_control(dataset):
+    """
+    Copia el Excel actual del dataset y devuelve la entrada 'punto_control' (sin anotarla).
+    Si el Excel aún no existe, el punto de control es el dataset vacío (archivo None).
+    """
+    ruta_excel = _config['archivos'][dataset]
+    if not os.path.exists(ruta_excel):
+        return _entrada(dataset, 'punto_control', archivo=None)
+    directorio = os.path.join(_config['directorio'], 'puntos_control', dataset)
+    os.makedirs(directorio, exist_ok=True)
+    nombre = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.xlsx"
+    shutil.copy2(ruta_excel, os.path.join(directorio, nombre))
+    return _entrada(dataset, 'punto_control', archivo=f'puntos_control/{dataset}/{nombre}')
+
+
+def crear_punto_control(dataset):
+    """Copia el Excel actual del dataset y lo anota en el diario. Devuelve la ruta de la copia."""
+    if not _config['habilitado'] or not os.path.exists(_config['archivos'][dataset]):
+        return None
+    entrada = _copiar_punto_control(dataset)
+    _anotar(dataset, [entrada])
+    return os.path.join(_config['directorio'], entrada['archivo'])
+
+
+def _tiene_punto_control(dataset):
+    ruta = _ruta_diario(dataset)
+    if not os.path.exists(ruta):
+        return False
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return any('"operacion": "punto_control"' in linea for linea in f)
+
+
+def asegurar_punto_control(dataset):
+    """
+    Crea un punto de control si el diario del dataset aún no tiene ninguno (diarios
+    creados antes de que cada diario empezara con uno). Se llama al iniciar la aplicación.
+    """
+    if not _config['habilitado'] or not os.path.exists(_config['archivos'][dataset]):
+        return  # Sin Excel: el primer cambio anotado crea el punto de control (vacío)
+    with bloqueo_interproceso(dataset), bloqueo_interproceso(f'diario_{dataset}'):
+        if not _tiene_punto_control(dataset):
+            crear_punto_control(dataset)
+
+
+def leer_diario(dataset):
+    """Entradas del diario en orden, sin las anuladas ni las anulaciones."""
+    ruta = _ruta_diario(dataset)
+    if not os.path.exists(ruta):
+        return []
+    entradas = []
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for numero, linea in enumerate(f, start=1):
+            if not linea.strip():
+                continue
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError:
+                print(f"ADVERTENCIA: Línea {numero} del diario de '{dataset}' ilegible; se omite.")
+    anuladas = {i for e in entradas if e['operacion'] == 'anulacion' for i in e['ids']}
+    return [e for e in entradas if e['operacion'] != 'anulacion' and e['id'] not in anuladas]
+
+
+def historial(dataset, clave):
+    clave = str(clave).strip()
+    return [e for e in leer_diario(dataset) if e.get('clave') == clave]
+
+
+def _limite_hasta(hasta):
+    """
+    Límite exclusivo para 'hasta' (ISO), inclusivo en su propia precisión:
+    '2025-03-05T18:00' incluye todo el minuto 18:00 y '2025-03-05', todo el día.
+    """
+    limite = datetime.fromisoformat(hasta)
+    texto = hasta.strip()
+    if len(texto) <= 10:
+        return limite + timedelta(days=1)
+    if len(texto) <= 13:
+        return limite + timedelta(hours=1)
+    if len(texto) <= 16:
+        return limite + timedelta(minutes=1)
+    if len(texto) <= 19:
+        return limite + timedelta(seconds=1)
+    return limite + timedelta(microseconds=1)
+
+
+def reproducir(dataset, hasta=None, punto=None):
+    """
+    Reconstruye el dataset: parte del punto de control indicado (o del último anterior
+    a 'hasta') y aplica las entradas posteriores hasta 'hasta' (ISO, inclusive).
+    Devuelve el DataFrame. ValueError si no hay un punto de control desde el que partir:
+    reproducir solo las entradas daría un dataset parcial.
+    """
+    import pandas as pd
+
+    entradas = leer_diario(dataset)
+    if hasta is not None:
+        limite = _limite_hasta(hasta)
+        entradas = [e for e in entradas if datetime.fromisoformat(e['fecha']) < limite]
+    inicio = None
+    for i, entrada in enumerate(entradas):
+        if entrada['operacion'] == 'punto_control' and (punto is None or (entrada['archivo'] or '').endswith(punto)):
+            inicio = i
+    if inicio is None:
+        if punto is not None:
+            raise ValueError(f"No se encontró el punto de control '{punto}' en el diario de '{dataset}'.")
+        raise ValueError(f"El diario de '{dataset}' no tiene un punto de control"
+                         f"{' anterior a ' + hasta if hasta else ''} desde el que reproducir.")
+    if entradas[inicio]['archivo'] is None:
+        df = pd.DataFrame()  # El dataset no existía al empezar el diario
+    else:
+        df = pd.read_excel(os.path.join(_config['directorio'], entradas[inicio]['archivo']))
+    entradas = entradas[inicio + 1:]
+
+    for entrada in entradas:
+        if entrada['operacion'] == 'insertar':
+            df = pd.concat([df, pd.DataFrame([entrada['nuevo']])], ignore_index=True)
+        elif entrada['operacion'] == 'actualizar':
+            columna_clave = entrada['columna_clave']
+            if columna_clave not in df.columns:
+                continue
+            mascara = df[columna_clave].astype(str).str.strip() == entrada['clave']
+            for columna, valor in entrada['nuevo'].items():
+                if columna not in df.columns:
+                    df[columna] = ''
+                df[columna] = df[columna].astype(object)
+                df.loc[mascara, columna] = valor
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diario de cambios de los datasets.')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    p_historial = subcomandos.add_parser('historial', help='Cambios anotados para una clave.')
+    p_historial.add_argument('dataset')
+    p_historial.add_argument('clave')
+    p_punto = subcomandos.add_parser('punto-control', help='Copia el Excel actual como punto de control.')
+    p_punto.add_argument('dataset')
+    p_reproducir = subcomandos.add_parser('reproducir', help='Reconstruye un dataset desde un punto de control y el diario.')
+    p_reproducir.add_argument('dataset')
+    p_reproducir.add_argument('--hasta', help='Fecha ISO límite (inclusive), p. ej. 2025-03-05T18:00:00.')
+    p_reproducir.add_argument('--punto', help='Nombre del archivo de punto de control desde el que partir.')
+    p_reproducir.add_argument('--salida', help='Excel de salida (por defecto DATOS_DIARIO/reproducido_<dataset>.xlsx).')
+    args = parser.parse_args()
+
+    import app  # noqa: F401  (configura el diario con las rutas de la aplicación)
+    if args.dataset not in _config['archivos']:
+        print(f"ERROR: Dataset desconocido '{args.dataset}'. Opciones: {', '.join(_config['archivos'])}")
+        return 1
+
+    if args.comando == 'historial':
+        for entrada in historial(args.dataset, args.clave):
+            print(json.dumps(entrada, ensure_ascii=False))
+    elif args.comando == 'punto-control':
+        with bloqueo_interproceso(args.dataset):
+            print(crear_punto_control(args.dataset) or 'No hay archivo que copiar.')
+    else:
+        try:
+            df = reproducir(args.dataset, args.hasta, args.punto)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            return 1
+        salida = args.salida or os.path.join(_config['directorio'], f'reproducido_{args.dataset}.xlsx')
+        df.to_excel(salida, index=False)
+        print(f'{len(df)} registros reconstruidos en {salida}')
+    return 0
+
+
+if __name__ == '__main__':
+    # Ejecutado como script, este archivo es el módulo __main__; app.py importa y configura
+    # 'diario', que es otro módulo. main() debe correr en ese, con sus rutas ya configuradas.
+    import diario
+    sys.exit(diario.main())
@@ -0,0 +1,32 @@
+"""
+Importación diferida de módulos pesados (pandas) para acelerar el arranque.
+
+    pd = ModuloDiferido('pandas')
+    pd.read_excel(...)   # pandas se importa aquí, en el primer uso
+
+El import real usa la maquinaria estándar (sys.modules y su bloqueo), así que es
+seguro con varios hilos y solo ocurre una vez por proceso.
+"""
+import importlib
+
+
+class ModuloDiferido:
+    """Sustituto de un módulo que lo importa al acceder al primer atributo."""
+
+    def __init__(self, nombre):
+        self._nombre = nombre
+        self._modulo = None
+
+    def _cargar(self):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nombre)
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        if atributo.startswith('__') and atributo.endswith('__'):
+            raise AttributeError(atributo)
+        return getattr(self._cargar(), atributo)
+
+    def __repr__(self):
+        estado = 'cargado' if self._modulo is not None else 'sin cargar'
+        return f"<ModuloDiferido '{self._nombre}' ({estado})>"
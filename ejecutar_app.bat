@@ -1 +1 @@
-start cmd /k python app.py
\ No newline at end of file
+start cmd /k python servidor.py
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+Escritura diferida (write-behind) de los datasets con cambios de una sola celda.
+
+Sin ella, marcar un cobro como Cobrado o cambiar el Estado de un vencimiento
+reescribe el Excel completo. Con config.json -> "escritura_diferida" habilitado,
+las rutas de cambios puntuales trabajan sobre una copia en memoria del dataset,
+que pasa a ser la autoritativa:
+  - la ruta anota el cambio en el diario (diario.py, con fsync) y responde;
+  - la copia se escribe al Excel como mucho cada 'intervalo_segundos' o al
+    acumular 'maximo_mutaciones' cambios, y siempre al cerrar el proceso (atexit).
+Si el proceso muere antes de escribir, los cambios se recuperan del diario:
+'python diario.py reproducir <dataset> --salida recuperado.xlsx' parte del último
+punto de control (todo diario empieza con uno) y aplica los cambios anotados.
+
+Las rutas que escriben el Excel directamente (cargas, reporte maestro...) vacían
+antes los cambios pendientes (escritura_coordinada -> al_iniciar_escritura), y
+las páginas de consulta y los formularios de edición leen la copia en memoria
+(instantaneas.leer_dataset, leer_vigente).
+La copia vive en el proceso: solo sirve con un único proceso (waitress, o
+gunicorn con "procesos": 1; servidor.py lo fuerza).
+"""
+import atexit
+import os
+import threading
+
+from bloqueos import bloqueo_interproceso
+from metricas import leer_excel, escribir_excel
+
+CONFIG_ESCRITURA_DIFERIDA_DEFECTO = {
+    'habilitado': False,
+    'datasets': ['vencimientos', 'cobros', 'prospectos'],
+    'intervalo_segundos': 5,
+    'maximo_mutaciones': 50,
+}
+
+_config = {'archivos': {}, 'opciones_lectura': {}, 'intervalo_segundos': 5, 'maximo_mutaciones': 50}
+_almacenes = {}
+
+
+def _estado_archivo(ruta):
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    return (estado.st_mtime_ns, estado.st_size)
+
+
+class AlmacenDiferido:
+    """Copia en memoria de un dataset con los cambios aún no escritos al Excel."""
+
+    def __init__(self, dataset, ruta, opciones_lectura=None):
+        self.dataset = dataset
+        self.ruta = ruta
+        self.opciones_lectura = opciones_lectura or {}
+        self.df = None
+        self.estado_archivo = None
+        self.pendientes = 0
+        self.generacion = 0
+        self._lock = threading.RLock()
+        self._temporizador = None
+
+    def _cargar(self):
+        """Carga el Excel si no hay copia o si cambió en disco sin cambios pendientes."""
+        estado = _estado_archivo(self.ruta)
+        if self.df is not None and (self.pendientes or estado == self.estado_archivo):
+            return
+        self.df = leer_excel(self.ruta, **self.opciones_lectura)
+        self.estado_archivo = estado
+        self.generacion += 1
+
+    def leer(self):
+        """Copia del DataFrame autoritativo (la ruta puede modificarla libremente)."""
+        with self._lock:
+            self._cargar()
+            return self.df.copy()
+
+    def guardar(self, df):
+        """Reemplaza la copia autoritativa; el Excel se escribe más tarde."""
+        with self._lock:
+            self.df = df
+            self.pendientes += 1
+            self.generacion += 1
+            if self.pendientes >= _config['maximo_mutaciones']:
+                self.vaciar()
+            elif self._temporizador is None:
+                self._temporizador = threading.Timer(_config['intervalo_segundos'], self._vaciar_programado)
+                self._temporizador.daemon = True
+                self._temporizador.start()
+
+    def _vaciar_programado(self):
+        try:
+            self.vaciar()
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudo escribir '{self.dataset}' desde la escritura diferida: {type(e).__name__} - {e}")
+
+    def vaciar(self):
+        """Escribe al Excel los cambios pendientes. Si falla, siguen pendientes y se reintenta."""
+        # Orden de bloqueos igual al de las rutas: primero el del dataset, luego el del almacén
+        with bloqueo_interproceso(self.dataset), self._lock:
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+            if not self.pendientes:
+                return
+            try:
+                escribir_excel(self.df, self.ruta, index=False)
+            except Exception:
+                self._temporizador = threading.Timer(_config['intervalo_segundos'], self._vaciar_programado)
+                self._temporizador.daemon = True
+                self._temporizador.start()
+                raise
+            self.pendientes = 0
+            self.estado_archivo = _estado_archivo(self.ruta)
+
+
+def configurar_escritura_diferida(archivos_por_dataset, datasets, intervalo_segundos=5, maximo_mutaciones=50,
+                                  opciones_lectura=None, habilitado=False):
+    """
+    archivos_por_dataset: {dataset: ruta del Excel}; datasets: los que se difieren.
+    opciones_lectura: {dataset: kwargs de leer_excel} (p. ej. dtype de la columna clave).
+    """
+    _config.update(archivos=archivos_por_dataset, opciones_lectura=opciones_lectura or {},
+                   intervalo_segundos=max(0.5, float(intervalo_segundos)),
+                   maximo_mutaciones=max(1, int(maximo_mutaciones)))
+    _almacenes.clear()
+    if habilitado:
+        for dataset in datasets:
+            if dataset not in archivos_por_dataset:
+                print(f"ADVERTENCIA: Dataset '{dataset}' desconocido en escritura_diferida; se omite.")
+                continue
+            _almacenes[dataset] = AlmacenDiferido(dataset, archivos_por_dataset[dataset],
+                                                  _config['opciones_lectura'].get(dataset))
+
+
+def activa(dataset=None):
+    return dataset in _almacenes if dataset else bool(_almacenes)
+
+
+def leer_para_escritura(dataset):
+    """DataFrame del dataset para modificarlo: la copia en memoria si se difiere, si no el Excel."""
+    if dataset in _almacenes:
+        return _almacenes[dataset].leer()
+    return leer_excel(_config['archivos'][dataset], **_config['opciones_lectura'].get(dataset, {}))
+
+
+def guardar_dataset(dataset, df):
+    """Guarda el DataFrame modificado: en memoria si se difiere, si no escribe el Excel."""
+    if dataset in _almacenes:
+        _almacenes[dataset].guardar(df)
+    else:
+        escribir_excel(df, _config['archivos'][dataset], index=False)
+
+
+def copia_en_memoria(dataset, columnas=None):
+    """
+    Copia del DataFrame autoritativo (solo 'columnas', si se indican) si el dataset
+    se difiere y ya está cargado; si no, None.
+    """
+    almacen = _almacenes.get(dataset)
+    if almacen is None:
+        return None
+    with almacen._lock:
+        if almacen.df is None:
+            return None
+        almacen._cargar()
+        if columnas is not None:
+            return almacen.df[[c for c in columnas if c in almacen.df.columns]].copy()
+        return almacen.df.copy()
+
+
+def leer_vigente(dataset, columnas=None):
+    """
+    DataFrame vigente para mostrar (p. ej. un formulario de edición): la copia en memoria
+    si el dataset se difiere y está cargado, si no el Excel (solo 'columnas', si se indican).
+    """
+    df = copia_en_memoria(dataset, columnas)
+    if df is not None:
+        return df
+    return leer_excel(_config['archivos'][dataset], columnas=columnas, **_config['opciones_lectura'].get(dataset, {}))
+
+
+def generacion_en_memoria(dataset):
+    """Cambia con cada guardado en memoria (para invalidar índices que dependen del Excel)."""
+    almacen = _almacenes.get(dataset)
+    return almacen.generacion if almacen else 0
+
+
+def vaciar(*datasets):
+    """Escribe los cambios pendientes de los datasets indicados (observador de al_iniciar_escritura)."""
+    for dataset in datasets:
+        if dataset in _almacenes:
+            _almacenes[dataset].vaciar()
+
+
+def vaciar_todo():
+    for almacen in list(_almacenes.values()):
+        try:
+            almacen.vaciar()
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudo escribir '{almacen.dataset}' al cerrar: {type(e).__name__} - {e}. "
+                  f"Los cambios están en el diario: python diario.py reproducir {almacen.dataset}")
+
+
+atexit.register(vaciar_todo)
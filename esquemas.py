@@ -0,0 +1,106 @@
+"""
+Esquema de tipos de los datasets para las páginas de consulta.
+
+Las columnas de pocos valores distintos (aseguradora, ramo, estado, responsable...)
+se cargan como categóricas: cada valor se guarda una vez y las filas llevan un
+código entero, así que ocupan mucha menos memoria y los filtros comparan códigos
+en lugar de cadenas. Los campos 'si'/'no' de las casillas se cargan como booleanos.
+
+El esquema se aplica al publicar las instantáneas (instantaneas.py), que lo
+conservan en el .pkl, y al leerlas. En el Excel las casillas siguen siendo
+'si'/'no': banderas_a_texto las devuelve a ese formato para plantillas y escrituras.
+"""
+
+ESQUEMAS = {
+    'remisiones': {
+        'categorias': ['estado', 'aseguradora', 'ramo', 'categorias_grupo', 'tipo_moneda', 'vendedor',
+                       'forma_pago', 'periodicidad_pago', 'analista_responsable'],
+        'banderas': ['renovacion', 'negocio_nuevo', 'renovable', 'modificacion', 'anexo_checkbox',
+                     'policy_number_modified', 'co_corretaje_opcion'],
+    },
+    'cobros': {
+        'categorias': ['Aseguradora', 'Ramo', 'Estado', 'Tipo_Movimiento'],
+        'banderas': [],
+    },
+    'prospectos': {
+        'categorias': ['Responsable Tecnico', 'Responsable Comercial', 'Ramo', 'Aseguradora', 'Estado'],
+        'banderas': ['es_TPP'],
+    },
+    'cartera': {
+        'categorias': ['ASEGURADORA', 'VENDEDOR', 'Intermediario_Original', 'Clasificacion_Manual',
+                       'Line_of_Business_Manual'],
+        'banderas': [],
+    },
+    'vencimientos': {
+        'categorias': ['ASEGURADORA', 'RAMO PRINCIPAL', 'Responsable', 'Estado'],
+        'banderas': [],
+    },
+}
+
+VALORES_SI = frozenset({'si', 'sí', 'true', '1', 'x'})
+
+
+def _es_categorica(serie):
+    import pandas as pd
+    return isinstance(serie.dtype, pd.CategoricalDtype)
+
+
+def aplicar_esquema(df, dataset):
+    """Convierte (en el mismo DataFrame) las columnas declaradas del dataset. Idempotente."""
+    esquema = ESQUEMAS.get(dataset)
+    if esquema is None:
+        return df
+    for columna in esquema['categorias']:
+        if columna not in df.columns:
+            continue
+        serie = df[columna]
+        if not _es_categorica(serie):
+            if serie.dtype != object:
+                continue  # Columna vacía o numérica: se deja como está
+            serie = serie.astype('category')
+        # '' como categoría para que fillna('') de las vistas siga funcionando
+        if '' not in serie.cat.categories:
+            serie = serie.cat.add_categories([''])
+        df[columna] = serie
+    for columna in esquema['banderas']:
+        if columna in df.columns and df[columna].dtype != bool:
+            df[columna] = df[columna].astype(str).str.strip().str.lower().isin(VALORES_SI)
+    return df
+
+
+def banderas_a_texto(df, dataset):
+    """Devuelve las casillas booleanas del dataset al formato 'si'/'no' del Excel."""
+    for columna in ESQUEMAS.get(dataset, {}).get('banderas', []):
+        if columna in df.columns and df[columna].dtype == bool:
+            df[columna] = df[columna].map({True: 'si', False: 'no'})
+    return df
+
+
+def _codigos(serie, condicion):
+    """Máscara de las filas cuya categoría cumple condicion(texto normalizado)."""
+    codigos = [i for i, categoria in enumerate(serie.cat.categories)
+               if condicion(str(categoria).strip().lower())]
+    return serie.cat.codes.isin(codigos)
+
+
+def igual_a(serie, valor):
+    """serie == valor sin distinguir mayúsculas ni espacios; en categóricas compara códigos."""
+    valor = valor.strip().lower()
+    if _es_categorica(serie):
+        return _codigos(serie, lambda texto: texto == valor)
+    return serie.astype(str).str.strip().str.lower() == valor
+
+
+def contiene(serie, texto):
+    """Filas cuyo valor contiene 'texto' (sin distinguir mayúsculas); los nulos no coinciden."""
+    texto = texto.lower()
+    if _es_categorica(serie):
+        return _codigos(serie, lambda valor: texto in valor)
+    return serie.str.contains(texto, case=False, na=False)
+
+
+def rellenar(serie, valor):
+    """fillna(valor) que también sirve para categóricas (agrega la categoría si falta)."""
+    if _es_categorica(serie) and valor not in serie.cat.categories:
+        serie = serie.cat.add_categories([valor])
+    return serie.fillna(valor)
@@ -0,0 +1,205 @@
+"""
+Exportación de los datasets a CSV o XLSX en streaming.
+
+El Excel del dataset se copia (con el bloqueo del dataset, un instante) a un archivo
+temporal y la copia se recorre fila a fila con openpyxl en modo read_only: el Excel
+original no queda abierto durante la descarga, así que las escrituras del dataset
+pueden reemplazarlo (en Windows no se puede reemplazar un archivo abierto). Cada
+fila que pasa los filtros (rango de fechas, aseguradora, estado) se escribe en la
+salida al momento, así que la memoria no depende del tamaño del reporte:
+- CSV: se envía por bloques de FILAS_POR_BLOQUE filas mientras se lee.
+- XLSX: se escribe con un Workbook write_only en un archivo temporal (el ZIP de un
+  .xlsx no se puede emitir antes de cerrarlo) y luego se envía por partes.
+"""
+import csv
+import io
+import os
+import shutil
+import tempfile
+from datetime import datetime, date
+
+from bloqueos import bloqueo_interproceso
+from escritura_diferida import vaciar as vaciar_escritura_diferida
+from fechas_es import como_fecha
+
+# dataset: (columna de fecha, columna de aseguradora, columna de estado o None)
+CAMPOS_FILTRO = {
+    'remisiones': ('fecha_registro', 'aseguradora', 'estado'),
+    'cobros': ('Fecha_Vencimiento_Cuota', 'Aseguradora', 'Estado'),
+    'prospectos': ('Fecha de Cotizacion', 'Aseguradora', 'Estado'),
+    'cartera': ('FECHA CREACIÓN', 'ASEGURADORA', None),
+    'vencimientos': ('FECHA FIN', 'ASEGURADORA', 'Estado'),
+}
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+FILAS_POR_BLOQUE = 500
+BYTES_POR_PARTE = 64 * 1024
+
+
+def preparar_filtros(dataset, desde=None, hasta=None, aseguradora=None, estado=None):
+    """
+    Valida los parámetros de la solicitud y devuelve el dict de filtros para exportar.
+    ValueError con un mensaje para el usuario si un parámetro no es válido.
+    """
+    if dataset not in CAMPOS_FILTRO:
+        raise ValueError(f"Dataset desconocido '{dataset}'. Opciones: {', '.join(CAMPOS_FILTRO)}")
+    filtros = {}
+    for nombre, valor in (('desde', desde), ('hasta', hasta)):
+        if valor and valor.strip():
+            fecha = como_fecha(valor)
+            if fecha is None:
+                raise ValueError(f"Fecha '{valor}' no válida en '{nombre}' (use AAAA-MM-DD o dd/mm/AAAA).")
+            filtros[nombre] = fecha
+    if aseguradora and aseguradora.strip():
+        filtros['aseguradora'] = aseguradora.strip().lower()
+    if estado and estado.strip():
+        if CAMPOS_FILTRO[dataset][2] is None:
+            raise ValueError(f"El dataset '{dataset}' no tiene columna de estado.")
+        filtros['estado'] = estado.strip().lower()
+    return filtros
+
+
+def _condiciones(dataset, encabezados, filtros):
+    """Lista de funciones fila -> bool a partir de los filtros y la posición de sus columnas."""
+    columna_fecha, columna_aseguradora, columna_estado = CAMPOS_FILTRO[dataset]
+    posiciones = {nombre: i for i, nombre in enumerate(encabezados) if nombre is not None}
+    condiciones = []
+
+    def _texto_igual(columna, valor):
+        i = posiciones.get(columna)
+        if i is None:
+            return lambda fila: False  # Sin la columna ninguna fila coincide
+        return lambda fila: i < len(fila) and str(fila[i] if fila[i] is not None else '').strip().lower() == valor
+
+    if 'desde' in filtros or 'hasta' in filtros:
+        i = posiciones.get(columna_fecha)
+        desde, hasta = filtros.get('desde'), filtros.get('hasta')
+
+        def _en_rango(fila):
+            if i is None or i >= len(fila) or fila[i] is None or fila[i] == '':
+                return False
+            fecha = como_fecha(fila[i])
+            return fecha is not None and (desde is None or fecha >= desde) and (hasta is None or fecha <= hasta)
+        condiciones.append(_en_rango)
+    if 'aseguradora' in filtros:
+        condiciones.append(_texto_igual(columna_aseguradora, filtros['aseguradora']))
+    if 'estado' in filtros:
+        condiciones.append(_texto_igual(columna_estado, filtros['estado']))
+    return condiciones
+
+
+def _temporal(sufijo):
+    descriptor, ruta = tempfile.mkstemp(suffix=sufijo)
+    os.close(descriptor)
+    return ruta
+
+
+def _eliminar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+class _FilasExportadas:
+    """
+    Filas (tuplas) de una copia del Excel que cumplen los filtros. cerrar() cierra y
+    elimina la copia; se llama al terminar de recorrerlas y al cerrar la respuesta
+    (también si el cliente se desconecta antes de empezar).
+    """
+
+    def __init__(self, dataset, ruta_excel, filtros):
+        from openpyxl import load_workbook
+
+        self.ruta_copia = _temporal('.xlsx')
+        self.wb = None
+        try:
+            with bloqueo_interproceso(dataset):
+                # Los cambios aún en memoria (escritura diferida) deben estar en el Excel que se exporta
+                vaciar_escritura_diferida(dataset)
+                shutil.copyfile(ruta_excel, self.ruta_copia)
+            self.wb = load_workbook(self.ruta_copia, read_only=True, data_only=True)
+            self._filas = self.wb.active.iter_rows(values_only=True)
+            self.encabezados = list(next(self._filas, None) or ())
+            self._condiciones = _condiciones(dataset, self.encabezados, filtros)
+        except BaseException:
+            self.cerrar()
+            raise
+
+    def __iter__(self):
+        try:
+            for fila in self._filas:
+                if all(valor is None for valor in fila):
+                    continue
+                if all(condicion(fila) for condicion in self._condiciones):
+                    yield fila
+        finally:
+            self.cerrar()
+
+    def cerrar(self):
+        if self.wb is not None:
+            self.wb.close()
+            self.wb = None
+        _eliminar(self.ruta_copia)
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d') if valor.time() == datetime.min.time() else valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, date):
+        return valor.strftime('%Y-%m-%d')
+    return valor
+
+
+def generar_csv(encabezados, filas):
+    """Bytes del CSV (UTF-8 con BOM y ';' para que Excel en español lo abra bien), por bloques."""
+    salida = io.StringIO()
+    escritor = csv.writer(salida, delimiter=';')
+    salida.write('\ufeff')
+    escritor.writerow(['' if e is None else e for e in encabezados])
+    for n, fila in enumerate(filas, start=1):
+        escritor.writerow([_valor_csv(v) for v in fila])
+        if n % FILAS_POR_BLOQUE == 0:
+            yield salida.getvalue().encode('utf-8')
+            salida.seek(0)
+            salida.truncate()
+    yield salida.getvalue().encode('utf-8')
+
+
+def generar_xlsx(encabezados, filas, titulo='Datos'):
+    """Escribe un .xlsx write_only en un temporal y lo envía por partes; el temporal se elimina al terminar."""
+    from openpyxl import Workbook
+
+    ruta_temporal = _temporal('.xlsx')
+    try:
+        wb = Workbook(write_only=True)
+        hoja = wb.create_sheet(title=titulo[:31])
+        hoja.append(encabezados)
+        for fila in filas:
+            hoja.append(list(fila))
+        wb.save(ruta_temporal)
+        with open(ruta_temporal, 'rb') as f:
+            while True:
+                parte = f.read(BYTES_POR_PARTE)
+                if not parte:
+                    break
+                yield parte
+    finally:
+        _eliminar(ruta_temporal)
+
+
+def exportar(dataset, ruta_excel, formato, filtros):
+    """
+    (generador de bytes del reporte en 'formato' ('csv' o 'xlsx'), cerrar). La ruta
+    registra cerrar con Response.call_on_close para eliminar la copia del Excel.
+    """
+    filas = _FilasExportadas(dataset, ruta_excel, filtros)
+    if formato == 'xlsx':
+        return generar_xlsx(filas.encabezados, filas, titulo=dataset.capitalize()), filas.cerrar
+    return generar_csv(filas.encabezados, filas), filas.cerrar
@@ -0,0 +1,105 @@
+"""
+Formato de fechas en español sin depender del locale del sistema.
+
+locale.setlocale es global al proceso (no es seguro con varios hilos) y si el
+sistema no tiene es_ES las cartas salen en inglés sin avisar. Aquí los nombres de
+los meses están en tablas fijas, el análisis de cada texto de fecha se memoriza
+con lru_cache y hay una versión vectorizada para columnas completas de pandas.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+MESES = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+         'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+
+# Para selectores y títulos ("Enero", "Febrero", ...)
+MESES_CAPITALIZADOS = [mes.capitalize() for mes in MESES]
+
+
+def _es_vacio(valor):
+    return valor is None or valor == '' or (isinstance(valor, float) and valor != valor)  # NaN != NaN
+
+
+@lru_cache(maxsize=4096)
+def parsear_fecha(texto):
+    """
+    'dd/mm/YYYY' (también 'd/m/YYYY'), 'YYYY-MM-DD' (con hora opcional) -> date, o None
+    si no es una fecha. El formato se decide por el separador, sin probar strptime a ciegas.
+    """
+    parte_fecha = texto.strip().split(' ', 1)[0].split('T', 1)[0]
+    if '/' in parte_fecha:
+        partes = parte_fecha.split('/')
+        orden = (2, 1, 0)  # dd/mm/YYYY
+    elif '-' in parte_fecha:
+        partes = parte_fecha.split('-')
+        orden = (0, 1, 2)  # YYYY-MM-DD
+    else:
+        return None
+    if len(partes) != 3 or not all(parte.isdigit() for parte in partes):
+        return None
+    ano, mes, dia = (partes[i] for i in orden)
+    if len(ano) != 4 or len(mes) > 2 or len(dia) > 2:
+        return None
+    try:
+        return date(int(ano), int(mes), int(dia))
+    except ValueError:
+        return None
+
+
+def como_fecha(valor):
+    """date, datetime, Timestamp o texto de parsear_fecha -> date, o None si no es una fecha."""
+    if isinstance(valor, datetime):  # incluye pandas.Timestamp
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return parsear_fecha(str(valor))
+
+
+def formato_largo(fecha):
+    """date -> '05 de marzo de 2025' (mismo formato que '%d de %B de %Y' con locale es_ES)."""
+    return f'{fecha.day:02d} de {MESES[fecha.month - 1]} de {fecha.year}'
+
+
+@lru_cache(maxsize=4096)
+def _formatear_texto(texto):
+    fecha = parsear_fecha(texto)
+    return formato_largo(fecha) if fecha else texto
+
+
+def formatear_fecha_larga(valor):
+    """
+    Cualquier fecha (texto, date, datetime, Timestamp) -> '05 de marzo de 2025'.
+    Vacíos y NaN/NaT dan ''; un texto que no es fecha se devuelve tal cual.
+    """
+    if _es_vacio(valor) or str(valor) == 'NaT':
+        return ''
+    if isinstance(valor, str):
+        return _formatear_texto(valor)
+    fecha = como_fecha(valor)
+    return formato_largo(fecha) if fecha else valor
+
+
+def fecha_actual_larga():
+    return formato_largo(date.today())
+
+
+def formatear_columna(serie):
+    """
+    Versión vectorizada para una columna de pandas: analiza una sola vez cada valor
+    distinto y construye el texto con operaciones de columna.
+    """
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        fechas, originales = serie, ''
+    else:
+        originales = serie.where(serie.notna(), '').astype(str)
+        textos = serie.astype(str).str.strip()
+        fechas = pd.to_datetime(textos, format='%d/%m/%Y', errors='coerce')
+        faltantes = fechas.isna()
+        if faltantes.any():
+            fechas = fechas.fillna(pd.to_datetime(textos.str[:10], format='%Y-%m-%d', errors='coerce'))
+    meses = pd.Series(MESES, index=range(1, 13))
+    resultado = (fechas.dt.day.astype('Int64').astype(str).str.zfill(2) + ' de '
+                 + fechas.dt.month.map(meses) + ' de ' + fechas.dt.year.astype('Int64').astype(str))
+    return resultado.where(fechas.notna(), originales)
@@ -0,0 +1,61 @@
+"""
+Caché de fragmentos HTML por fila para las tablas grandes (cartera, vencimientos).
+
+Cada fila se renderiza con una plantilla parcial (templates/parciales/) y se guarda
+con la clave (plantilla, id del registro, versión de la fila). La versión es un hash
+del contenido de la fila, de modo que al editar un ID_VENCIMIENTO solo esa fila
+cambia de versión y se vuelve a renderizar; el resto de la tabla se arma desde la
+caché. La caché es por proceso y acotada (LRU).
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+MAXIMO_FRAGMENTOS = 50000
+
+_fragmentos = OrderedDict()  # (plantilla, id, version) -> Markup
+_lock = threading.Lock()
+
+
+def version_fila(registro):
+    """Hash estable del contenido de la fila (dict de valores ya formateados)."""
+    contenido = repr(sorted((str(k), repr(v)) for k, v in registro.items()))
+    return hashlib.blake2b(contenido.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def renderizar_filas(entorno_jinja, nombre_plantilla, nombre_variable, registros, campo_id):
+    """
+    Devuelve la lista de fragmentos HTML (Markup) de 'registros', renderizando solo
+    las filas que no están en caché. La plantilla parcial recibe cada registro en
+    'nombre_variable'. Debe llamarse dentro de una solicitud si la parcial usa url_for.
+    """
+    plantilla = None
+    fragmentos, nuevos = [], {}
+    claves = [(nombre_plantilla, registro.get(campo_id), version_fila(registro)) for registro in registros]
+    with _lock:
+        en_cache = [_fragmentos.get(clave) for clave in claves]
+        for clave, fragmento in zip(claves, en_cache):
+            if fragmento is not None:
+                _fragmentos.move_to_end(clave)
+
+    for registro, clave, fragmento in zip(registros, claves, en_cache):
+        if fragmento is None:
+            if plantilla is None:
+                plantilla = entorno_jinja.get_template(nombre_plantilla)
+            fragmento = Markup(plantilla.render(**{nombre_variable: registro}))
+            nuevos[clave] = fragmento
+        fragmentos.append(fragmento)
+
+    if nuevos:
+        with _lock:
+            _fragmentos.update(nuevos)
+            while len(_fragmentos) > MAXIMO_FRAGMENTOS:
+                _fragmentos.popitem(last=False)
+    return fragmentos
+
+
+def limpiar_fragmentos():
+    with _lock:
+        _fragmentos.clear()
@@ -0,0 +1,259 @@
+"""
+Índice en memoria del reporte de vencimientos para el dashboard y su consulta JSON.
+
+El Excel procesado se lee y se prepara una sola vez por versión del archivo. Las
+filas quedan ordenadas por el día ordinal de FECHA FIN, de modo que cualquier
+ventana (próximos 15 días, último trimestre, un rango de fechas) se obtiene con
+bisect en O(log n + k). Cada tarjeta KPI (15/30/60 días, vencidas, cumplimiento y
+cada ramo) es una sub-ventana más un filtro por ramo. Dias_Para_Vencer y la alerta
+dependen de la fecha actual: se recalculan una vez al día (a medianoche, o en la
+primera consulta del día si el temporizador no llegó a correr), no en cada solicitud.
+"""
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+# Ventana por defecto (días respecto a hoy): vencidas hace hasta 100 días y por vencer en los próximos 100
+VENTANA_DEFECTO = (-100, 100)
+
+# (nombre de la tarjeta, patrón sobre RAMO PRINCIPAL) - vencen en los próximos 30 días
+RAMOS_KPI = [
+    ('AUTOS/VEHÍCULOS', 'AUTOS|VEHICULOS'),
+    ('COPROPIEDADES', 'COPROPIEDADES'),
+    ('HOGAR', 'HOGAR'),
+    ('ARRENDAMIENTO', 'ARRENDAMIENTO'),
+]
+
+# banda -> clave del diccionario kpis que usa la plantilla
+BANDAS_KPI = {'15': 'vencer_15_dias', '30': 'vencer_30_dias', '60': 'vencer_60_dias',
+              'vencidas': 'vencidas', 'cumplimiento': 'cumplimiento'}
+
+# banda -> (desde, hasta) en días respecto a hoy; None = sin límite
+LIMITES_BANDA = {'15': (0, 15), '30': (0, 30), '60': (0, 60), 'vencidas': (None, -1),
+                 'cumplimiento': (0, 45), 'ramo': (0, 30)}
+
+MAXIMO_BUSQUEDAS = 128
+
+_indice = {'clave': None, 'valor': None, 'temporizador': None}
+_lock = threading.Lock()
+
+
+def determinar_alerta(dias, estado_actual):
+    estado_actual_lower = str(estado_actual).lower()  # Normalize estado for comparison
+
+    if estado_actual_lower == 'renovado':
+        return {'css_class': 'alerta-renovado', 'icon': 'fas fa-check-double', 'text': 'Renovado'}
+    elif estado_actual_lower == 'no renovado':
+        return {'css_class': 'alerta-no-renovado', 'icon': 'fas fa-ban', 'text': 'No Renovado'}
+
+    if dias is None or dias != dias:  # NaN
+        return {'css_class': 'alerta-gris', 'icon': 'fas fa-question-circle', 'text': 'Fecha Fin Inválida'}
+
+    dias = int(dias)
+
+    if dias < 0 and estado_actual_lower in ['pendiente seguimiento', 'en proceso', '']:
+        return {'css_class': 'alerta-rojo', 'icon': 'fas fa-skull-crossbones', 'text': f'Vencido (Hace {-dias} días)'}
+
+    if estado_actual_lower == 'vencido':
+        return {'css_class': 'alerta-rojo', 'icon': 'fas fa-calendar-times', 'text': 'Vencido (Estado)'}
+
+    if dias <= 5:
+        return {'css_class': 'alerta-rojo', 'icon': 'fas fa-skull-crossbones', 'text': f'Vencido (Hace {-dias} días)' if dias < 0 else f'Vence en {dias} días'}
+    elif 6 <= dias <= 20:
+        return {'css_class': 'alerta-amarillo', 'icon': 'fas fa-exclamation-triangle', 'text': f'Vence en {dias} días'}
+    elif 21 <= dias <= 30:
+        return {'css_class': 'alerta-verde', 'icon': 'fas fa-calendar-check', 'text': f'Vence en {dias} días'}
+    else:
+        return {'css_class': 'alerta-azul', 'icon': 'fas fa-info-circle', 'text': f'Vence en {dias} días'}
+
+
+def preparar_registros(df_venc):
+    """
+    DataFrame del Excel procesado -> (registros, ordinales) con todas las filas que
+    tienen FECHA FIN válida, ordenadas por FECHA FIN ascendente. Los campos que
+    dependen del día los completa IndiceVencimientos.recalcular_dia.
+    """
+    import pandas as pd
+
+    df_venc = df_venc.rename(columns={'NOMBRES CLIENTE': 'Tomador'})
+    df_venc['FECHA FIN_dt'] = pd.to_datetime(df_venc['FECHA FIN'], errors='coerce')
+    df_venc = df_venc.dropna(subset=['FECHA FIN_dt']).sort_values(by='FECHA FIN_dt', kind='stable')
+
+    if 'Estado' not in df_venc.columns:
+        df_venc['Estado'] = ''
+    else:
+        df_venc['Estado'] = df_venc['Estado'].astype(str).fillna('')
+
+    ordinales = [fecha.toordinal() for fecha in df_venc['FECHA FIN_dt'].dt.date]
+
+    # Formatear fechas para mostrar
+    df_venc['FECHA FIN'] = df_venc['FECHA FIN_dt'].dt.strftime('%Y-%m-%d')
+    if 'Fecha_inicio_seguimiento' in df_venc.columns:
+        df_venc['Fecha_inicio_seguimiento'] = pd.to_datetime(df_venc['Fecha_inicio_seguimiento'], errors='coerce').dt.strftime('%Y-%m-%d')
+
+    return df_venc.drop(columns=['FECHA FIN_dt']).fillna('').to_dict(orient='records'), ordinales
+
+
+class IndiceVencimientos:
+    """Registros ordenados por el ordinal de FECHA FIN, con su ramo KPI precalculado."""
+
+    def __init__(self, registros, ordinales, hoy):
+        self.registros = registros
+        self.ordinales = ordinales
+        self.tomadores = [str(r.get('Tomador', '')).lower() for r in registros]
+        self.es_cumplimiento = [str(r.get('RAMO PRINCIPAL', '')) == 'CUMPLIMIENTO' for r in registros]
+        patrones = [(nombre, re.compile(patron, re.IGNORECASE)) for nombre, patron in RAMOS_KPI]
+        self.ramos = [frozenset(nombre for nombre, patron in patrones if patron.search(str(r.get('RAMO PRINCIPAL', ''))))
+                      for r in registros]
+        self._busquedas = OrderedDict()  # término -> posiciones que coinciden
+        self._lock = threading.Lock()
+        self.dia = None
+        self.recalcular_dia(hoy)
+
+    def recalcular_dia(self, hoy):
+        """Dias_Para_Vencer (días de calendario hasta FECHA FIN) y la alerta de cada fila para 'hoy'."""
+        ordinal_hoy = hoy.toordinal()
+        registros = []
+        for registro, ordinal in zip(self.registros, self.ordinales):
+            dias = ordinal - ordinal_hoy
+            alerta = determinar_alerta(dias, registro['Estado'])
+            registros.append({**registro, 'Dias_Para_Vencer': dias,
+                              'Indicador_Vencimiento_CSS_Class': alerta['css_class'],
+                              'Indicador_Vencimiento_Icon': alerta['icon'],
+                              'Indicador_Vencimiento_Text': alerta['text']})
+        # Se reemplaza la lista completa: quien esté renderizando la anterior no ve filas a medias
+        self.registros, self.dia = registros, hoy
+
+    def _coincidencias(self, termino):
+        """Posiciones cuyo Tomador contiene 'termino' (memorizado por término)."""
+        with self._lock:
+            if termino in self._busquedas:
+                self._busquedas.move_to_end(termino)
+                return self._busquedas[termino]
+        coincidencias = frozenset(i for i, tomador in enumerate(self.tomadores) if termino in tomador)
+        with self._lock:
+            self._busquedas[termino] = coincidencias
+            while len(self._busquedas) > MAXIMO_BUSQUEDAS:
+                self._busquedas.popitem(last=False)
+        return coincidencias
+
+    def rango(self, desde, hasta):
+        """Posiciones [inicio, fin) de las filas con FECHA FIN entre hoy+desde y hoy+hasta (None = sin límite)."""
+        ordinal_hoy = self.dia.toordinal()
+        inicio = 0 if desde is None else bisect_left(self.ordinales, ordinal_hoy + desde)
+        fin = len(self.ordinales) if hasta is None else bisect_right(self.ordinales, ordinal_hoy + hasta)
+        return inicio, max(inicio, fin)
+
+    def posiciones(self, ventana=VENTANA_DEFECTO, banda=None, ramo=None, termino=''):
+        """
+        Posiciones de la ventana (desde, hasta) -o de la banda dentro de la ventana-
+        filtradas por el término de búsqueda, en el orden de la tabla (FECHA FIN descendente).
+        """
+        desde, hasta = ventana
+        if banda:
+            if banda not in LIMITES_BANDA:
+                raise ValueError(f"Banda desconocida: '{banda}'.")
+            if banda == 'ramo' and ramo not in dict(RAMOS_KPI):
+                raise ValueError(f"Ramo desconocido: '{ramo}'.")
+            limite_desde, limite_hasta = LIMITES_BANDA[banda]
+            desde = limite_desde if desde is None else (desde if limite_desde is None else max(desde, limite_desde))
+            hasta = limite_hasta if hasta is None else (hasta if limite_hasta is None else min(hasta, limite_hasta))
+        inicio, fin = self.rango(desde, hasta)
+
+        termino = (termino or '').strip().lower()
+        coincidencias = self._coincidencias(termino) if termino else None
+        posiciones = []
+        for posicion in range(fin - 1, inicio - 1, -1):
+            if banda == 'cumplimiento':
+                if not self.es_cumplimiento[posicion]:
+                    continue
+            elif banda == 'ramo':
+                if ramo not in self.ramos[posicion]:
+                    continue
+            elif banda and self.es_cumplimiento[posicion]:
+                continue
+            if coincidencias is not None and posicion not in coincidencias:
+                continue
+            posiciones.append(posicion)
+        return posiciones
+
+    def kpis(self, ventana=VENTANA_DEFECTO, termino=''):
+        """(kpis, ramos_kpis) con el mismo formato que espera vencimientos_vista.html."""
+        kpis = {clave: len(self.posiciones(ventana, banda, termino=termino)) for banda, clave in BANDAS_KPI.items()}
+        ramos_kpis = [{'ramo': nombre, 'count': len(self.posiciones(ventana, 'ramo', nombre, termino))}
+                      for nombre, _ in RAMOS_KPI]
+        return kpis, ramos_kpis
+
+    def pagina(self, posiciones, pagina, por_pagina):
+        """(registros de la página, página efectiva, total de páginas)."""
+        paginas = max(1, -(-len(posiciones) // por_pagina))
+        pagina = min(max(1, pagina), paginas)
+        inicio = (pagina - 1) * por_pagina
+        registros = self.registros
+        return [registros[p] for p in posiciones[inicio:inicio + por_pagina]], pagina, paginas
+
+
+def leer_ventana(args, ventana_defecto=VENTANA_DEFECTO):
+    """
+    Ventana (desde, hasta) en días respecto a hoy a partir de los parámetros de la URL:
+    'desde'/'hasta' en días (p. ej. -90 y 0 para el último trimestre) o
+    'fecha_desde'/'fecha_hasta' en YYYY-MM-DD. Lanza ValueError si no son válidos.
+    """
+    ventana = list(ventana_defecto)
+    hoy = date.today()
+    for i, (campo_dias, campo_fecha) in enumerate((('desde', 'fecha_desde'), ('hasta', 'fecha_hasta'))):
+        if args.get(campo_fecha):
+            try:
+                ventana[i] = (datetime.strptime(args[campo_fecha], '%Y-%m-%d').date() - hoy).days
+            except ValueError:
+                raise ValueError(f"'{campo_fecha}' debe tener el formato AAAA-MM-DD.")
+        elif args.get(campo_dias) not in (None, ''):
+            try:
+                ventana[i] = int(args[campo_dias])
+            except ValueError:
+                raise ValueError(f"'{campo_dias}' debe ser un número entero de días.")
+    if ventana[0] > ventana[1]:
+        raise ValueError('El inicio de la ventana es posterior al final.')
+    return tuple(ventana)
+
+
+def obtener_indice(ruta_archivo, leer_excel, version=None):
+    """
+    Índice del archivo de vencimientos; se reconstruye solo si el archivo cambió
+    (mtime/tamaño) o 'version' (cambios aún en memoria, ver escritura_diferida).
+    Lanza KeyError si falta la columna 'FECHA FIN'.
+    """
+    estado = os.stat(ruta_archivo)
+    clave = (ruta_archivo, estado.st_mtime_ns, estado.st_size, version)
+    hoy = date.today()
+    with _lock:
+        indice = _indice['valor']
+        if _indice['clave'] != clave:
+            df_venc = leer_excel(ruta_archivo)
+            if 'FECHA FIN' not in df_venc.columns:
+                raise KeyError('FECHA FIN')
+            indice = IndiceVencimientos(*preparar_registros(df_venc), hoy)
+            _indice.update(clave=clave, valor=indice)
+        elif indice.dia != hoy:
+            indice.recalcular_dia(hoy)
+        return indice
+
+
+def _recalcular_a_medianoche():
+    with _lock:
+        if _indice['valor'] is not None and _indice['valor'].dia != date.today():
+            _indice['valor'].recalcular_dia(date.today())
+    programar_recalculo_diario()
+
+
+def programar_recalculo_diario():
+    """Programa el recálculo de Dias_Para_Vencer para la próxima medianoche (hilo demonio, por proceso)."""
+    ahora = datetime.now()
+    medianoche = datetime.combine(ahora.date() + timedelta(days=1), datetime.min.time())
+    temporizador = threading.Timer((medianoche - ahora).total_seconds() + 1, _recalcular_a_medianoche)
+    temporizador.daemon = True
+    temporizador.start()
+    _indice['temporizador'] = temporizador
@@ -0,0 +1,464 @@
+"""
+Índices persistentes para búsquedas cruzadas entre módulos.
+
+Cada índice se guarda como JSON en DATOS_INDICES y se reconstruye en el momento
+de la escritura del dataset correspondiente, de modo que las consultas posteriores
+(p. ej. remisión -> vencimientos de la misma póliza) son búsquedas por clave y no
+recorridos completos de los archivos Excel.
+"""
+import json
+import os
+import re
+import threading
+
+from bloqueos import bloqueo_interproceso
+from metricas import listar_directorio
+
+_VALORES_VACIOS = {'', 'n/a', 'none', 'nan', 'nat'}
+_PATRON_ENTERO_CON_DECIMALES = re.compile(r'^-?\d+\.0+$')
+
+_lock_indices = threading.Lock()
+_cache_indices = {}  # ruta -> ((mtime_ns, tamaño), datos)
+
+
+def normalizar_numero_poliza(valor):
+    """
+    Devuelve la forma canónica de un número de póliza para usarla como clave.
+    Quita espacios, convierte floats enteros ('12345.0' o 12345.0) a '12345'
+    y trata los valores vacíos/NaN como ''.
+    """
+    if valor is None:
+        return ''
+    if isinstance(valor, float):
+        if valor != valor:  # NaN
+            return ''
+        if valor.is_integer():
+            return str(int(valor))
+        return str(valor).strip()
+    if isinstance(valor, int):
+        return str(valor)
+
+    valor_str = str(valor).strip()
+    if valor_str.lower() in _VALORES_VACIOS:
+        return ''
+    if _PATRON_ENTERO_CON_DECIMALES.match(valor_str):
+        return valor_str.split('.')[0]
+    return valor_str
+
+
+def poliza_de_enlace_remision(remision):
+    """
+    Número de póliza (normalizado) con el que una remisión se enlaza a vencimientos,
+    cartera y cobros. Si la remisión modificó el número de póliza, el enlace se hace
+    con el número anterior, que es el que aparece en los reportes maestros.
+    """
+    if str(remision.get('policy_number_modified', '')).strip().lower() == 'si':
+        poliza_anterior = normalizar_numero_poliza(remision.get('old_policy_number'))
+        if poliza_anterior:
+            return poliza_anterior
+    return normalizar_numero_poliza(remision.get('poliza'))
+
+
+def _ruta_indice(directorio, nombre):
+    return os.path.join(directorio, f'indice_{nombre}.json')
+
+
+def _guardar_json_atomico(ruta, datos):
+    ruta_tmp = f'{ruta}.tmp'
+    with open(ruta_tmp, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+    os.replace(ruta_tmp, ruta)
+
+
+def cargar_indice(directorio, nombre):
+    """Carga un índice (con caché en memoria invalidada por mtime). Devuelve {} si no existe."""
+    ruta = _ruta_indice(directorio, nombre)
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return {}
+    mtime = (estado.st_mtime_ns, estado.st_size)
+
+    with _lock_indices:
+        en_cache = _cache_indices.get(ruta)
+        if en_cache and en_cache[0] == mtime:
+            return en_cache[1]
+
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+    with _lock_indices:
+        _cache_indices[ruta] = (mtime, datos)
+    return datos
+
+
+def guardar_indice(directorio, nombre, datos):
+    """Persiste un índice completo de forma atómica."""
+    os.makedirs(directorio, exist_ok=True)
+    ruta = _ruta_indice(directorio, nombre)
+    with _lock_indices:
+        _guardar_json_atomico(ruta, datos)
+        _cache_indices.pop(ruta, None)
+
+
+# --- Índice de pólizas ---
+
+def construir_indice_polizas(df, columna_poliza, columna_id):
+    """
+    Construye {poliza_normalizada: [[id, fila_excel], ...]} a partir del DataFrame
+    tal como se escribirá en disco (fila_excel es 1-based e incluye el encabezado).
+    """
+    indice = {}
+    if df is None or df.empty or columna_poliza not in df.columns or columna_id not in df.columns:
+        return indice
+
+    polizas = df[columna_poliza].tolist()
+    ids = df[columna_id].tolist()
+    for posicion, (poliza, id_registro) in enumerate(zip(polizas, ids)):
+        clave = normalizar_numero_poliza(poliza)
+        if not clave:
+            continue
+        if isinstance(id_registro, float) and id_registro.is_integer():
+            id_registro = int(id_registro)
+        elif hasattr(id_registro, 'item'):  # escalares numpy
+            id_registro = id_registro.item()
+        indice.setdefault(clave, []).append([id_registro, posicion + 2])
+    return indice
+
+
+def reconstruir_indice_polizas(directorio, dataset, df, columna_poliza, columna_id):
+    """Reconstruye y persiste el índice de pólizas de un dataset (hoy solo 'vencimientos')."""
+    indice = construir_indice_polizas(df, columna_poliza, columna_id)
+    guardar_indice(directorio, f'polizas_{dataset}', indice)
+    return indice
+
+
+def indice_polizas_existe(directorio, dataset):
+    return os.path.exists(_ruta_indice(directorio, f'polizas_{dataset}'))
+
+
+def buscar_poliza(directorio, dataset, poliza):
+    """Devuelve la lista [[id, fila_excel], ...] del dataset para una póliza (normalizada o no)."""
+    clave = normalizar_numero_poliza(poliza)
+    if not clave:
+        return []
+    return cargar_indice(directorio, f'polizas_{dataset}').get(clave, [])
+
+
+def registrar_enlace_remision(directorio, consecutivo, poliza_enlace):
+    """Guarda la póliza de enlace de una remisión (calculada una sola vez al registrarla)."""
+    with bloqueo_interproceso('indice_remisiones_poliza'):
+        enlaces = dict(cargar_indice(directorio, 'remisiones_poliza'))
+        enlaces[str(consecutivo).strip()] = poliza_enlace
+        guardar_indice(directorio, 'remisiones_poliza', enlaces)
+
+
+def poliza_enlace_de_consecutivo(directorio, consecutivo):
+    """Póliza de enlace registrada para un consecutivo, o None si no está indexado."""
+    return cargar_indice(directorio, 'remisiones_poliza').get(str(consecutivo).strip())
+
+
+# --- Índice de clientes (NIT/CC y nombre del tomador) ---
+
+_PATRON_NIT_CON_DV = re.compile(r'^(\d{6,})-\d$')
+
+
+def normalizar_nit(valor):
+    """
+    Forma canónica de un NIT/CC: sin puntos, espacios ni dígito de verificación
+    ('900.123.456-7' -> '900123456'); los floats enteros se tratan como en las pólizas.
+    """
+    nit = normalizar_numero_poliza(valor)
+    if not nit:
+        return ''
+    nit = nit.replace('.', '').replace(',', '').replace(' ', '').upper()
+    coincidencia = _PATRON_NIT_CON_DV.match(nit)
+    if coincidencia:
+        return coincidencia.group(1)
+    return nit
+
+
+def normalizar_nombre_cliente(valor):
+    """Nombre del tomador en mayúsculas, sin tildes y con espacios simples."""
+    import unicodedata
+
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return ''
+    nombre = unicodedata.normalize('NFKD', str(valor))
+    nombre = ''.join(c for c in nombre if not unicodedata.combining(c))
+    nombre = ' '.join(nombre.upper().split())
+    return '' if nombre.lower() in _VALORES_VACIOS else nombre
+
+
+def _valor_json(valor):
+    """Convierte escalares de pandas/numpy a tipos serializables en JSON."""
+    if valor is None:
+        return ''
+    if hasattr(valor, 'item') and not isinstance(valor, (str, bytes)):
+        try:
+            valor = valor.item()
+        except (ValueError, AttributeError):
+            pass
+    if isinstance(valor, float):
+        if valor != valor:
+            return ''
+        return int(valor) if valor.is_integer() else valor
+    if isinstance(valor, (str, int, bool)):
+        return valor
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+# Cada sección (clientes_<dataset>) es un JSON base más un registro de cambios
+# indice_clientes_<dataset>.<generación>.cambios.jsonl al que cada escritura agrega una
+# línea: insertar o actualizar cuesta lo que ocupan esos registros, no la sección
+# completa. La sección se carga una vez por proceso y se pone al día leyendo solo las
+# líneas nuevas; al superar MAXIMO_CAMBIOS_CLIENTES líneas se consolida en una base
+# nueva (generación + 1) y el registro anterior se elimina.
+MAXIMO_CAMBIOS_CLIENTES = 2000
+
+_cache_clientes = {}  # nombre -> {'estado_base', 'seccion', 'desplazamiento', 'lineas'}
+
+
+def _seccion_vacia(generacion=0):
+    return {'registros': {}, 'por_nit': {}, 'por_nombre': {}, 'generacion': generacion}
+
+
+def _ruta_cambios(directorio, nombre, generacion):
+    return os.path.join(directorio, f'indice_{nombre}.{generacion}.cambios.jsonl')
+
+
+def _poner_resumen(seccion, clave, resumen):
+    """Inserta o reemplaza el resumen de una clave, manteniendo por_nit y por_nombre."""
+    anterior = seccion['registros'].get(clave)
+    if anterior:
+        _quitar_de_listas(seccion, clave, anterior.get('_nit', ''), anterior.get('_nombre', ''))
+    seccion['registros'][clave] = resumen
+    if resumen['_nit']:
+        seccion['por_nit'].setdefault(resumen['_nit'], []).append(clave)
+    if resumen['_nombre']:
+        seccion['por_nombre'].setdefault(resumen['_nombre'], []).append(clave)
+
+
+def _resumenes(registros, col_nit, col_nombre, col_clave, columnas_resumen):
+    """{clave: resumen} de los registros, con el NIT y el nombre normalizados."""
+    resumenes = {}
+    for registro in registros:
+        clave = _valor_json(registro.get(col_clave))
+        if clave == '':
+            continue
+        resumen = {col: _valor_json(registro.get(col)) for col in columnas_resumen}
+        resumen['_nit'] = normalizar_nit(registro.get(col_nit)) if col_nit else ''
+        resumen['_nombre'] = normalizar_nombre_cliente(registro.get(col_nombre)) if col_nombre else ''
+        resumenes[str(clave)] = resumen
+    return resumenes
+
+
+def _quitar_de_listas(seccion, clave, nit, nombre):
+    for mapa, llave in (('por_nit', nit), ('por_nombre', nombre)):
+        claves = seccion[mapa].get(llave)
+        if claves and clave in claves:
+            claves.remove(clave)
+            if not claves:
+                del seccion[mapa][llave]
+
+
+def _aplicar_cambio(seccion, cambio):
+    if cambio['operacion'] == 'poner':
+        for clave, resumen in cambio['resumenes'].items():
+            _poner_resumen(seccion, clave, resumen)
+    else:  # 'actualizar'
+        for clave, valores in cambio['valores'].items():
+            resumen = seccion['registros'].get(clave)
+            if resumen is not None:
+                resumen.update(valores)
+
+
+def cargar_seccion_clientes(directorio, nombre):
+    """
+    Sección del índice de clientes puesta al día con su registro de cambios. Se
+    devuelve el objeto en caché: no modificarlo fuera de las funciones de este módulo.
+    """
+    ruta_base = _ruta_indice(directorio, nombre)
+    try:
+        estado = os.stat(ruta_base)
+        estado_base = (estado.st_mtime_ns, estado.st_size)
+    except OSError:
+        estado_base = None
+
+    with _lock_indices:
+        entrada = _cache_clientes.get(nombre)
+        if entrada is None or entrada['estado_base'] != estado_base:
+            seccion = _seccion_vacia()
+            if estado_base is not None:
+                try:
+                    with open(ruta_base, 'r', encoding='utf-8') as f:
+                        seccion = {**_seccion_vacia(), **json.load(f)}
+                except (OSError, json.JSONDecodeError):
+                    pass
+            entrada = {'estado_base': estado_base, 'seccion': seccion, 'desplazamiento': 0, 'lineas': 0}
+            _cache_clientes[nombre] = entrada
+
+        # Solo las líneas agregadas desde la última lectura (de este u otro proceso)
+        ruta_cambios = _ruta_cambios(directorio, nombre, entrada['seccion']['generacion'])
+        try:
+            with open(ruta_cambios, 'rb') as f:
+                f.seek(entrada['desplazamiento'])
+                for linea in f:
+                    if not linea.endswith(b'\n'):
+                        break  # Línea a medio escribir: se lee la próxima vez
+                    entrada['desplazamiento'] += len(linea)
+                    entrada['lineas'] += 1
+                    _aplicar_cambio(entrada['seccion'], json.loads(linea))
+        except OSError:
+            pass
+        return entrada['seccion']
+
+
+def _consolidar(directorio, nombre, seccion):
+    """Escribe la sección como base nueva (generación + 1) y elimina el registro anterior."""
+    generacion_anterior = seccion['generacion']
+    os.makedirs(directorio, exist_ok=True)
+    with _lock_indices:
+        seccion['generacion'] = generacion_anterior + 1
+        _guardar_json_atomico(_ruta_indice(directorio, nombre), seccion)
+        _cache_clientes.pop(nombre, None)
+    try:
+        os.remove(_ruta_cambios(directorio, nombre, generacion_anterior))
+    except OSError:
+        pass
+
+
+def _registrar_cambio(directorio, nombre, seccion, cambio):
+    """
+    Aplica el cambio en memoria y lo agrega al registro de la sección. Se llama con el
+    bloqueo indice_<nombre> tomado y con 'seccion' recién cargada (cargar_seccion_clientes).
+    """
+    if not os.path.exists(_ruta_indice(directorio, nombre)):
+        _consolidar(directorio, nombre, seccion)  # Sin base todavía: el registro necesita una generación
+        seccion = cargar_seccion_clientes(directorio, nombre)
+    linea = (json.dumps(cambio, ensure_ascii=False) + '\n').encode('utf-8')
+    with _lock_indices:
+        _aplicar_cambio(seccion, cambio)
+        with open(_ruta_cambios(directorio, nombre, seccion['generacion']), 'ab') as f:
+            f.write(linea)
+        entrada = _cache_clientes[nombre]
+        entrada['desplazamiento'] += len(linea)
+        entrada['lineas'] += 1
+        consolidar = entrada['lineas'] >= MAXIMO_CAMBIOS_CLIENTES
+    if consolidar:
+        _consolidar(directorio, nombre, seccion)
+
+
+def indice_clientes_existe(directorio, dataset):
+    return os.path.exists(_ruta_indice(directorio, f'clientes_{dataset}'))
+
+
+def reconstruir_indice_clientes(directorio, dataset, registros, col_nit, col_nombre, col_clave, columnas_resumen):
+    """
+    Reconstruye la sección de un dataset del índice de clientes.
+    registros: iterable de dicts (p. ej. df.to_dict('records')).
+    """
+    nombre = f'clientes_{dataset}'
+    with bloqueo_interproceso(f'indice_{nombre}'):
+        seccion = _seccion_vacia(cargar_seccion_clientes(directorio, nombre)['generacion'])
+        for clave, resumen in _resumenes(registros, col_nit, col_nombre, col_clave, columnas_resumen).items():
+            _poner_resumen(seccion, clave, resumen)
+        _consolidar(directorio, nombre, seccion)
+
+
+def agregar_a_indice_clientes(directorio, dataset, registros, col_nit, col_nombre, col_clave, columnas_resumen):
+    """Agrega (o reemplaza por clave) registros nuevos en la sección de un dataset."""
+    _poner_en_seccion(directorio, f'clientes_{dataset}',
+                      _resumenes(registros, col_nit, col_nombre, col_clave, columnas_resumen))
+
+
+def _poner_en_seccion(directorio, nombre, resumenes):
+    if not resumenes:
+        return
+    with bloqueo_interproceso(f'indice_{nombre}'):
+        seccion = cargar_seccion_clientes(directorio, nombre)
+        _registrar_cambio(directorio, nombre, seccion, {'operacion': 'poner', 'resumenes': resumenes})
+
+
+def actualizar_resumen_cliente(directorio, dataset, claves, cambios):
+    """Actualiza columnas del resumen indexado de los registros dados (p. ej. un cambio de Estado)."""
+    nombre = f'clientes_{dataset}'
+    with bloqueo_interproceso(f'indice_{nombre}'):
+        seccion = cargar_seccion_clientes(directorio, nombre)
+        valores = {}
+        for clave in claves:
+            clave = str(_valor_json(clave))
+            resumen = seccion['registros'].get(clave)
+            if resumen is None:
+                continue
+            cambios_clave = {columna: _valor_json(valor) for columna, valor in cambios.items() if columna in resumen}
+            if cambios_clave:
+                valores[clave] = cambios_clave
+        if valores:
+            _registrar_cambio(directorio, nombre, seccion, {'operacion': 'actualizar', 'valores': valores})
+
+
+def registrar_carpeta_cliente(directorio, nombre_carpeta, nit, nombre):
+    """Asocia una carpeta de CLIENTES_CARPETAS (convención '{nombre}_{nit}') al NIT y al nombre."""
+    _poner_en_seccion(directorio, 'clientes_carpetas',
+                      _resumenes([{'carpeta': nombre_carpeta, 'nit': nit, 'nombre': nombre}],
+                                 'nit', 'nombre', 'carpeta', ['carpeta']))
+
+
+def reconstruir_indice_carpetas(directorio, ruta_carpetas_clientes):
+    """Reconstruye el índice de carpetas a partir de los nombres '{nombre}_{nit}' existentes."""
+    registros = []
+    if os.path.isdir(ruta_carpetas_clientes):
+        for nombre_carpeta in listar_directorio(ruta_carpetas_clientes):
+            if not os.path.isdir(os.path.join(ruta_carpetas_clientes, nombre_carpeta)):
+                continue
+            nombre, _, nit = nombre_carpeta.rpartition('_')
+            registros.append({'carpeta': nombre_carpeta, 'nit': nit, 'nombre': nombre.replace('_', ' ')})
+    reconstruir_indice_clientes(directorio, 'carpetas', registros, 'nit', 'nombre', 'carpeta', ['carpeta'])
+
+
+def buscar_cliente(directorio, datasets, nit='', nombre=''):
+    """
+    Devuelve {dataset: [resumen, ...]} con los registros de un cliente en cada dataset.
+    Con NIT se toman los registros de ese NIT y, por nombre, solo los registros sin NIT
+    (los reportes maestros de cartera y vencimientos solo traen el nombre del cliente)
+    con alguno de los nombres asociados a ese NIT: un homónimo con otro NIT no se mezcla.
+    """
+    nit_norm = normalizar_nit(nit)
+    nombres = set()
+    if nombre:
+        nombres.add(normalizar_nombre_cliente(nombre))
+
+    secciones = {dataset: cargar_seccion_clientes(directorio, f'clientes_{dataset}') for dataset in datasets}
+
+    resultado = {}
+    with _lock_indices:  # Las secciones en caché se ponen al día en sitio
+        if nit_norm:
+            for seccion in secciones.values():
+                for clave in seccion['por_nit'].get(nit_norm, []):
+                    nombre_registro = seccion['registros'][clave].get('_nombre')
+                    if nombre_registro:
+                        nombres.add(nombre_registro)
+        nombres.discard('')
+
+        for dataset, seccion in secciones.items():
+            claves = list(seccion['por_nit'].get(nit_norm, [])) if nit_norm else []
+            for nombre_norm in nombres:
+                for clave in seccion['por_nombre'].get(nombre_norm, []):
+                    if not nit_norm or not seccion['registros'][clave].get('_nit'):
+                        claves.append(clave)
+            vistos = set()
+            resumenes = []
+            for clave in claves:
+                if clave in vistos:
+                    continue
+                vistos.add(clave)
+                resumen = {k: v for k, v in seccion['registros'][clave].items() if not k.startswith('_')}
+                resumenes.append(resumen)
+            resultado[dataset] = resumenes
+    return resultado
@@ -0,0 +1,153 @@
+"""
+Instantáneas inmutables de los datasets para las páginas de consulta.
+
+Cada vez que una ruta de escritura termina (escritura_coordinada), se publica una
+nueva generación del dataset: DATOS_INSTANTANEAS/<dataset>/<generación>.pkl, y
+luego se reemplaza de forma atómica el puntero ACTUAL.json, que indica la
+generación vigente y el estado (mtime/tamaño) del Excel del que salió. Los lectores
+leen el puntero y abren esa generación sin tomar bloqueos: un archivo publicado no
+se vuelve a escribir, así que nunca ven datos a medio escribir ni esperan a una carga
+larga. Si el Excel no coincide con el puntero (se editó a mano o aún no hay
+instantánea), el lector usa el Excel y publica una generación nueva.
+
+Se conservan las últimas generaciones (por defecto 3) para los lectores que
+acaban de leer el puntero; las anteriores se eliminan.
+
+Las generaciones guardan los tipos de esquemas.py (categóricas y casillas booleanas).
+"""
+import json
+import os
+
+from bloqueos import bloqueo_interproceso
+from escritura_diferida import copia_en_memoria
+from esquemas import aplicar_esquema
+from metricas import leer_excel, tramo, carga_presupuestada
+
+_config = {'directorio': None, 'archivos': {}, 'conservar': 3, 'habilitado': True}
+
+PUNTERO = 'ACTUAL.json'
+
+
+def configurar_instantaneas(directorio, archivos_por_dataset, conservar=3, habilitado=True):
+    """archivos_por_dataset: {dataset: ruta del Excel de origen}."""
+    _config.update(directorio=directorio, archivos=archivos_por_dataset,
+                   conservar=max(2, int(conservar)), habilitado=bool(habilitado))
+
+
+def _directorio_dataset(dataset):
+    return os.path.join(_config['directorio'], dataset)
+
+
+def _ruta_generacion(dataset, generacion):
+    return os.path.join(_directorio_dataset(dataset), f'{generacion:08d}.pkl')
+
+
+def _estado_origen(ruta):
+    estado = os.stat(ruta)
+    return [estado.st_mtime_ns, estado.st_size]
+
+
+def _leer_puntero(dataset):
+    try:
+        with open(os.path.join(_directorio_dataset(dataset), PUNTERO), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def publicar(dataset, df=None, origen=None):
+    """
+    Publica una generación nueva del dataset. Sin 'df' se lee el Excel de origen
+    (y se omite si el puntero ya corresponde a ese Excel). Devuelve la generación vigente.
+    """
+    ruta_excel = _config['archivos'][dataset]
+    if df is None:
+        origen = _estado_origen(ruta_excel)
+        puntero = _leer_puntero(dataset)
+        if puntero and puntero.get('origen') == origen:
+            return puntero['generacion']
+        df = leer_excel(ruta_excel)
+    aplicar_esquema(df, dataset)
+
+    directorio = _directorio_dataset(dataset)
+    os.makedirs(directorio, exist_ok=True)
+    with bloqueo_interproceso(f'instantanea_{dataset}'):
+        puntero = _leer_puntero(dataset)
+        generacion = (puntero['generacion'] if puntero else 0) + 1
+        ruta = _ruta_generacion(dataset, generacion)
+        with tramo('publicar_instantanea', {'n': len(df)}):
+            df.to_pickle(f'{ruta}.tmp')
+            os.replace(f'{ruta}.tmp', ruta)
+        temporal = os.path.join(directorio, f'{PUNTERO}.tmp')
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'generacion': generacion, 'origen': origen}, f)
+        os.replace(temporal, os.path.join(directorio, PUNTERO))
+        recolectar_generaciones(dataset, generacion)
+    return generacion
+
+
+def recolectar_generaciones(dataset, actual):
+    """Elimina las generaciones anteriores a las 'conservar' más recientes."""
+    limite = actual - _config['conservar'] + 1
+    for nombre in os.listdir(_directorio_dataset(dataset)):
+        raiz, extension = os.path.splitext(nombre)
+        if extension == '.pkl' and raiz.isdigit() and int(raiz) < limite:
+            try:
+                os.remove(os.path.join(_directorio_dataset(dataset), nombre))
+            except OSError:
+                pass  # En Windows un lector puede tenerla abierta; se elimina en la siguiente publicación
+
+
+def publicar_tras_escritura(*datasets):
+    """Observador de escritura_coordinada: publica los datasets modificados."""
+    if not _config['habilitado']:
+        return
+    for dataset in datasets:
+        if dataset in _config['archivos'] and os.path.exists(_config['archivos'][dataset]):
+            try:
+                publicar(dataset)
+            except Exception as e:
+                print(f"ADVERTENCIA: No se pudo publicar la instantánea de '{dataset}': {type(e).__name__} - {e}")
+
+
+def _proyectar(df, columnas):
+    # Copia: aplicar_esquema asigna columnas y sobre una selección de columnas pandas
+    # avisaría (SettingWithCopyWarning) o podría escribir en el DataFrame de origen
+    return df if columnas is None else df[[c for c in columnas if c in df.columns]].copy()
+
+
+def leer_dataset(dataset, columnas=None):
+    """
+    DataFrame de la generación vigente del dataset, sin bloqueos. Si la instantánea
+    no corresponde al Excel actual, se lee el Excel y se publica una generación nueva.
+    Con escritura diferida, la copia en memoria (con los cambios aún no escritos) manda.
+    columnas: las que necesita la ruta; el resto no se conserva en el DataFrame devuelto.
+    """
+    df = copia_en_memoria(dataset, columnas)
+    if df is not None:
+        return aplicar_esquema(df, dataset)
+    ruta_excel = _config['archivos'][dataset]
+    if not _config['habilitado']:
+        return aplicar_esquema(leer_excel(ruta_excel, columnas=columnas), dataset)
+
+    import pandas as pd
+    origen = _estado_origen(ruta_excel)
+    puntero = _leer_puntero(dataset)
+    if puntero and puntero.get('origen') == origen:
+        filas = {}
+        try:
+            # El .pkl se carga completo; la proyección reduce lo que la ruta retiene
+            with carga_presupuestada(f'{dataset}.pkl') as carga, tramo('leer_instantanea', filas):
+                df = pd.read_pickle(_ruta_generacion(dataset, puntero['generacion']))
+                filas['n'] = len(df)
+                carga['df'] = df
+            return aplicar_esquema(_proyectar(df, columnas), dataset)  # Generaciones publicadas antes del esquema
+        except FileNotFoundError:
+            pass  # Recolectada entre leer el puntero y abrirla: se usa el Excel
+
+    df = aplicar_esquema(leer_excel(ruta_excel), dataset)
+    try:
+        publicar(dataset, df.copy(), origen)
+    except Exception as e:
+        print(f"ADVERTENCIA: No se pudo publicar la instantánea de '{dataset}': {type(e).__name__} - {e}")
+    return _proyectar(df, columnas)
@@ -0,0 +1,372 @@
+"""
+Instrumentación de latencia e I/O por ruta.
+
+- Histograma de duración por endpoint (before_request / after_request).
+- Tramos explícitos alrededor de pd.read_excel, DataFrame.to_excel (escritura atómica),
+  os.listdir y del renderizado de plantillas Jinja, con conteo de filas leídas y escritas.
+- /metrics en formato de texto de Prometheus.
+- Registro de solicitudes lentas (umbral configurable) con el desglose de I/O.
+- Bytes cargados en memoria por endpoint y archivo (DataFrame.memory_usage), y un
+  presupuesto de memoria por proceso: si las cargas de las solicitudes en curso lo
+  superan, la primera carga de una solicitud nueva espera a que terminen otras.
+
+Configuración en config.json -> "metricas":
+    {"umbral_lento_ms": 1000, "archivo_lentas": "solicitudes_lentas.log"}
+y -> "memoria": {"presupuesto_mb": 0, "espera_segundos": 30}  (0 = sin presupuesto)
+
+Las métricas son por proceso: con varios workers de gunicorn cada uno expone las suyas.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Límites (segundos) de los histogramas, similares a los de prometheus_client
+LIMITES_HISTOGRAMA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_histogramas = {}   # (nombre, etiquetas) -> [conteos por límite..., +Inf], suma
+_contadores = {}    # (nombre, etiquetas) -> valor
+_estado_local = threading.local()
+
+_AYUDA = {
+    'cicloseguros_solicitud_segundos': ('histogram', 'Duración de las solicitudes por endpoint.'),
+    'cicloseguros_io_segundos': ('histogram', 'Duración de operaciones de I/O (read_excel, to_excel, listdir, render).'),
+    'cicloseguros_solicitudes_total': ('counter', 'Solicitudes atendidas por endpoint y código de estado.'),
+    'cicloseguros_filas_leidas_total': ('counter', 'Filas leídas de archivos Excel.'),
+    'cicloseguros_filas_escritas_total': ('counter', 'Filas escritas en archivos Excel.'),
+    'cicloseguros_solicitudes_lentas_total': ('counter', 'Solicitudes que superaron el umbral de lentitud.'),
+    'cicloseguros_bytes_cargados_total': ('counter', 'Bytes en memoria de los DataFrames cargados, por endpoint y archivo.'),
+    'cicloseguros_presupuesto_memoria_esperas_total': ('counter', 'Cargas que esperaron por el presupuesto de memoria.'),
+    'cicloseguros_presupuesto_memoria_excedido_total': ('counter', 'Cargas que agotaron la espera y superaron el presupuesto.'),
+}
+
+_presupuesto = {'bytes': 0, 'espera_segundos': 30.0}
+_memoria = threading.Condition()
+_memoria_en_uso = [0]  # bytes reservados por las solicitudes en curso de este proceso
+_tamanos_carga = {}    # (archivo, columnas) -> bytes de la última carga (estimación de la siguiente)
+
+
+def _etiquetas(**kwargs):
+    return tuple(sorted((k, str(v)) for k, v in kwargs.items()))
+
+
+def observar(nombre, segundos, **etiquetas):
+    """Registra una observación en el histograma 'nombre'."""
+    clave = (nombre, _etiquetas(**etiquetas))
+    with _lock:
+        if clave not in _histogramas:
+            _histogramas[clave] = [[0] * (len(LIMITES_HISTOGRAMA) + 1), 0.0]
+        cubetas, _ = _histogramas[clave]
+        for i, limite in enumerate(LIMITES_HISTOGRAMA):
+            if segundos <= limite:
+                cubetas[i] += 1
+                break
+        else:
+            cubetas[-1] += 1
+        _histogramas[clave][1] += segundos
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    clave = (nombre, _etiquetas(**etiquetas))
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+
+# --- Tramos de I/O ---
+
+def _desglose_actual():
+    """Desglose de I/O de la solicitud en curso en este hilo (None fuera de una solicitud)."""
+    return getattr(_estado_local, 'desglose', None)
+
+
+@contextmanager
+def tramo(operacion, filas=None):
+    """
+    Mide una operación de I/O. 'filas' es un dict mutable en el que el bloque puede
+    dejar {'n': ...} para acumular las filas procesadas en el desglose de la solicitud.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _acumular(operacion, time.perf_counter() - inicio, (filas or {}).get('n', 0))
+
+
+def _acumular(operacion, duracion, filas=0):
+    observar('cicloseguros_io_segundos', duracion, operacion=operacion)
+    desglose = _desglose_actual()
+    if desglose is not None:
+        entrada = desglose.setdefault(operacion, {'llamadas': 0, 'segundos': 0.0, 'filas': 0})
+        entrada['llamadas'] += 1
+        entrada['segundos'] += duracion
+        entrada['filas'] += filas
+
+
+# --- Presupuesto de memoria y bytes cargados ---
+
+def configurar_presupuesto(megabytes=0, espera_segundos=30):
+    """Presupuesto de memoria para las cargas de las solicitudes en curso (0 = sin límite)."""
+    _presupuesto.update(bytes=int(float(megabytes) * 1024 * 1024), espera_segundos=float(espera_segundos))
+
+
+def _en_solicitud():
+    return getattr(_estado_local, 'reservado', None) is not None
+
+
+def _reservar(estimado):
+    """
+    Reserva 'estimado' bytes para la solicitud en curso. Solo espera la primera carga
+    de cada solicitud (una que ya tiene memoria reservada no puede esperar a las demás
+    sin riesgo de bloquearse mutuamente); al agotar la espera, continúa y lo registra.
+    """
+    if not _presupuesto['bytes'] or not _en_solicitud():
+        return
+    with _memoria:
+        if not _estado_local.reservado and _memoria_en_uso[0] and _memoria_en_uso[0] + estimado > _presupuesto['bytes']:
+            incrementar('cicloseguros_presupuesto_memoria_esperas_total')
+            limite = time.monotonic() + _presupuesto['espera_segundos']
+            while _memoria_en_uso[0] and _memoria_en_uso[0] + estimado > _presupuesto['bytes']:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    incrementar('cicloseguros_presupuesto_memoria_excedido_total')
+                    print(f"ADVERTENCIA: Presupuesto de memoria agotado ({_memoria_en_uso[0] // 1048576} MB en uso); "
+                          f"se continúa con la carga.")
+                    break
+                _memoria.wait(restante)
+        _memoria_en_uso[0] += estimado
+        _estado_local.reservado += estimado
+
+
+def _liberar_solicitud():
+    reservado = getattr(_estado_local, 'reservado', None) or 0
+    _estado_local.reservado = None
+    if reservado:
+        with _memoria:
+            _memoria_en_uso[0] -= reservado
+            _memoria.notify_all()
+
+
+def _bytes_en_memoria(df):
+    if isinstance(df, dict):
+        return sum(_bytes_en_memoria(hoja) for hoja in df.values())
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+@contextmanager
+def carga_presupuestada(archivo, columnas=None):
+    """
+    Envuelve la carga de un DataFrame: reserva la memoria estimada (la de la última
+    carga igual) y, al terminar, registra los bytes reales. El bloque deja el
+    DataFrame en resultado['df'].
+    """
+    clave = (archivo, tuple(columnas) if columnas is not None else None)
+    estimado = _tamanos_carga.get(clave, 0)
+    _reservar(estimado)
+    resultado = {}
+    yield resultado
+    if resultado.get('df') is None:
+        return
+    cargados = _bytes_en_memoria(resultado['df'])
+    _tamanos_carga[clave] = cargados
+    endpoint = getattr(_estado_local, 'endpoint', None) or 'fuera_de_solicitud'
+    incrementar('cicloseguros_bytes_cargados_total', cargados, endpoint=endpoint, archivo=archivo)
+    if _en_solicitud():
+        _estado_local.bytes_cargados = getattr(_estado_local, 'bytes_cargados', 0) + cargados
+        if _presupuesto['bytes'] and cargados > estimado:
+            with _memoria:
+                _memoria_en_uso[0] += cargados - estimado
+                _estado_local.reservado += cargados - estimado
+
+
+def _nombre_archivo(ruta):
+    if isinstance(ruta, (str, bytes, os.PathLike)):
+        return os.path.basename(os.fsdecode(ruta))
+    return getattr(ruta, 'filename', None) or 'stream'
+
+
+def leer_excel(ruta, *args, columnas=None, **kwargs):
+    """
+    pd.read_excel instrumentado (duración + filas leídas + bytes cargados).
+    columnas: lista de columnas a cargar; las que no existan en el archivo se ignoran.
+    """
+    import pandas as pd
+    if columnas is not None:
+        conjunto = set(columnas)
+        kwargs['usecols'] = lambda columna: columna in conjunto
+    filas = {}
+    with carga_presupuestada(_nombre_archivo(ruta), columnas) as carga, tramo('read_excel', filas):
+        df = pd.read_excel(ruta, *args, **kwargs)
+        # Con sheet_name=None pandas devuelve un dict de hojas
+        filas['n'] = sum(len(h) for h in df.values()) if isinstance(df, dict) else len(df)
+        carga['df'] = df
+    incrementar('cicloseguros_filas_leidas_total', filas['n'], archivo=_nombre_archivo(ruta))
+    return df
+
+
+def escribir_excel(df, ruta, *args, **kwargs):
+    """
+    DataFrame.to_excel instrumentado (duración + filas escritas). Con una ruta de
+    archivo se escribe en un temporal y se reemplaza de forma atómica, así que ningún
+    lector abre un Excel a medio escribir.
+    """
+    filas = {'n': len(df)}
+    with tramo('to_excel', filas):
+        if isinstance(ruta, (str, os.PathLike)):
+            raiz, extension = os.path.splitext(os.fspath(ruta))
+            temporal = f'{raiz}.{os.getpid()}-{threading.get_ident()}.tmp{extension}'
+            try:
+                df.to_excel(temporal, *args, **kwargs)
+                _reemplazar(temporal, ruta)
+            finally:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+        else:
+            df.to_excel(ruta, *args, **kwargs)
+    incrementar('cicloseguros_filas_escritas_total', filas['n'], archivo=_nombre_archivo(ruta))
+
+
+def _reemplazar(origen, destino, intentos=40):
+    """os.replace con reintentos: en Windows falla mientras otro proceso tiene abierto el destino."""
+    for intento in range(intentos):
+        try:
+            os.replace(origen, destino)
+            return
+        except PermissionError:
+            if intento == intentos - 1:
+                raise
+            time.sleep(0.05)
+
+
+def listar_directorio(ruta):
+    """os.listdir instrumentado."""
+    filas = {}
+    with tramo('listdir', filas):
+        nombres = os.listdir(ruta)
+        filas['n'] = len(nombres)
+    return nombres
+
+
+# --- Integración con Flask ---
+
+def registrar_metricas(app, umbral_lento_ms=1000, archivo_lentas=None):
+    """Instala los hooks de medición y la ruta /metrics en la aplicación."""
+    from flask import Response, request, before_render_template, template_rendered
+
+    app.config.setdefault('METRICAS_UMBRAL_LENTO_MS', umbral_lento_ms)
+    app.config.setdefault('METRICAS_ARCHIVO_LENTAS', archivo_lentas)
+    lock_archivo = threading.Lock()
+
+    @app.before_request
+    def _iniciar_medicion():
+        _estado_local.inicio = time.perf_counter()
+        _estado_local.desglose = {}
+        _estado_local.endpoint = request.endpoint
+        _estado_local.bytes_cargados = 0
+        _estado_local.reservado = 0
+
+    @app.teardown_request
+    def _liberar_memoria(error=None):
+        _liberar_solicitud()
+        _estado_local.endpoint = None
+
+    @app.after_request
+    def _finalizar_medicion(respuesta):
+        inicio = getattr(_estado_local, 'inicio', None)
+        if inicio is None:
+            return respuesta
+        duracion = time.perf_counter() - inicio
+        endpoint = request.endpoint or 'sin_ruta'
+        observar('cicloseguros_solicitud_segundos', duracion, endpoint=endpoint, metodo=request.method)
+        incrementar('cicloseguros_solicitudes_total', endpoint=endpoint, metodo=request.method,
+                    estado=respuesta.status_code)
+
+        umbral = app.config.get('METRICAS_UMBRAL_LENTO_MS')
+        if umbral is not None and duracion * 1000 >= umbral:
+            incrementar('cicloseguros_solicitudes_lentas_total', endpoint=endpoint)
+            _registrar_lenta(app, lock_archivo, request, respuesta, duracion, _estado_local.desglose,
+                             getattr(_estado_local, 'bytes_cargados', 0))
+        _estado_local.inicio = None
+        _estado_local.desglose = None
+        return respuesta
+
+    def _antes_de_renderizar(remitente, template, context, **extra):
+        _estado_local.inicio_render = time.perf_counter()
+
+    def _renderizado(remitente, template, context, **extra):
+        inicio = getattr(_estado_local, 'inicio_render', None)
+        if inicio is None:
+            return
+        _acumular('render', time.perf_counter() - inicio)
+        _estado_local.inicio_render = None
+
+    # weak=False: los receptores son funciones locales que deben vivir tanto como la app
+    before_render_template.connect(_antes_de_renderizar, app, weak=False)
+    template_rendered.connect(_renderizado, app, weak=False)
+
+    @app.route('/metrics')
+    def metricas_prometheus():
+        return Response(exportar_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _registrar_lenta(app, lock_archivo, request, respuesta, duracion, desglose, bytes_cargados=0):
+    partes = [f"{op} {d['segundos'] * 1000:.0f}ms x{d['llamadas']}" + (f" ({d['filas']} filas)" if d['filas'] else '')
+              for op, d in sorted((desglose or {}).items(), key=lambda x: -x[1]['segundos'])]
+    if bytes_cargados:
+        partes.append(f"{bytes_cargados / 1048576:.1f} MB cargados")
+    linea = (f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} LENTA {request.method} {request.full_path.rstrip('?')} "
+             f"{respuesta.status_code} {duracion * 1000:.0f}ms [{'; '.join(partes) or 'sin I/O medido'}]")
+    print(f"ADVERTENCIA: {linea}")
+    ruta = app.config.get('METRICAS_ARCHIVO_LENTAS')
+    if ruta:
+        try:
+            with lock_archivo, open(ruta, 'a', encoding='utf-8') as f:
+                f.write(linea + '\n')
+        except OSError as e:
+            print(f"ADVERTENCIA: No se pudo escribir el registro de solicitudes lentas: {e}")
+
+
+# --- Exportación ---
+
+def _formatear_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def exportar_prometheus():
+    """Texto en formato de exposición de Prometheus 0.0.4."""
+    with _lock:
+        histogramas = {k: ([*v[0]], v[1]) for k, v in _histogramas.items()}
+        contadores = dict(_contadores)
+
+    lineas, declarados = [], set()
+
+    def declarar(nombre):
+        if nombre not in declarados and nombre in _AYUDA:
+            tipo, ayuda = _AYUDA[nombre]
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            declarados.add(nombre)
+
+    for (nombre, etiquetas), (cubetas, suma) in sorted(histogramas.items()):
+        declarar(nombre)
+        acumulado = 0
+        for limite, conteo in zip(LIMITES_HISTOGRAMA, cubetas):
+            acumulado += conteo
+            lineas.append(f'{nombre}_bucket{_formatear_etiquetas(etiquetas, [("le", limite)])} {acumulado}')
+        acumulado += cubetas[-1]
+        lineas.append(f'{nombre}_bucket{_formatear_etiquetas(etiquetas, [("le", "+Inf")])} {acumulado}')
+        lineas.append(f'{nombre}_sum{_formatear_etiquetas(etiquetas)} {suma:.6f}')
+        lineas.append(f'{nombre}_count{_formatear_etiquetas(etiquetas)} {acumulado}')
+
+    for (nombre, etiquetas), valor in sorted(contadores.items()):
+        declarar(nombre)
+        lineas.append(f'{nombre}{_formatear_etiquetas(etiquetas)} {valor}')
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,198 @@
+"""
+Perfilado opcional de solicitudes (cProfile o muestreo de pilas).
+
+Se activa en config.json -> "perfilador"; si "habilitado" es false no se registra
+ningún hook y el costo es cero:
+
+    "perfilador": {
+        "habilitado": true,
+        "token": "<clave de administrador>",
+        "modo": "cprofile",            # o "muestreo" (pilas colapsadas para flamegraph/speedscope)
+        "rutas": ["visualizar_cartera"],  # endpoints que se perfilan siempre (opcional)
+        "intervalo_muestreo_ms": 5,
+        "maximo_perfiles": 50
+    }
+
+Para perfilar una solicitud puntual se envía la cabecera 'X-Perfilar: <token>' o el
+parámetro '?perfilar=<token>'. Los perfiles quedan en DATOS_PERFILES (.prof o
+.collapsed, más un .json con el resumen) y se listan en /perfiles?token=<token>.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+FUNCIONES_RESUMEN = 15
+
+
+class MuestreadorPilas:
+    """Muestrea periódicamente la pila de un hilo y acumula pilas colapsadas ('a;b;c' -> conteo)."""
+
+    def __init__(self, id_hilo, intervalo_s):
+        self.id_hilo = id_hilo
+        self.intervalo_s = intervalo_s
+        self.pilas = Counter()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name='perfilador-muestreo', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+    def _ejecutar(self):
+        while not self._detener.wait(self.intervalo_s):
+            marco = sys._current_frames().get(self.id_hilo)
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})')
+                marco = marco.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+
+    def texto_colapsado(self):
+        return ''.join(f'{pila} {conteo}\n' for pila, conteo in self.pilas.most_common())
+
+    def funciones_principales(self, limite=FUNCIONES_RESUMEN):
+        """Funciones con más muestras propias (la hoja de cada pila)."""
+        propias = Counter()
+        for pila, conteo in self.pilas.items():
+            propias[pila.rsplit(';', 1)[-1]] += conteo
+        total = sum(propias.values()) or 1
+        return [{'funcion': f, 'muestras': c, 'porcentaje': round(100.0 * c / total, 1)}
+                for f, c in propias.most_common(limite)]
+
+
+def _funciones_principales_cprofile(perfil, limite=FUNCIONES_RESUMEN):
+    estadisticas = pstats.Stats(perfil, stream=io.StringIO())
+    filas = []
+    for (archivo, linea, funcion), (_, llamadas, propio, acumulado, _) in estadisticas.stats.items():
+        filas.append({'funcion': f'{funcion} ({os.path.basename(archivo)}:{linea})', 'llamadas': llamadas,
+                      'tiempo_propio_ms': round(propio * 1000, 2), 'tiempo_acumulado_ms': round(acumulado * 1000, 2)})
+    filas.sort(key=lambda f: f['tiempo_acumulado_ms'], reverse=True)
+    return filas[:limite]
+
+
+def listar_perfiles(directorio):
+    """Resúmenes de los perfiles guardados, del más reciente al más antiguo."""
+    if not os.path.isdir(directorio):
+        return []
+    resumenes = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directorio, nombre), 'r', encoding='utf-8') as f:
+                resumenes.append(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            continue
+    resumenes.sort(key=lambda r: r.get('fecha', ''), reverse=True)
+    return resumenes
+
+
+def _depurar_antiguos(directorio, maximo):
+    for resumen in listar_perfiles(directorio)[maximo:]:
+        for archivo in (resumen.get('archivo'), resumen.get('id', '') + '.json'):
+            ruta = os.path.join(directorio, archivo or '')
+            if archivo and os.path.exists(ruta):
+                os.remove(ruta)
+
+
+def registrar_perfilador(app, config, directorio):
+    """Instala los hooks del perfilador solo si config['habilitado'] es verdadero."""
+    if not config.get('habilitado'):
+        return False
+
+    from flask import abort, g, render_template, request, send_from_directory
+
+    token = str(config.get('token') or '')
+    modo = config.get('modo', 'cprofile')
+    rutas_siempre = set(config.get('rutas', []))
+    intervalo_s = float(config.get('intervalo_muestreo_ms', 5)) / 1000
+    maximo = int(config.get('maximo_perfiles', 50))
+    os.makedirs(directorio, exist_ok=True)
+    if not token:
+        print("ADVERTENCIA: Perfilador habilitado sin token; solo se perfilarán las rutas de 'rutas'.")
+
+    def _token_valido():
+        enviado = request.headers.get('X-Perfilar') or request.args.get('perfilar') or request.args.get('token')
+        return bool(token) and enviado == token
+
+    @app.before_request
+    def _iniciar_perfil():
+        if request.endpoint in ('listar_perfiles_vista', 'descargar_perfil', 'static'):
+            return
+        if request.endpoint not in rutas_siempre and not _token_valido():
+            return
+        g.perfil_inicio = time.perf_counter()
+        if modo == 'muestreo':
+            g.perfil = MuestreadorPilas(threading.get_ident(), intervalo_s)
+            g.perfil.iniciar()
+        else:
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:  # Python 3.12+: un solo cProfile activo por proceso
+                g.pop('perfil_inicio')
+                return
+            g.perfil = perfil
+
+    @app.teardown_request
+    def _finalizar_perfil(exc):
+        perfil = g.pop('perfil', None)
+        if perfil is None:
+            return
+        duracion_ms = round((time.perf_counter() - g.pop('perfil_inicio')) * 1000, 1)
+        identificador = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{request.endpoint or 'sin_ruta'}"
+        try:
+            if isinstance(perfil, MuestreadorPilas):
+                perfil.detener()
+                archivo = f'{identificador}.collapsed'
+                with open(os.path.join(directorio, archivo), 'w', encoding='utf-8') as f:
+                    f.write(perfil.texto_colapsado())
+                principales = perfil.funciones_principales()
+            else:
+                perfil.disable()
+                archivo = f'{identificador}.prof'
+                perfil.dump_stats(os.path.join(directorio, archivo))
+                principales = _funciones_principales_cprofile(perfil)
+            resumen = {
+                'id': identificador,
+                'archivo': archivo,
+                'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'metodo': request.method,
+                'ruta': request.path,  # sin query: puede llevar el token
+                'endpoint': request.endpoint,
+                'modo': 'muestreo' if isinstance(perfil, MuestreadorPilas) else 'cprofile',
+                'duracion_ms': duracion_ms,
+                'funciones': principales,
+            }
+            with open(os.path.join(directorio, f'{identificador}.json'), 'w', encoding='utf-8') as f:
+                json.dump(resumen, f, indent=2, ensure_ascii=False)
+            _depurar_antiguos(directorio, maximo)
+        except OSError as e:
+            print(f"ADVERTENCIA: No se pudo guardar el perfil de {request.path}: {e}")
+
+    @app.route('/perfiles', methods=['GET'])
+    def listar_perfiles_vista():
+        if not _token_valido():
+            abort(403)
+        return render_template('perfiles.html', perfiles=listar_perfiles(directorio), token=token)
+
+    @app.route('/perfiles/<nombre>', methods=['GET'])
+    def descargar_perfil(nombre):
+        if not _token_valido():
+            abort(403)
+        return send_from_directory(directorio, nombre, as_attachment=True)
+
+    print(f"Perfilador habilitado (modo {modo}); perfiles en {directorio}")
+    return True
@@ -0,0 +1,113 @@
+"""
+Servidor de producción para CicloSeguros.
+
+Sustituye a app.run(debug=True), que atiende una petición a la vez y expone el
+depurador interactivo. Por defecto usa waitress (funciona en Windows, varios
+hilos en un solo proceso). En Linux puede usarse gunicorn con varios procesos
+(--gunicorn); las escrituras a los Excel/JSON se serializan entre procesos con
+bloqueos.py.
+
+Configuración en config.json -> "servidor":
+    {"host": "0.0.0.0", "puerto": 5000, "hilos": 8, "procesos": 2,
+     "keepalive": 5, "timeout": 120}
+"procesos" y "keepalive" solo se aplican con gunicorn. waitress no tiene un tiempo
+de keep-alive propio: cierra cualquier conexión inactiva (también las keep-alive)
+tras "timeout" segundos (channel_timeout).
+
+Uso:
+    python servidor.py              # waitress
+    python servidor.py --gunicorn   # gunicorn (solo Linux); kill -HUP <pid> recarga sin cortar peticiones
+    python app.py --dev             # servidor de desarrollo de Flask
+"""
+import json
+import os
+import sys
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+
+CONFIG_SERVIDOR_DEFECTO = {
+    'host': '0.0.0.0',
+    'puerto': 5000,
+    'hilos': 8,
+    'procesos': 2,
+    'keepalive': 5,
+    'timeout': 120,
+}
+
+
+def cargar_config_servidor():
+    """Mezcla config.json -> "servidor" con los valores por defecto."""
+    config = dict(CONFIG_SERVIDOR_DEFECTO)
+    try:
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            config.update(json.load(f).get('servidor', {}))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return config
+
+
+def _servir_waitress(app, config):
+    """'procesos' y 'keepalive' no aplican: un proceso, y las conexiones inactivas se cierran tras 'timeout'."""
+    from waitress import serve
+    print(f"Sirviendo con waitress en http://{config['host']}:{config['puerto']} ({config['hilos']} hilos)")
+    serve(app,
+          host=config['host'],
+          port=int(config['puerto']),
+          threads=int(config['hilos']),
+          channel_timeout=int(config['timeout']),
+          connection_limit=max(100, int(config['hilos']) * 25))
+
+
+def _servir_gunicorn(app, config):
+    from gunicorn.app.base import BaseApplication
+
+    class AplicacionGunicorn(BaseApplication):
+        def __init__(self, aplicacion, opciones):
+            self.aplicacion = aplicacion
+            self.opciones = opciones
+            super().__init__()
+
+        def load_config(self):
+            for clave, valor in self.opciones.items():
+                self.cfg.set(clave, valor)
+
+        def load(self):
+            return self.aplicacion
+
+    procesos = int(config['procesos'])
+    if app.config.get('ESCRITURA_DIFERIDA') and procesos > 1:
+        # La copia en memoria de la escritura diferida es de un solo proceso
+        print("ADVERTENCIA: escritura_diferida está habilitada; gunicorn se inicia con 1 proceso.")
+        procesos = 1
+
+    opciones = {
+        'bind': f"{config['host']}:{config['puerto']}",
+        'workers': procesos,
+        'threads': int(config['hilos']),
+        'worker_class': 'gthread',
+        'keepalive': int(config['keepalive']),
+        'timeout': int(config['timeout']),
+        'graceful_timeout': int(config['timeout']),
+    }
+    print(f"Sirviendo con gunicorn en http://{opciones['bind']} "
+          f"({opciones['workers']} procesos x {opciones['threads']} hilos)")
+    AplicacionGunicorn(app, opciones).run()
+
+
+def servir(app, usar_gunicorn=None):
+    """Arranca app con el servidor de producción según config.json -> "servidor"."""
+    config = cargar_config_servidor()
+    if usar_gunicorn is None:
+        usar_gunicorn = '--gunicorn' in sys.argv
+    if usar_gunicorn:
+        if os.name == 'nt':
+            print("ADVERTENCIA: gunicorn no funciona en Windows; se usará waitress.")
+        else:
+            return _servir_gunicorn(app, config)
+    return _servir_waitress(app, config)
+
+
+if __name__ == '__main__':
+    from app import app, inicializar_aplicacion
+    inicializar_aplicacion()
+    servir(app)
@@ -1,43 +1,100 @@
+// Filtros del dashboard de vencimientos: las tarjetas KPI, la búsqueda, la ventana de días y la paginación
+// piden al servidor (/vencimientos/consulta) solo las filas de la página que coinciden,
+// en lugar de recorrer todas las filas de la tabla en el navegador.
 document.addEventListener('DOMContentLoaded', function() {
+    const table = document.querySelector('.vencimientos-table');
+    if (!table) return;
+
+    const urlConsulta = table.dataset.urlConsulta;
+    const tableBody = table.querySelector('tbody');
     const kpiCards = document.querySelectorAll('.kpi-card');
-    const tableRows = document.querySelectorAll('.vencimientos-table tbody tr');
     const searchInput = document.getElementById('searchInput');
+    const paginacion = document.getElementById('paginacionVencimientos');
+    const ventanaInputs = document.querySelectorAll('.ventana-dias');
+    const RETARDO_BUSQUEDA_MS = 300;
 
-    function filterTable() {
-        const searchTerm = searchInput.value.toLowerCase();
-        let activeCard = document.querySelector('.kpi-card.active');
+    let paginaActual = parseInt(paginacion.dataset.pagina, 10) || 1;
+    let paginasTotales = parseInt(paginacion.dataset.paginas, 10) || 1;
+    let temporizador = null;
+    let controlador = null;
 
-        tableRows.forEach(row => {
-            const tomador = row.querySelector('[data-label="Tomador"]').textContent.toLowerCase();
-            let showRow = tomador.includes(searchTerm);
+    function actualizarPaginacion(data) {
+        paginaActual = data.pagina;
+        paginasTotales = data.paginas;
+        paginacion.querySelector('[data-campo="pagina"]').textContent = data.pagina;
+        paginacion.querySelector('[data-campo="paginas"]').textContent = data.paginas;
+        paginacion.querySelector('[data-campo="total"]').textContent = data.total;
+        paginacion.querySelector('[data-accion="anterior"]').disabled = data.pagina <= 1;
+        paginacion.querySelector('[data-accion="siguiente"]').disabled = data.pagina >= data.paginas;
+    }
 
-            if (activeCard) {
-                const filterDays = activeCard.dataset.filterDays;
-                const filterRamo = activeCard.dataset.filterRamo;
+    function actualizarKpis(data) {
+        Object.entries(data.kpis).forEach(([clave, valor]) => {
+            const elemento = document.querySelector(`[data-kpi="${clave}"]`);
+            if (elemento) elemento.textContent = valor;
+        });
+        data.ramos_kpis.forEach(ramoKpi => {
+            document.querySelectorAll('[data-kpi-ramo]').forEach(elemento => {
+                if (elemento.dataset.kpiRamo === ramoKpi.ramo) elemento.textContent = ramoKpi.count;
+            });
+        });
+    }
 
-                if (filterDays) {
-                    const diasVencer = parseInt(row.dataset.diasVencer, 10);
-                    if (diasVencer > parseInt(filterDays, 10)) {
-                        showRow = false;
-                    }
-                }
+    function consultar(pagina) {
+        const parametros = new URLSearchParams({ pagina: pagina });
+        const activeCard = document.querySelector('.kpi-card.active');
+        if (activeCard) {
+            parametros.set('banda', activeCard.dataset.banda);
+            if (activeCard.dataset.ramo) parametros.set('ramo', activeCard.dataset.ramo);
+        }
+        if (searchInput && searchInput.value.trim()) {
+            parametros.set('search_term', searchInput.value.trim());
+        }
+        ventanaInputs.forEach(input => {
+            if (input.value !== '') parametros.set(input.name, input.value);
+        });
 
-                if (filterRamo) {
-                    const ramo = row.dataset.ramo;
-                    if (ramo.toLowerCase().indexOf(filterRamo.toLowerCase()) === -1) {
-                        showRow = false;
-                    }
-                }
-            }
+        // Solo cuenta la última consulta; las anteriores en curso se cancelan
+        if (controlador) controlador.abort();
+        controlador = new AbortController();
 
-            row.style.display = showRow ? '' : 'none';
-        });
+        fetch(`${urlConsulta}?${parametros.toString()}`, { signal: controlador.signal })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    console.error('Error al consultar vencimientos:', data.message);
+                    return;
+                }
+                tableBody.innerHTML = data.total
+                    ? data.filas_html
+                    : '<tr><td colspan="11">No hay vencimientos que coincidan con los criterios de búsqueda.</td></tr>';
+                actualizarPaginacion(data);
+                actualizarKpis(data);
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') console.error('Error de red:', error);
+            });
     }
 
     if (searchInput) {
-        searchInput.addEventListener('input', filterTable);
+        searchInput.addEventListener('input', function() {
+            clearTimeout(temporizador);
+            temporizador = setTimeout(() => consultar(1), RETARDO_BUSQUEDA_MS);
+        });
+        searchInput.form.addEventListener('submit', function(event) {
+            event.preventDefault();
+            clearTimeout(temporizador);
+            consultar(1);
+        });
     }
 
+    ventanaInputs.forEach(input => {
+        input.addEventListener('input', function() {
+            clearTimeout(temporizador);
+            temporizador = setTimeout(() => consultar(1), RETARDO_BUSQUEDA_MS);
+        });
+    });
+
     kpiCards.forEach(card => {
         card.addEventListener('click', function() {
             if (this.classList.contains('active')) {
@@ -46,7 +103,16 @@ document.addEventListener('DOMContentLoaded', function() {
                 kpiCards.forEach(c => c.classList.remove('active'));
                 this.classList.add('active');
             }
-            filterTable();
+            consultar(1);
         });
     });
-});
\ No newline at end of file
+
+    paginacion.querySelector('[data-accion="anterior"]').addEventListener('click', function() {
+        if (paginaActual > 1) consultar(paginaActual - 1);
+    });
+    paginacion.querySelector('[data-accion="siguiente"]').addEventListener('click', function() {
+        if (paginaActual < paginasTotales) consultar(paginaActual + 1);
+    });
+    paginacion.querySelector('[data-accion="anterior"]').disabled = paginaActual <= 1;
+    paginacion.querySelector('[data-accion="siguiente"]').disabled = paginaActual >= paginasTotales;
+});
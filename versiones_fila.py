@@ -0,0 +1,90 @@
+"""
+Identificadores estables y versión por fila (concurrencia optimista) para cartera y vencimientos.
+
+La carga del reporte maestro conserva el ID_CARTERA / ID_VENCIMIENTO de las filas
+existentes y numera las nuevas a continuación del mayor, así que un formulario de
+edición abierto sigue apuntando a la misma póliza después de una carga.
+
+Cada fila lleva VERSION_FILA, que aumenta con cada cambio (edición o carga que
+modifica la fila). Los formularios envían la versión que mostraron; si ya no es
+la vigente, la ruta rechaza la escritura con 409 en lugar de pisar el cambio ajeno.
+"""
+
+from fechas_es import como_fecha
+from indices import normalizar_numero_poliza
+
+COLUMNA_VERSION = 'VERSION_FILA'
+
+
+def clave_poliza_fecha(polizas, fechas, sin_fecha):
+    """
+    Clave 'póliza_AAAA-MM-DD' por fila para emparejar el reporte maestro con el archivo
+    guardado. Póliza y fecha se normalizan (12345.0 -> '12345'; 'dd/mm/AAAA' del reporte,
+    'AAAA-MM-DD' o datetime del Excel guardado -> 'AAAA-MM-DD'), porque el mismo valor
+    llega con formatos distintos según el origen. Sin fecha válida se usa 'sin_fecha'.
+    """
+    import pandas as pd
+
+    def _fecha(valor):
+        if valor is None or valor is pd.NaT or (isinstance(valor, float) and valor != valor):
+            return sin_fecha
+        fecha = como_fecha(valor)
+        return fecha.strftime('%Y-%m-%d') if fecha else sin_fecha
+
+    return polizas.map(normalizar_numero_poliza) + '_' + fechas.map(_fecha)
+
+
+def asignar_ids_estables(df, columna_id):
+    """
+    Conserva los IDs numéricos existentes y asigna a las filas sin ID (las nuevas)
+    max+1, max+2... Si un ID está repetido (archivo editado a mano), solo la primera
+    fila lo conserva. Modifica y devuelve df.
+    """
+    import pandas as pd
+
+    if columna_id in df.columns:
+        ids = pd.to_numeric(df[columna_id], errors='coerce')
+    else:
+        ids = pd.Series(float('nan'), index=df.index)
+    ids = ids.mask(ids.duplicated())
+    siguiente = int(ids.max()) + 1 if ids.notna().any() else 1
+    faltantes = ids.isna()
+    ids[faltantes] = range(siguiente, siguiente + int(faltantes.sum()))
+    df[columna_id] = ids.astype(int)
+    return df
+
+
+def normalizar_versiones(df):
+    """Columna VERSION_FILA entera; las filas sin versión (nuevas o anteriores a la columna) quedan en 1."""
+    import pandas as pd
+
+    if COLUMNA_VERSION in df.columns:
+        df[COLUMNA_VERSION] = pd.to_numeric(df[COLUMNA_VERSION], errors='coerce').fillna(1).astype(int)
+    else:
+        df[COLUMNA_VERSION] = 1
+    return df
+
+
+def incrementar_versiones(df, mascara):
+    df.loc[mascara, COLUMNA_VERSION] = df.loc[mascara, COLUMNA_VERSION] + 1
+    return df
+
+
+def filas_cambiadas(antes, despues):
+    """Máscara (array) de las filas con algún valor distinto entre dos DataFrames alineados."""
+    iguales = (antes == despues) | (antes.isna() & despues.isna())
+    return (~iguales.all(axis=1)).to_numpy()
+
+
+def leer_version(valor):
+    """Versión enviada por el cliente: None si no se envió; ValueError si no es un entero."""
+    if valor is None or str(valor).strip() == '':
+        return None
+    return int(float(str(valor).strip()))
+
+
+def version_obsoleta(version_vigente, version_recibida):
+    """True si el cliente editó una versión anterior de la fila (sin versión no se comprueba)."""
+    if version_recibida is None:
+        return False
+    return leer_version(version_vigente) != version_recibida